@@ -1,211 +1,308 @@
 import logging
-import traceback
 import json
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from app.config import get_settings
 from app.models import AnalysisRequest, AnalysisResponse, QuickCheckRequest, QuickCheckResponse
+from app.services.cache import get_analysis_cache, make_analysis_key
+from app.services.context import AnalysisContext, get_context_loader
+from app.services.incremental import get_incremental_analyzer
 from app.services.llm import get_llm_service
-from app.services.supabase import (
-    get_session_patterns,
-    get_persona,
-    save_analysis_result,
-    get_supabase,
-)
-
-# Configure logging to show detailed output
-logging.basicConfig(level=logging.DEBUG)
+from app.services.logs import log_payload
+from app.services.metrics import stage, timed
+from app.services.precheck import precheck
+from app.services.scheduler import LLMOverloadedError
+from app.services.similarity import analysis_scope, get_similarity_cache
+from app.services.write_queue import get_write_queue
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+CACHE_BYPASS_VALUES = {"1", "true", "yes"}
+
+
+def _should_bypass_cache(x_cache_bypass: str | None, cache_control: str | None) -> bool:
+    if x_cache_bypass and x_cache_bypass.strip().lower() in CACHE_BYPASS_VALUES:
+        return True
+    return bool(cache_control) and "no-cache" in cache_control.lower()
+
+
+async def _lookup_cached_analysis(
+    cache_key: str,
+    content: str,
+    scope: str,
+    x_cache_bypass: str | None,
+    cache_control: str | None,
+) -> tuple[AnalysisResponse | None, str | None, str]:
+    """Return the cached analysis and the model that answered it, if any, and the X-Cache status to report.
+
+    An exact hit is tried first, then an analysis of a nearly identical
+    text in the same scope (SIMILAR).
+    """
+    settings = get_settings()
+    if not settings.analysis_cache_enabled and not settings.similarity_cache_enabled:
+        return None, None, "BYPASS"
+    cache = get_analysis_cache()
+    if _should_bypass_cache(x_cache_bypass, cache_control):
+        cache.record_bypass()
+        return None, None, "BYPASS"
+    if settings.analysis_cache_enabled:
+        with stage("analyze.cache_lookup"):
+            found = await cache.get(cache_key)
+        if found is not None:
+            return *found, "HIT"
+    if settings.similarity_cache_enabled:
+        with stage("analyze.similarity_lookup"):
+            found = get_similarity_cache().find_analysis(content, scope)
+        if found is not None:
+            return *found, "SIMILAR"
+    return None, None, "MISS"
+
+
+async def _cache_analysis(cache_key: str, content: str, scope: str, analysis: AnalysisResponse, model: str):
+    settings = get_settings()
+    if settings.analysis_cache_enabled:
+        await get_analysis_cache().set(cache_key, analysis, model)
+    if settings.similarity_cache_enabled:
+        get_similarity_cache().add_analysis(content, scope, analysis, model)
+
+
+async def _load_analysis_context(request: AnalysisRequest) -> tuple[AnalysisContext, dict | None, list[str] | None]:
+    """Look up the document's session and fill in persona and patterns missing from the request."""
+    with stage("analyze.load_context"):
+        context = await get_context_loader().load(request.document_id)
+    if context is None:
+        logger.warning(f"[ANALYZE] Document not found with ID: {request.document_id}")
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    persona = request.persona.model_dump() if request.persona else context.persona
+    historical_patterns = request.historical_patterns or context.historical_patterns
+    logger.debug(
+        "[ANALYZE] Session %s, persona from %s, %d patterns",
+        context.session_id,
+        "request" if request.persona else "DB",
+        len(historical_patterns or []),
+    )
+    log_payload(logger, "[ANALYZE] Persona", persona)
+    log_payload(logger, "[ANALYZE] Patterns", historical_patterns)
+    return context, persona, historical_patterns
+
+
+async def _save_analysis(
+    request: AnalysisRequest,
+    session_id: str,
+    analysis: AnalysisResponse,
+    tokens_used: int,
+    model_used: str,
+):
+    """Hand an analysis to the write-behind queue for persistence."""
+    with stage("analyze.persist"):
+        # Dumped once; the saved rows and the raw response share the dicts
+        raw_response = analysis.model_dump()
+        await get_write_queue().enqueue(
+            document_id=request.document_id,
+            session_id=session_id,
+            annotations=raw_response["annotations"],
+            scores=raw_response["scores"],
+            patterns=raw_response["patterns"],
+            raw_response=raw_response,
+            model_used=model_used,
+            tokens_used=tokens_used,
+        )
+
 
 @router.post("/analyze", response_model=AnalysisResponse)
-async def analyze_document(request: AnalysisRequest):
-    """Perform full document analysis with LLM."""
-    # Log the incoming request
-    logger.info("=" * 60)
-    logger.info("[ANALYZE] Received analysis request")
-    logger.info(f"[ANALYZE] Document ID: {request.document_id}")
-    logger.info(f"[ANALYZE] Content length: {len(request.content)} chars")
-    logger.info(f"[ANALYZE] Content preview: {request.content[:200]}...")
-    logger.info(f"[ANALYZE] Persona provided: {request.persona is not None}")
-    logger.info(f"[ANALYZE] Historical patterns provided: {request.historical_patterns is not None}")
+@timed("analyze.total")
+async def analyze_document(
+    request: AnalysisRequest,
+    response: Response,
+    x_cache_bypass: str | None = Header(default=None),
+    cache_control: str | None = Header(default=None),
+):
+    """Perform full document analysis with LLM.
+
+    Results are cached by content, persona, patterns and model, and an
+    analysis of a nearly identical text is reused with its annotations
+    moved onto the new text. Send ``X-Cache-Bypass: 1`` or
+    ``Cache-Control: no-cache`` to force a fresh analysis; the ``X-Cache``
+    response header reports HIT, SIMILAR, MISS or BYPASS.
+    """
+    logger.info(f"[ANALYZE] Analysis request for document {request.document_id}, {len(request.content)} chars")
+    log_payload(logger, "[ANALYZE] Content", request.content)
 
     try:
-        # Step 1: Get LLM service
-        logger.info("[ANALYZE] Step 1: Getting LLM service...")
-        try:
-            llm = get_llm_service()
-            logger.info(f"[ANALYZE] LLM service obtained. Model: {llm.model}")
-        except Exception as e:
-            logger.error(f"[ANALYZE] FAILED at Step 1 - Getting LLM service")
-            logger.error(f"[ANALYZE] Error: {str(e)}")
-            logger.error(f"[ANALYZE] Traceback:\n{traceback.format_exc()}")
-            raise
+        llm = get_llm_service()
 
-        # Step 2: Get Supabase client
-        logger.info("[ANALYZE] Step 2: Getting Supabase client...")
-        try:
-            supabase = get_supabase()
-            logger.info("[ANALYZE] Supabase client obtained")
-        except Exception as e:
-            logger.error(f"[ANALYZE] FAILED at Step 2 - Getting Supabase client")
-            logger.error(f"[ANALYZE] Error: {str(e)}")
-            logger.error(f"[ANALYZE] Traceback:\n{traceback.format_exc()}")
-            raise
+        # Resolve session, persona and historical patterns
+        context, persona, historical_patterns = await _load_analysis_context(request)
 
-        # Step 3: Get document to find session_id
-        logger.info("[ANALYZE] Step 3: Fetching document from database...")
-        try:
-            doc_result = supabase.table("documents").select("session_id").eq("id", request.document_id).single().execute()
-            logger.info(f"[ANALYZE] Document query result: {doc_result.data}")
-        except Exception as e:
-            logger.error(f"[ANALYZE] FAILED at Step 3 - Fetching document")
-            logger.error(f"[ANALYZE] Error: {str(e)}")
-            logger.error(f"[ANALYZE] Traceback:\n{traceback.format_exc()}")
-            raise
+        # Perform LLM analysis (or serve it from the result cache)
+        incremental = get_incremental_analyzer()
+        cache_key = make_analysis_key(request.content, persona, historical_patterns, llm.model)
+        scope = analysis_scope(persona, historical_patterns, llm.model)
+        analysis, model_used, cache_status = await _lookup_cached_analysis(
+            cache_key, request.content, scope, x_cache_bypass, cache_control
+        )
+        response.headers["X-Cache"] = cache_status
+
+        if analysis is not None:
+            tokens_used = 0
+            logger.debug("[ANALYZE] Cache %s for key %s, skipping LLM call", cache_status, cache_key[:12])
+        else:
+            with stage("analyze.llm"):
+                if request.incremental:
+                    analysis, tokens_used, model_used = await incremental.analyze(
+                        llm,
+                        document_id=request.document_id,
+                        content=request.content,
+                        persona=persona,
+                        historical_patterns=historical_patterns,
+                        known_words=context.known_words,
+                    )
+                else:
+                    analysis, tokens_used, model_used = await llm.analyze_document(
+                        content=request.content,
+                        persona=persona,
+                        historical_patterns=historical_patterns,
+                        known_words=context.known_words,
+                    )
+            logger.info(
+                f"[ANALYZE] LLM analysis complete: {len(analysis.annotations)} annotations, "
+                f"{len(analysis.patterns)} patterns, {tokens_used} tokens"
+            )
+            await _cache_analysis(cache_key, request.content, scope, analysis, model_used)
+        # The cache and the snapshot keep every suggestion, since other sessions may get them
+        incremental.record(request.document_id, request.content, persona, historical_patterns, llm.model, analysis)
+        analysis, vocabulary_tokens = await llm.analysis_for_session(analysis, context.known_words)
+        tokens_used += vocabulary_tokens
+
+        # Save results to database
+        await _save_analysis(request, context.session_id, analysis, tokens_used, model_used)
+        return analysis
 
-        if not doc_result.data:
-            logger.error(f"[ANALYZE] Document not found with ID: {request.document_id}")
-            raise HTTPException(status_code=404, detail="Document not found")
+    except (HTTPException, LLMOverloadedError):
+        # Re-raise HTTP exceptions as-is; overload is answered with a 503 by the app
+        raise
+    except Exception as e:
+        logger.exception(f"[ANALYZE] Analysis of document {request.document_id} failed")
+        raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {str(e)}")
+
+
+def _ndjson(event: str, data) -> str:
+    encoded = data.model_dump_json() if isinstance(data, BaseModel) else json.dumps(data)
+    return f'{{"event": {json.dumps(event)}, "data": {encoded}}}\n'
+
+
+@router.post("/analyze/stream")
+async def stream_analysis(
+    request: AnalysisRequest,
+    x_cache_bypass: str | None = Header(default=None),
+    cache_control: str | None = Header(default=None),
+):
+    """Stream a full document analysis as newline-delimited JSON.
 
-        session_id = doc_result.data["session_id"]
-        logger.info(f"[ANALYZE] Session ID: {session_id}")
+    Each line is ``{"event": ..., "data": ...}``. ``annotation``,
+    ``pattern`` and ``vocabulary_suggestion`` events are sent as soon as
+    the model has finished writing each item; ``scores`` and ``summary``
+    follow, then ``done`` once the analysis has been queued for saving. Failures after
+    the response has started are reported as an ``error`` event.
+    """
+    logger.info(f"[ANALYZE_STREAM] Received streaming analysis request for document {request.document_id}")
+    llm = get_llm_service()
+    context, persona, historical_patterns = await _load_analysis_context(request)
+    cache_key = make_analysis_key(request.content, persona, historical_patterns, llm.model)
+    scope = analysis_scope(persona, historical_patterns, llm.model)
+    cached, cached_model, cache_status = await _lookup_cached_analysis(
+        cache_key, request.content, scope, x_cache_bypass, cache_control
+    )
 
-        # Step 4: Get persona and historical patterns
-        logger.info("[ANALYZE] Step 4: Getting persona and patterns...")
+    async def events():
         try:
-            persona = request.persona
-            if not persona:
-                logger.info("[ANALYZE] No persona in request, fetching from database...")
-                db_persona = await get_persona(session_id)
-                if db_persona:
-                    persona = {
-                        "goals": db_persona.get("goals", []),
-                        "experience_level": db_persona.get("experience_level", "intermediate"),
-                        "focus_areas": db_persona.get("focus_areas", []),
-                        "preferred_tone": db_persona.get("preferred_tone", "balanced"),
-                    }
-                    logger.info(f"[ANALYZE] Persona from DB: {persona}")
-                else:
-                    logger.info("[ANALYZE] No persona found in database")
+            if cached is not None:
+                recorded, model_used = cached, cached_model
+                analysis, tokens_used = await llm.analysis_for_session(cached, context.known_words)
+                for annotation in analysis.annotations:
+                    yield _ndjson("annotation", annotation)
+                for pattern in analysis.patterns:
+                    yield _ndjson("pattern", pattern)
+                for suggestion in analysis.vocabulary_suggestions:
+                    yield _ndjson("vocabulary_suggestion", suggestion)
+                yield _ndjson("scores", analysis.scores)
+                yield _ndjson("summary", analysis.summary)
             else:
-                logger.info(f"[ANALYZE] Using persona from request: {persona}")
+                async for event, data in llm.stream_analysis(
+                    request.content, persona, historical_patterns, context.known_words
+                ):
+                    if event == "complete":
+                        recorded, tokens_used = data
+                    else:
+                        yield _ndjson(event, data)
+                # Streaming never cascades, so the full model answered
+                model_used = llm.model
+                await _cache_analysis(cache_key, request.content, scope, recorded, model_used)
+                # Only this session's known words are undefined, so this costs no tokens
+                analysis, _ = await llm.analysis_for_session(recorded, context.known_words)
 
-            historical_patterns = request.historical_patterns
-            if not historical_patterns:
-                logger.info("[ANALYZE] No patterns in request, fetching from database...")
-                historical_patterns = await get_session_patterns(session_id)
-                logger.info(f"[ANALYZE] Patterns from DB: {historical_patterns}")
-            else:
-                logger.info(f"[ANALYZE] Using patterns from request: {historical_patterns}")
-        except Exception as e:
-            logger.error(f"[ANALYZE] FAILED at Step 4 - Getting persona/patterns")
-            logger.error(f"[ANALYZE] Error: {str(e)}")
-            logger.error(f"[ANALYZE] Traceback:\n{traceback.format_exc()}")
-            raise
-
-        # Step 5: Perform LLM analysis
-        logger.info("[ANALYZE] Step 5: Calling LLM for analysis...")
-        logger.info(f"[ANALYZE] Sending to LLM - Content: {len(request.content)} chars, Persona: {persona}, Patterns: {historical_patterns}")
-        try:
-            analysis, tokens_used = await llm.analyze_document(
-                content=request.content,
-                persona=persona,
-                historical_patterns=historical_patterns,
-            )
-            logger.info(f"[ANALYZE] LLM analysis complete. Tokens used: {tokens_used}")
-            logger.info(f"[ANALYZE] Analysis result - Annotations: {len(analysis.annotations)}, Patterns: {len(analysis.patterns)}")
-        except Exception as e:
-            logger.error(f"[ANALYZE] FAILED at Step 5 - LLM analysis")
-            logger.error(f"[ANALYZE] Error type: {type(e).__name__}")
-            logger.error(f"[ANALYZE] Error message: {str(e)}")
-            logger.error(f"[ANALYZE] Full traceback:\n{traceback.format_exc()}")
-            raise
-
-        # Step 6: Save results to database
-        logger.info("[ANALYZE] Step 6: Saving results to database...")
-        try:
-            await save_analysis_result(
-                document_id=request.document_id,
-                session_id=session_id,
-                annotations=[a.model_dump() for a in analysis.annotations],
-                scores=analysis.scores.model_dump(),
-                patterns=[p.model_dump() for p in analysis.patterns],
-                raw_response={
-                    "annotations": [a.model_dump() for a in analysis.annotations],
-                    "scores": analysis.scores.model_dump(),
-                    "patterns": [p.model_dump() for p in analysis.patterns],
-                    "vocabulary_suggestions": [v.model_dump() for v in analysis.vocabulary_suggestions],
-                    "summary": analysis.summary,
-                },
-                model_used=llm.model,
-                tokens_used=tokens_used,
+            # The cache and the snapshot keep every suggestion, since other sessions may get them
+            get_incremental_analyzer().record(
+                request.document_id, request.content, persona, historical_patterns, llm.model, recorded
             )
-            logger.info("[ANALYZE] Results saved to database successfully")
+            await _save_analysis(request, context.session_id, analysis, tokens_used, model_used)
+            yield _ndjson("done", {"tokens_used": tokens_used})
         except Exception as e:
-            logger.error(f"[ANALYZE] FAILED at Step 6 - Saving to database")
-            logger.error(f"[ANALYZE] Error: {str(e)}")
-            logger.error(f"[ANALYZE] Traceback:\n{traceback.format_exc()}")
-            raise
+            logger.exception(f"[ANALYZE_STREAM] Streaming analysis of document {request.document_id} failed")
+            yield _ndjson("error", {"detail": f"{type(e).__name__}: {str(e)}"})
 
-        logger.info("[ANALYZE] Analysis complete! Returning response.")
-        logger.info("=" * 60)
-        return analysis
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers={"X-Cache": cache_status})
 
-    except HTTPException:
-        # Re-raise HTTP exceptions as-is
-        raise
-    except Exception as e:
-        # Log the full error details for any unexpected exception
-        logger.error("=" * 60)
-        logger.error("[ANALYZE] UNEXPECTED ERROR IN ANALYZE ENDPOINT")
-        logger.error(f"[ANALYZE] Error type: {type(e).__name__}")
-        logger.error(f"[ANALYZE] Error message: {str(e)}")
-        logger.error(f"[ANALYZE] Full traceback:\n{traceback.format_exc()}")
-        logger.error("=" * 60)
-
-        # Also print to console for immediate visibility
-        print("\n" + "=" * 60)
-        print("[ANALYZE ERROR] DETAILED ERROR INFORMATION:")
-        print(f"Error type: {type(e).__name__}")
-        print(f"Error message: {str(e)}")
-        print(f"Traceback:\n{traceback.format_exc()}")
-        print("=" * 60 + "\n")
 
-        raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {str(e)}")
+@router.get("/analyze/cache/stats")
+async def analysis_cache_stats():
+    """Report hit/miss counters for the analysis result cache and the near-duplicate cache."""
+    return {**get_analysis_cache().stats(), "similarity": get_similarity_cache().stats()}
+
+
+@router.get("/analyze/llm/stats")
+async def llm_stats():
+    """Report request coalescing, scheduler, prompt token estimate, word definition and model cascade counters."""
+    return get_llm_service().stats()
 
 
 @router.post("/analyze/quick", response_model=QuickCheckResponse)
+@timed("quick_check.total")
 async def quick_check(request: QuickCheckRequest):
-    """Perform quick check for obvious issues."""
-    logger.info("=" * 60)
-    logger.info("[QUICK_CHECK] Received quick check request")
-    logger.info(f"[QUICK_CHECK] Content length: {len(request.content)} chars")
-    logger.info(f"[QUICK_CHECK] Content preview: {request.content[:200]}...")
+    """Perform quick check for obvious issues.
 
-    try:
-        logger.info("[QUICK_CHECK] Getting LLM service...")
-        llm = get_llm_service()
-        logger.info(f"[QUICK_CHECK] LLM service obtained. Quick model: {llm.model_quick}")
+    Local rules answer when they are conclusive, then an earlier answer for
+    the same text; the ``source`` field of the response says whether the
+    rules, that earlier answer or the LLM answered.
+    """
+    log_payload(logger, "[QUICK_CHECK] Content", request.content)
+
+    if get_settings().quick_check_local_enabled:
+        local = precheck(request.content)
+        if local.confident:
+            logger.debug("[QUICK_CHECK] Answered locally with %d issues", len(local.issues))
+            return local.to_response()
+        logger.debug("[QUICK_CHECK] Local rules inconclusive, asking the LLM")
+
+    llm = get_llm_service()
+    similarity_enabled = get_settings().similarity_cache_enabled
+    if similarity_enabled:
+        cached = get_similarity_cache().find_quick_check(request.content, llm.model_quick)
+        if cached is not None:
+            return cached.model_copy(update={"source": "cache"})
 
-        logger.info("[QUICK_CHECK] Calling LLM for quick check...")
+    try:
         result = await llm.quick_check(request.content)
-        logger.info(f"[QUICK_CHECK] Quick check complete. Has issues: {result.has_issues}, Issue count: {len(result.issues)}")
-        logger.info("=" * 60)
+        logger.debug("[QUICK_CHECK] LLM found %d issues", len(result.issues))
+        if similarity_enabled:
+            get_similarity_cache().add_quick_check(request.content, llm.model_quick, result)
         return result
+    except LLMOverloadedError:
+        raise
     except Exception as e:
-        logger.error("=" * 60)
-        logger.error("[QUICK_CHECK] ERROR IN QUICK CHECK ENDPOINT")
-        logger.error(f"[QUICK_CHECK] Error type: {type(e).__name__}")
-        logger.error(f"[QUICK_CHECK] Error message: {str(e)}")
-        logger.error(f"[QUICK_CHECK] Traceback:\n{traceback.format_exc()}")
-        logger.error("=" * 60)
-
-        print("\n" + "=" * 60)
-        print("[QUICK_CHECK ERROR] DETAILED ERROR INFORMATION:")
-        print(f"Error type: {type(e).__name__}")
-        print(f"Error message: {str(e)}")
-        print(f"Traceback:\n{traceback.format_exc()}")
-        print("=" * 60 + "\n")
-
+        logger.exception("[QUICK_CHECK] Quick check failed")
         raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {str(e)}")
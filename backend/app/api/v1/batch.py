@@ -0,0 +1,68 @@
+import json
+import logging
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.config import get_settings
+from app.models import BatchAnalysisRequest
+from app.services.batch import BatchJob, get_batch_processor
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def _get_job(job_id: str) -> BatchJob:
+    job = get_batch_processor().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job
+
+
+@router.post("/analyze", status_code=202)
+async def submit_batch_analysis(request: BatchAnalysisRequest):
+    """Queue analysis of many documents and return the job without waiting for it.
+
+    Follow the job with ``GET /batch/{job_id}`` or the NDJSON stream at
+    ``GET /batch/{job_id}/events``. With ``provider_batch``, documents go
+    through the provider's discounted batch API when it has one; the job's
+    ``mode`` says whether it did.
+    """
+    document_ids = list(dict.fromkeys(request.document_ids))
+    max_documents = get_settings().batch_max_documents
+    if not document_ids:
+        raise HTTPException(status_code=400, detail="No documents to analyze")
+    if len(document_ids) > max_documents:
+        raise HTTPException(status_code=400, detail=f"A batch job takes at most {max_documents} documents")
+
+    job = get_batch_processor().submit(document_ids, request.provider_batch)
+    logger.info(f"[BATCH] Job {job.id} submitted with {len(document_ids)} documents")
+    return job.summary()
+
+
+@router.get("/stats")
+async def batch_stats():
+    """Report job and document counters for batch analysis."""
+    return get_batch_processor().stats()
+
+
+@router.get("/{job_id}")
+async def get_batch_job(job_id: str):
+    """Report a job's progress and the status of each of its documents."""
+    return _get_job(job_id).to_dict()
+
+
+@router.get("/{job_id}/events")
+async def stream_batch_job(job_id: str):
+    """Stream a job's progress as newline-delimited JSON.
+
+    Each line is ``{"event": ..., "data": ...}``: a ``document`` event as
+    each document is saved or fails, then ``done`` with the job summary.
+    Events that happened before the stream was opened are sent first.
+    """
+    job = _get_job(job_id)
+
+    async def events():
+        async for event in job.follow():
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from app.models import CompareProgressRequest, CompareProgressResponse
-from app.services.supabase import get_progress_metrics, check_mastered_patterns
+from app.services.mastery import get_mastery_job
+from app.services.supabase import get_progress_comparison
 
 router = APIRouter()
 
@@ -9,9 +10,9 @@ router = APIRouter()
 async def compare_progress(request: CompareProgressRequest):
     """Calculate improvement over time."""
     try:
-        metrics = await get_progress_metrics(request.session_id)
+        comparison = await get_progress_comparison(request.session_id)
 
-        if len(metrics) < 2:
+        if comparison is None:
             return CompareProgressResponse(
                 improvement=0,
                 areas_improved=[],
@@ -19,26 +20,18 @@ async def compare_progress(request: CompareProgressRequest):
             )
 
         # Compare first half to second half
-        mid = len(metrics) // 2
-        first_half = metrics[:mid]
-        second_half = metrics[mid:]
-
-        def avg(data: list[dict], field: str) -> float:
-            values = [float(d[field]) for d in data]
-            return sum(values) / len(values) if values else 0
-
         improvements = {
-            "grammar": avg(second_half, "grammar_score") - avg(first_half, "grammar_score"),
-            "clarity": avg(second_half, "clarity_score") - avg(first_half, "clarity_score"),
-            "vocabulary": avg(second_half, "vocabulary_score") - avg(first_half, "vocabulary_score"),
-            "overall": avg(second_half, "overall_score") - avg(first_half, "overall_score"),
+            area: float(comparison[f"second_{area}"]) - float(comparison[f"first_{area}"])
+            for area in ("grammar", "clarity", "vocabulary", "overall")
         }
 
         areas_improved = [k for k, v in improvements.items() if v > 5]
-        areas_to_focus = [k for k, v in improvements.items() if v < -5 or (v < 5 and avg(second_half, f"{k}_score") < 70)]
+        areas_to_focus = [
+            k for k, v in improvements.items() if v < -5 or (v < 5 and float(comparison[f"second_{k}"]) < 70)
+        ]
 
-        # Check for newly mastered patterns
-        await check_mastered_patterns(request.session_id)
+        # Newly mastered patterns are detected by the background mastery job
+        get_mastery_job().mark(request.session_id)
 
         return CompareProgressResponse(
             improvement=improvements["overall"],
@@ -1,16 +1,26 @@
 from fastapi import APIRouter, HTTPException
 from app.models import VocabularyExtractRequest, VocabSuggestion
+from app.services.context import get_context_loader
 from app.services.llm import get_llm_service
+from app.services.scheduler import LLMOverloadedError
 
 router = APIRouter()
 
 
 @router.post("/extract", response_model=list[VocabSuggestion])
 async def extract_vocabulary(request: VocabularyExtractRequest):
-    """Extract vocabulary suggestions from text."""
+    """Extract vocabulary suggestions from text.
+
+    With ``session_id``, words already in that session's vocabulary bank are left out.
+    """
     try:
         llm = get_llm_service()
-        result = await llm.extract_vocabulary(request.content)
+        known_words = frozenset()
+        if request.session_id:
+            known_words = (await get_context_loader().load_session(request.session_id)).known_words
+        result = await llm.extract_vocabulary(request.content, known_words)
         return result
+    except LLMOverloadedError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -6,10 +6,6 @@ from functools import lru_cache
 # config.py is in backend/app/, so .env is in backend/ (parent directory)
 ENV_FILE_PATH = Path(__file__).resolve().parent.parent / ".env"
 
-# Diagnostic: Print .env file path and existence on module load
-print(f"[CONFIG] .env file path: {ENV_FILE_PATH}")
-print(f"[CONFIG] .env file exists: {ENV_FILE_PATH.exists()}")
-
 
 class Settings(BaseSettings):
     openai_api_key: str
@@ -18,16 +14,115 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_service_key: str
 
+    # LLM backend: "openai" (or any OpenAI-compatible server at LLM_BASE_URL) or "replay"
+    llm_backend: str = "openai"
+    llm_base_url: str | None = None
+    llm_record_path: str | None = None
+    llm_replay_path: str = "llm_recordings.jsonl"
+    llm_replay_latency: str = "recorded"
+
+    # Analysis result cache
+    analysis_cache_enabled: bool = True
+    analysis_cache_max_entries: int = 512
+    analysis_cache_ttl_seconds: int = 3600
+    analysis_cache_shared: bool = False
+
+    # Near-duplicate reuse of analyses (MinHash of character shingles): texts at least the
+    # threshold similar to an earlier one get its answer; quick checks are reused for the same text only
+    similarity_cache_enabled: bool = True
+    similarity_cache_max_entries: int = 2048
+    similarity_cache_ttl_seconds: int = 3600
+    similarity_cache_threshold: float = 0.9
+    similarity_cache_min_chars: int = 200
+
+    # Incremental (paragraph-level) re-analysis
+    incremental_max_documents: int = 1024
+    incremental_context_chars: int = 300
+    incremental_max_changed_ratio: float = 0.6
+
+    # Token budget for historical patterns in analysis prompts
+    prompt_pattern_token_budget: int = 400
+    prompt_max_tokens_per_pattern: int = 60
+
+    # Answer quick checks with local rules when they are conclusive
+    quick_check_local_enabled: bool = True
+
+    # Chunked analysis of long documents
+    chunked_threshold_chars: int = 24000
+    chunk_chars: int = 8000
+    chunk_overlap_chars: int = 600
+    chunk_context_chars: int = 300
+    chunk_concurrency: int = 4
+
+    # Model cascade: documents up to CASCADE_MAX_CHARS are analyzed by LLM_MODEL_QUICK first and
+    # escalated to LLM_MODEL when its answer fails the quality checks. LLM_MODEL_PRICES (USD per
+    # million tokens as JSON, e.g. {"gpt-5.2": {"prompt": 1.75, "completion": 14}}) prices the
+    # savings; CASCADE_LOG_PATH, when set, receives one JSON line per routing decision.
+    # A clean text rightly gets few annotations, so CASCADE_MIN_ANNOTATIONS is off (0) by default.
+    # Streamed analyses always use LLM_MODEL
+    cascade_enabled: bool = False
+    cascade_max_chars: int = 6000
+    cascade_min_annotations: int = 0
+    cascade_max_dropped_ratio: float = 0.25
+    cascade_max_score_spread: float = 25
+    cascade_log_path: str | None = None
+    llm_model_prices: dict[str, dict] = {}
+
+    # Word definitions shared by all sessions; this bounds the in-process copy
+    word_definitions_max_entries: int = 10000
+    word_definitions_ttl_seconds: int = 86400
+
+    # Per-session cache of persona, historical patterns and vocabulary
+    context_cache_max_sessions: int = 1024
+    context_cache_ttl_seconds: int = 60
+
+    # Write-behind persistence of analysis results
+    write_behind_enabled: bool = True
+    write_behind_workers: int = 4
+    write_behind_capacity: int = 1000
+    write_behind_max_retries: int = 5
+    write_behind_backoff_seconds: float = 0.5
+    write_behind_dead_letter_path: str = "dead_letters.jsonl"
+    write_behind_drain_timeout_seconds: float = 30
+
+    # Background detection of mastered writing patterns
+    mastery_enabled: bool = True
+    mastery_interval_seconds: float = 30
+    mastery_batch_size: int = 500
+
+    # Batch analysis jobs; BATCH_PROVIDER_POLL_SECONDS is how often a job sent through the
+    # provider's batch API checks on it
+    batch_max_documents: int = 500
+    batch_concurrency: int = 4
+    batch_save_size: int = 25
+    batch_max_jobs: int = 100
+    batch_provider_poll_seconds: float = 60
+
+    # LLM request scheduling; LLM_MODEL_LIMITS overrides the defaults per model as JSON,
+    # e.g. {"gpt-5-mini": {"max_concurrency": 32, "tokens_per_minute": 400000}}
+    llm_max_concurrency: int = 16
+    llm_requests_per_minute: int = 500
+    llm_tokens_per_minute: int = 200000
+    llm_max_retries: int = 4
+    llm_queue_timeout_seconds: float = 60
+    llm_model_limits: dict[str, dict] = {}
+
+    # Logging; LOG_FORMAT is "text" or "json". Payloads (document content, prompts, model
+    # output) are logged at DEBUG level for LOG_PAYLOAD_SAMPLE_RATE of requests
+    log_level: str = "INFO"
+    log_format: str = "text"
+    log_payload_sample_rate: float = 0.0
+    log_payload_chars: int = 500
+
+    # Tracing; stage spans are exported over OTLP when enabled (needs the opentelemetry packages)
+    otel_enabled: bool = False
+    otel_endpoint: str = "http://localhost:4317"
+    otel_service_name: str = "writemate-api"
+
     class Config:
         env_file = str(ENV_FILE_PATH)
 
 
 @lru_cache()
 def get_settings() -> Settings:
-    settings = Settings()
-    # Diagnostic: Show API key is loaded (first 10 chars only for security)
-    api_key_preview = settings.openai_api_key[:10] if settings.openai_api_key else "EMPTY"
-    print(f"[CONFIG] Settings loaded successfully!")
-    print(f"[CONFIG] API key starts with: {api_key_preview}...")
-    print(f"[CONFIG] LLM model: {settings.llm_model}")
-    return settings
+    return Settings()
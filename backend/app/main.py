@@ -1,11 +1,49 @@
-from fastapi import FastAPI
+import asyncio
+import math
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from app.api.v1 import router as api_v1_router
+from app.config import get_settings
+from app.services.batch import get_batch_processor
+from app.services.budget import load_encoding
+from app.services.logs import CorrelationIdMiddleware, configure_logging
+from app.services.mastery import get_mastery_job
+from app.services.metrics import configure_tracing, render_metrics
+from app.services.scheduler import LLMOverloadedError
+from app.services.supabase import close_supabase
+from app.services.write_queue import get_write_queue
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    log_listener = configure_logging()
+    configure_tracing()
+    # Off the event loop: the encoding may have to be downloaded
+    await asyncio.to_thread(load_encoding, settings.llm_model)
+    if settings.write_behind_enabled:
+        await get_write_queue().start()
+    if settings.mastery_enabled:
+        await get_mastery_job().start()
+    yield
+    # Running batch jobs hand their unsaved results to the write queue
+    await get_batch_processor().stop()
+    # Drain queued analysis writes before the connection pool goes away
+    if settings.write_behind_enabled:
+        await get_write_queue().drain(settings.write_behind_drain_timeout_seconds)
+    if settings.mastery_enabled:
+        await get_mastery_job().stop()
+    await close_supabase()
+    log_listener.stop()
+
 
 app = FastAPI(
     title="WriteMate API",
     description="Writing coach API with LLM-powered feedback",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS configuration
@@ -15,7 +53,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+app.add_middleware(CorrelationIdMiddleware)
+
+
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError):
+    # Provider rate limits are a temporary condition, not a server error
+    headers = {"Retry-After": str(math.ceil(exc.retry_after))} if exc.retry_after else None
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
+
 
 # Include API routes
 app.include_router(api_v1_router, prefix="/api/v1")
@@ -26,6 +74,13 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Stage latencies, token usage and service counters in the Prometheus text format."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -14,6 +14,12 @@ class AnalysisRequest(BaseModel):
     content: str
     persona: Optional[Persona] = None
     historical_patterns: Optional[list[str]] = None
+    incremental: bool = False  # re-analyze only paragraphs changed since the last analysis
+
+
+class BatchAnalysisRequest(BaseModel):
+    document_ids: list[str]
+    provider_batch: bool = False  # use the provider's discounted batch API; results can take up to 24 hours
 
 
 class QuickCheckRequest(BaseModel):
@@ -26,9 +32,11 @@ class Annotation(BaseModel):
     category: str
     severity: str  # 'info', 'warning', 'error'
     message: str
+    original_text: Optional[str] = None  # the annotated span as quoted by the model
     suggestion: Optional[str] = None
     rewritten_version: Optional[str] = None
     principle: Optional[str] = None
+    pattern_type: Optional[str] = None  # the reported pattern this annotation is an instance of
 
 
 class Scores(BaseModel):
@@ -45,9 +53,10 @@ class Pattern(BaseModel):
 
 class VocabSuggestion(BaseModel):
     word: str
-    definition: str
     part_of_speech: str
-    example_sentence: str
+    definition: str = ""  # filled in from the shared definition store
+    example_sentence: str = ""
+    lemma: Optional[str] = None
     replaces: Optional[str] = None
 
 
@@ -67,10 +76,12 @@ class QuickCheckIssue(BaseModel):
 class QuickCheckResponse(BaseModel):
     has_issues: bool
     issues: list[QuickCheckIssue]
+    source: str = "llm"  # 'local', 'cache' or 'llm'
 
 
 class VocabularyExtractRequest(BaseModel):
     content: str
+    session_id: Optional[str] = None  # leave out words already in this session's vocabulary bank
 
 
 class CompareProgressRequest(BaseModel):
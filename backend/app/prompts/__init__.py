@@ -1,15 +1,23 @@
 from .analysis import (
     ANALYSIS_SYSTEM_PROMPT,
     build_analysis_prompt,
+    build_chunk_analysis_prompt,
+    build_incremental_analysis_prompt,
+    build_vocabulary_extract_prompt,
     QUICK_CHECK_SYSTEM_PROMPT,
     QUICK_CHECK_USER_PROMPT,
+    VOCABULARY_DEFINE_PROMPT,
     VOCABULARY_EXTRACT_PROMPT,
 )
 
 __all__ = [
     "ANALYSIS_SYSTEM_PROMPT",
     "build_analysis_prompt",
+    "build_chunk_analysis_prompt",
+    "build_incremental_analysis_prompt",
+    "build_vocabulary_extract_prompt",
     "QUICK_CHECK_SYSTEM_PROMPT",
     "QUICK_CHECK_USER_PROMPT",
+    "VOCABULARY_DEFINE_PROMPT",
     "VOCABULARY_EXTRACT_PROMPT",
 ]
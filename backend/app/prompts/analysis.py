@@ -27,29 +27,20 @@ When analyzing text, you provide:
 
 Remember: Your job is not to make their writing "correct" but to help them become the writer they want to be. Transform clunky prose into elegant sentences. Show them what's possible."""
 
-ANALYSIS_USER_PROMPT = """Analyze the following text and provide transformative feedback that will help this writer level up.
-
-{persona_context}
-
-{patterns_context}
-
-TEXT TO ANALYZE:
-\"\"\"
-{content}
-\"\"\"
-
-Respond with a JSON object in this exact format:
+ANALYSIS_RESPONSE_FORMAT = """Respond with a JSON object in this exact format:
 {{
     "annotations": [
         {{
             "start_offset": <integer - character position where issue starts>,
             "end_offset": <integer - character position where issue ends>,
+            "original_text": "<the EXACT text between start_offset and end_offset, copied verbatim>",
             "category": "<style|structure|voice|clarity|impact|grammar>",
             "severity": "<info|warning|error>",
             "message": "<brief explanation of what makes this weaker and why the rewrite is better>",
             "suggestion": "<EXACT replacement text the user can copy-paste to fix this specific span>",
             "rewritten_version": "<the full sentence or passage rewritten beautifully - shows context>",
-            "principle": "<the timeless writing principle this teaches>"
+            "principle": "<the timeless writing principle this teaches>",
+            "pattern_type": "<pattern_type of the entry in \"patterns\" this annotation is an instance of, or null>"
         }}
     ],
     "scores": {{
@@ -60,16 +51,15 @@ Respond with a JSON object in this exact format:
     }},
     "patterns": [
         {{
-            "pattern_type": "<unique identifier for this pattern>",
+            "pattern_type": "<snake_case identifier for this pattern; reuse a historical pattern's identifier when it recurs>",
             "description": "<description of the tendency and how to overcome it>"
         }}
     ],
     "vocabulary_suggestions": [
         {{
             "word": "<a more vivid or precise word they could use>",
-            "definition": "<definition>",
+            "lemma": "<the word's dictionary form>",
             "part_of_speech": "<noun|verb|adjective|adverb|etc>",
-            "example_sentence": "<example showing the word in powerful context>",
             "replaces": "<what weaker word or phrase this could replace in their writing>"
         }}
     ],
@@ -86,18 +76,78 @@ Guidelines for world-class feedback:
 - The "principle" teaches why this change improves the writing
 - Transform clunky prose into elegant sentences in your rewrites
 - Tailor feedback to the writer's goals (academic, creative, professional, etc.)
-- Character offsets must be exact positions in the original text
-- Vocabulary suggestions should expand their expressive range, not just define words"""
+- Character offsets must be exact positions in the original text, and "original_text" must quote that span exactly
+- When an annotation is an instance of one of the reported patterns, set its "pattern_type" to that pattern's identifier
+- Vocabulary suggestions should expand their expressive range; name the words only, definitions are added separately"""
 
+ANALYSIS_USER_PROMPT = """Analyze the following text and provide transformative feedback that will help this writer level up.
 
-def build_analysis_prompt(
-    content: str,
-    persona: dict | None = None,
-    historical_patterns: list[str] | None = None,
-) -> str:
-    persona_context = ""
-    if persona:
-        persona_context = f"""WRITER PROFILE:
+{persona_context}
+
+{patterns_context}
+
+TEXT TO ANALYZE:
+\"\"\"
+{content}
+\"\"\"
+
+""" + ANALYSIS_RESPONSE_FORMAT
+
+INCREMENTAL_ANALYSIS_USER_PROMPT = """The writer has just revised part of a longer text. Analyze ONLY the revised passage and provide transformative feedback that will help this writer level up.
+
+{persona_context}
+
+{patterns_context}
+
+TEXT BEFORE THE REVISED PASSAGE (context only - do not annotate):
+\"\"\"
+{context_before}
+\"\"\"
+
+REVISED PASSAGE TO ANALYZE:
+\"\"\"
+{content}
+\"\"\"
+
+TEXT AFTER THE REVISED PASSAGE (context only - do not annotate):
+\"\"\"
+{context_after}
+\"\"\"
+
+Character offsets must be positions within the REVISED PASSAGE, counting from its first character.
+
+""" + ANALYSIS_RESPONSE_FORMAT
+
+CHUNK_ANALYSIS_USER_PROMPT = """Analyze ONE SECTION of a longer text and provide transformative feedback that will help this writer level up. The other sections are analyzed separately.
+
+{persona_context}
+
+{patterns_context}
+
+TEXT BEFORE THIS SECTION (context only - do not annotate):
+\"\"\"
+{context_before}
+\"\"\"
+
+SECTION TO ANALYZE:
+\"\"\"
+{content}
+\"\"\"
+
+TEXT AFTER THIS SECTION (context only - do not annotate):
+\"\"\"
+{context_after}
+\"\"\"
+
+Character offsets must be positions within the SECTION, counting from its first character. Scores and the summary should describe this section only.
+
+""" + ANALYSIS_RESPONSE_FORMAT
+
+
+def _persona_context(persona: dict | None) -> str:
+    if not persona:
+        return ""
+    return f"""WRITER PROFILE:
 - Goals: {', '.join(persona.get('goals', []))}
 - Experience Level: {persona.get('experience_level', 'intermediate')}
 - Focus Areas: {', '.join(persona.get('focus_areas', []))}
@@ -105,17 +155,59 @@ def build_analysis_prompt(
 
 Tailor your feedback to match this writer's level and goals."""
 
-    patterns_context = ""
-    if historical_patterns:
-        patterns_context = f"""HISTORICAL PATTERNS (mistakes this writer has made before):
+
+def _patterns_context(historical_patterns: list[str] | None) -> str:
+    if not historical_patterns:
+        return ""
+    return f"""HISTORICAL PATTERNS (mistakes this writer has made before):
 {chr(10).join(f'- {p}' for p in historical_patterns)}
 
 Pay special attention to whether these patterns appear in the current text."""
 
+
+def build_analysis_prompt(
+    content: str,
+    persona: dict | None = None,
+    historical_patterns: list[str] | None = None,
+) -> str:
     return ANALYSIS_USER_PROMPT.format(
         content=content,
-        persona_context=persona_context,
-        patterns_context=patterns_context,
+        persona_context=_persona_context(persona),
+        patterns_context=_patterns_context(historical_patterns),
+    )
+
+
+def build_incremental_analysis_prompt(
+    content: str,
+    context_before: str,
+    context_after: str,
+    persona: dict | None = None,
+    historical_patterns: list[str] | None = None,
+) -> str:
+    """Build a prompt that analyzes one revised passage of a longer document."""
+    return INCREMENTAL_ANALYSIS_USER_PROMPT.format(
+        content=content,
+        context_before=context_before,
+        context_after=context_after,
+        persona_context=_persona_context(persona),
+        patterns_context=_patterns_context(historical_patterns),
+    )
+
+
+def build_chunk_analysis_prompt(
+    content: str,
+    context_before: str,
+    context_after: str,
+    persona: dict | None = None,
+    historical_patterns: list[str] | None = None,
+) -> str:
+    """Build a prompt that analyzes one section of a document split for chunked analysis."""
+    return CHUNK_ANALYSIS_USER_PROMPT.format(
+        content=content,
+        context_before=context_before,
+        context_after=context_after,
+        persona_context=_persona_context(persona),
+        patterns_context=_patterns_context(historical_patterns),
     )
 
 
@@ -136,21 +228,50 @@ Respond with JSON:
 Only flag 1-3 most obvious issues. Be brief."""
 
 
-VOCABULARY_EXTRACT_PROMPT = """Extract interesting vocabulary words from this text that would be valuable for a learner:
+VOCABULARY_EXTRACT_PROMPT = """Pick interesting vocabulary words from this text that would be valuable for a learner:
 
 "{content}"
+{known_words_context}
+Respond with JSON:
+{{
+    "words": [
+        {{
+            "word": "<word as it appears in the text>",
+            "lemma": "<the word's dictionary form>",
+            "part_of_speech": "<noun|verb|adjective|adverb|etc>"
+        }}
+    ]
+}}
 
-Respond with JSON array:
-[
-    {{
-        "word": "<word>",
-        "definition": "<definition>",
-        "part_of_speech": "<part of speech>",
-        "example_sentence": "<example>"
-    }}
-]
-
-Select 3-5 words that are:
+Select 5-8 words that are:
 - Sophisticated but not obscure
 - Useful in professional or academic writing
 - Interesting for vocabulary building"""
+
+def build_vocabulary_extract_prompt(content: str, known_words: frozenset[str] = frozenset()) -> str:
+    """Build the vocabulary extraction prompt, naming the known words that occur in the text so they are not picked."""
+    lowered = content.lower()
+    present = sorted(w for w in known_words if w in lowered)
+    known_words_context = ""
+    if present:
+        known_words_context = f"""
+The learner already knows these words; do not pick them: {', '.join(present)}
+"""
+    return VOCABULARY_EXTRACT_PROMPT.format(content=content, known_words_context=known_words_context)
+
+
+VOCABULARY_DEFINE_PROMPT = """Define these words for a vocabulary learner:
+
+{words}
+
+Respond with JSON:
+{{
+    "definitions": [
+        {{
+            "lemma": "<lemma as given>",
+            "part_of_speech": "<part of speech as given>",
+            "definition": "<concise definition for this part of speech>",
+            "example_sentence": "<example showing the word in powerful context>"
+        }}
+    ]
+}}"""
@@ -0,0 +1,128 @@
+import logging
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from app.models import Annotation
+
+logger = logging.getLogger(__name__)
+
+NGRAM = 6
+WORD_START = re.compile(r"\b\w")
+# How far from the model's offset a quote is searched for when the index cannot help
+NEARBY_WINDOW = 200
+
+# Cumulative counts across all analyses, by outcome
+alignment_totals: Counter = Counter()
+
+
+@dataclass
+class AlignmentReport:
+    checked: int = 0
+    corrected: int = 0
+    dropped: int = 0
+
+
+class TextIndex:
+    """Positions of the ``NGRAM`` characters starting each word of a text, built once per document.
+
+    Matching is case-insensitive. A quote is located by looking up the
+    rarest of a few of its word-start n-grams and verifying the handful of
+    candidate positions, so each lookup costs about the same however long
+    the text is.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.folded = text.lower()
+        self.positions: dict[str, list[int]] = defaultdict(list)
+        folded = self.folded
+        for match in WORD_START.finditer(folded):
+            i = match.start()
+            self.positions[folded[i:i + NGRAM]].append(i)
+
+    def find(self, quote: str, near: int) -> int | None:
+        """Start of the occurrence of ``quote`` closest to ``near``, or None when it does not occur."""
+        folded_quote = quote.lower()
+        # A word start inside the quote is a word start in the text too; the quote's own
+        # first character may sit mid-word, so it is only used when nothing else is available
+        probes = [m.start() for m in WORD_START.finditer(folded_quote, 1) if m.start() + NGRAM <= len(folded_quote)]
+        if probes:
+            return self._find_indexed(folded_quote, near, {probes[0], probes[len(probes) // 2], probes[-1]})
+        if len(folded_quote) >= NGRAM:
+            found = self._find_indexed(folded_quote, near, {0})
+            if found is not None:
+                return found
+        return self._find_nearby(folded_quote, near)
+
+    def _find_indexed(self, folded_quote: str, near: int, probes: set[int]) -> int | None:
+        # The rarest probed n-gram bounds the work
+        offset, candidates = min(
+            ((p, self.positions.get(folded_quote[p:p + NGRAM], [])) for p in probes),
+            key=lambda probe: len(probe[1]),
+        )
+        best = None
+        for position in candidates:
+            start = position - offset
+            if start >= 0 and self.folded.startswith(folded_quote, start):
+                if best is None or abs(start - near) < abs(best - near):
+                    best = start
+        return best
+
+    def _find_nearby(self, folded_quote: str, near: int) -> int | None:
+        """Scan around ``near`` for quotes too short to look up in the index."""
+        lo = max(0, near - NEARBY_WINDOW)
+        window = self.folded[lo:near + NEARBY_WINDOW + len(folded_quote)]
+        best = None
+        start = window.find(folded_quote)
+        while start != -1:
+            if best is None or abs(lo + start - near) < abs(best - near):
+                best = lo + start
+            start = window.find(folded_quote, start + 1)
+        return best
+
+
+def align_annotations(index: TextIndex, annotations: list[Annotation]) -> tuple[list[Annotation], AlignmentReport]:
+    """Snap each annotation onto the span of text it quotes.
+
+    Annotations whose ``original_text`` cannot be found, or that quote
+    nothing and point outside the text, are dropped.
+    """
+    report = AlignmentReport()
+    aligned = []
+    for annotation in annotations:
+        result = align_annotation(index, annotation)
+        report.checked += 1
+        if result is None:
+            report.dropped += 1
+            continue
+        if result is not annotation:
+            report.corrected += 1
+        aligned.append(result)
+
+    alignment_totals.update(checked=report.checked, corrected=report.corrected, dropped=report.dropped)
+    if report.corrected or report.dropped:
+        logger.info(
+            f"[ALIGN] Checked {report.checked} annotations: corrected {report.corrected}, dropped {report.dropped}"
+        )
+    return aligned, report
+
+
+def align_annotation(index: TextIndex, annotation: Annotation) -> Annotation | None:
+    """Return the annotation unchanged, a corrected copy, or None when it cannot be placed."""
+    text = index.text
+    quote = annotation.original_text
+    if not quote:
+        if 0 <= annotation.start_offset < annotation.end_offset <= len(text):
+            return annotation
+        return None
+
+    if annotation.start_offset >= 0 and text[annotation.start_offset:annotation.end_offset] == quote:
+        return annotation
+    start = index.find(quote, annotation.start_offset)
+    if start is None:
+        return None
+    if start == annotation.start_offset and start + len(quote) == annotation.end_offset:
+        # Only the case differed
+        return annotation
+    return annotation.model_copy(update={"start_offset": start, "end_offset": start + len(quote)})
@@ -0,0 +1,275 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import AsyncIterator, Protocol
+
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from app.config import get_settings
+from app.services.singleflight import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Streamed analyses are served from recordings of the equivalent non-streamed call
+REPLAY_FALLBACK_LABELS = {"stream_analysis": "analyze_document"}
+REPLAY_STREAM_CHUNK_CHARS = 24
+
+
+class RawCompletion(Protocol):
+    """The part of an OpenAI raw response the scheduler relies on."""
+
+    headers: dict
+
+    def parse(self): ...
+
+
+class LLMBackend(Protocol):
+    """Something that can serve chat completion requests.
+
+    ``create`` takes the label of the calling LLMService method and the
+    chat completion parameters, and returns a raw response whose
+    ``parse()`` gives a ChatCompletion, or an async iterator of
+    ChatCompletionChunk when ``stream=True``.
+    """
+
+    async def create(self, label: str, **params) -> RawCompletion: ...
+
+
+class OpenAIBackend:
+    """The OpenAI API, or any server implementing its chat completions endpoint (vLLM, llama.cpp, Ollama)."""
+
+    def __init__(self, api_key: str, base_url: str | None = None):
+        # Retries are owned by the scheduler so rate limits can shrink its concurrency window
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+    async def create(self, label: str, **params):
+        return await self.client.chat.completions.with_raw_response.create(**params)
+
+
+class RecordingBackend:
+    """Pass requests to another backend and append each completion to a JSON-lines file for replay.
+
+    Streamed completions are passed through without being recorded.
+    """
+
+    def __init__(self, inner: LLMBackend, path: str):
+        self.inner = inner
+        self.path = Path(path)
+
+    async def create(self, label: str, **params):
+        started = time.perf_counter()
+        raw = await self.inner.create(label, **params)
+        if params.get("stream"):
+            return raw
+        latency_ms = (time.perf_counter() - started) * 1000
+        completion = raw.parse()
+        line = json.dumps(
+            {
+                "label": label,
+                "key": fingerprint(params),
+                "latency_ms": round(latency_ms, 1),
+                "completion": completion.model_dump(mode="json"),
+            }
+        ) + "\n"
+        await asyncio.to_thread(self._append, line)
+        return _ReplayedCompletion(completion, raw.headers)
+
+    def _append(self, line: str) -> None:
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class LatencyDistribution:
+    """Sample simulated response latencies from a spec string.
+
+    ``fixed:MS``, ``uniform:LOW_MS,HIGH_MS``, ``normal:MEAN_MS,STDDEV_MS``,
+    ``lognormal:MEDIAN_MS,SIGMA`` or ``recorded`` (the latency observed
+    when the completion was recorded).
+    """
+
+    def __init__(self, spec: str, seed: int | None = None):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.args = [float(a) for a in args.split(",") if a.strip()]
+        if self.kind not in ("fixed", "uniform", "normal", "lognormal", "recorded"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        self.random = random.Random(seed)
+
+    def sample_ms(self, recorded_ms: float) -> float:
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return self.random.uniform(self.args[0], self.args[1])
+        if self.kind == "normal":
+            return max(0.0, self.random.gauss(self.args[0], self.args[1]))
+        if self.kind == "lognormal":
+            return self.args[0] * self.random.lognormvariate(0, self.args[1])
+        return recorded_ms
+
+
+class ReplayBackend:
+    """Serve recorded completions without any network access.
+
+    A request whose parameters match a recording exactly gets that
+    recording; any other request gets the next recording made for the same
+    LLMService method, in rotation. Each response is delayed by a latency
+    sampled from ``latency``, and streamed requests receive the recorded
+    content in small chunks spread over that latency.
+    """
+
+    def __init__(self, path: str, latency: LatencyDistribution):
+        self.latency = latency
+        self.by_key: dict[str, dict] = {}
+        self.by_label: dict[str, list[dict]] = defaultdict(list)
+        self._next: dict[str, int] = defaultdict(int)
+        with Path(path).open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    recording = json.loads(line)
+                    self.by_key[recording["key"]] = recording
+                    self.by_label[recording["label"]].append(recording)
+        logger.info(f"[REPLAY] Loaded {len(self.by_key)} recordings from {path}")
+
+    def _lookup(self, label: str, params: dict) -> dict:
+        recording = self.by_key.get(fingerprint({k: v for k, v in params.items() if k not in ("stream", "stream_options")}))
+        if recording is not None:
+            return recording
+        label = label if self.by_label.get(label) else REPLAY_FALLBACK_LABELS.get(label, label)
+        candidates = self.by_label.get(label)
+        if not candidates:
+            raise LookupError(f"No recorded completions for {label}")
+        recording = candidates[self._next[label] % len(candidates)]
+        self._next[label] += 1
+        return recording
+
+    async def create(self, label: str, **params):
+        recording = self._lookup(label, params)
+        completion = ChatCompletion.model_validate(recording["completion"])
+        latency = self.latency.sample_ms(recording.get("latency_ms", 0)) / 1000
+        if params.get("stream"):
+            return _ReplayedCompletion(self._stream(completion, latency))
+        await asyncio.sleep(latency)
+        return _ReplayedCompletion(completion)
+
+    async def _stream(self, completion: ChatCompletion, latency: float) -> AsyncIterator[ChatCompletionChunk]:
+        content = completion.choices[0].message.content or ""
+        pieces = [content[i:i + REPLAY_STREAM_CHUNK_CHARS] for i in range(0, len(content), REPLAY_STREAM_CHUNK_CHARS)]
+        delay = latency / (len(pieces) + 1)
+        for piece in pieces:
+            await asyncio.sleep(delay)
+            yield ChatCompletionChunk.model_validate(
+                {
+                    "id": completion.id,
+                    "object": "chat.completion.chunk",
+                    "created": completion.created,
+                    "model": completion.model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+            )
+        await asyncio.sleep(delay)
+        yield ChatCompletionChunk.model_validate(
+            {
+                "id": completion.id,
+                "object": "chat.completion.chunk",
+                "created": completion.created,
+                "model": completion.model,
+                "choices": [],
+                "usage": completion.usage.model_dump() if completion.usage else None,
+            }
+        )
+
+
+class _ReplayedCompletion:
+    def __init__(self, value, headers=None):
+        self.headers = headers or {}
+        self._value = value
+
+    def parse(self):
+        return self._value
+
+
+class OpenAIBatchClient:
+    """Chat completions through the OpenAI Batch API, at a lower price and within a 24 hour window."""
+
+    FINISHED_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+    def __init__(self, api_key: str):
+        self.client = AsyncOpenAI(api_key=api_key)
+
+    async def submit(self, requests: dict[str, dict], metadata: dict[str, str] | None = None) -> str:
+        """Upload one chat completion request per custom ID and start a batch; returns the batch ID."""
+        lines = "".join(
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": params}) + "\n"
+            for custom_id, params in requests.items()
+        )
+        upload = await self.client.files.create(file=("batch.jsonl", lines.encode()), purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            metadata=metadata,
+        )
+        return batch.id
+
+    async def wait(self, batch_id: str, poll_seconds: float, on_progress=None):
+        """Poll until the batch has finished, calling ``on_progress(completed, failed)`` along the way."""
+        while True:
+            batch = await self.client.batches.retrieve(batch_id)
+            if on_progress is not None and batch.request_counts is not None:
+                on_progress(batch.request_counts.completed, batch.request_counts.failed)
+            if batch.status in self.FINISHED_STATUSES:
+                return batch
+            await asyncio.sleep(poll_seconds)
+
+    async def cancel(self, batch_id: str) -> None:
+        await self.client.batches.cancel(batch_id)
+
+    async def results(self, batch) -> dict[str, ChatCompletion | str]:
+        """The completion, or an error message, for each custom ID that has a result.
+
+        An expired or cancelled batch has results for the requests it finished.
+        """
+        results: dict[str, ChatCompletion | str] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await self.client.files.content(file_id)
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") == 200:
+                    results[record["custom_id"]] = ChatCompletion.model_validate(response["body"])
+                else:
+                    error = record.get("error") or response.get("body", {}).get("error") or {}
+                    results[record["custom_id"]] = error.get("message") or f"status {response.get('status_code')}"
+        return results
+
+
+def create_batch_client() -> OpenAIBatchClient | None:
+    """The provider batch client, or None when LLM_BACKEND is not the OpenAI API itself."""
+    settings = get_settings()
+    if settings.llm_backend != "openai" or settings.llm_base_url:
+        return None
+    return OpenAIBatchClient(settings.openai_api_key)
+
+
+def create_llm_backend() -> LLMBackend:
+    """Build the backend selected by LLM_BACKEND, wrapped for recording when LLM_RECORD_PATH is set."""
+    settings = get_settings()
+    if settings.llm_backend == "replay":
+        backend = ReplayBackend(settings.llm_replay_path, LatencyDistribution(settings.llm_replay_latency))
+    elif settings.llm_backend == "openai":
+        backend = OpenAIBackend(settings.openai_api_key, settings.llm_base_url or None)
+    else:
+        raise ValueError(f"Unknown LLM backend: {settings.llm_backend}")
+    if settings.llm_record_path:
+        backend = RecordingBackend(backend, settings.llm_record_path)
+    return backend
@@ -0,0 +1,391 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import AsyncIterator
+
+from app.config import get_settings
+from app.models import AnalysisResponse
+from app.services.backends import create_batch_client
+from app.services.cache import get_analysis_cache, make_analysis_key
+from app.services.context import AnalysisContext, get_context_loader
+from app.services.incremental import get_incremental_analyzer
+from app.services.llm import get_llm_service
+from app.services.mastery import get_mastery_job
+from app.services.metrics import record_token_usage, stage
+from app.services.scheduler import Priority
+from app.services.supabase import get_documents, save_analysis_results
+from app.services.write_queue import get_write_queue
+
+logger = logging.getLogger(__name__)
+
+# Documents are fetched with an IN filter in the request URL; this keeps the URL short
+DOCUMENT_FETCH_SIZE = 100
+
+FINISHED_STATUSES = {"completed", "failed", "cancelled"}
+
+
+class BatchJob:
+    """Progress of one batch analysis job.
+
+    ``events`` is append-only: one ``document`` event per finished document
+    and a final ``done`` event, so a progress stream can start at any time
+    and replay what it missed.
+    """
+
+    def __init__(self, document_ids: list[str], mode: str):
+        self.id = uuid.uuid4().hex
+        self.mode = mode  # "realtime" or "provider"
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.provider_batch_id: str | None = None
+        self.error: str | None = None
+        self.tokens_used = 0
+        self.documents: dict[str, dict] = {document_id: {"status": "pending"} for document_id in document_ids}
+        self.events: list[dict] = []
+        self._changed = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def record(self, document_id: str, status: str, **details) -> None:
+        """Record that a document has been saved ("completed") or given up on ("failed")."""
+        self.documents[document_id] = {"status": status, **details}
+        self.tokens_used += details.get("tokens_used", 0)
+        self._emit("document", {"document_id": document_id, **self.documents[document_id]})
+
+    def finish(self, status: str, error: str | None = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self._emit("done", self.summary())
+
+    def _emit(self, event: str, data: dict) -> None:
+        self.events.append({"event": event, "data": data})
+        # Wake everyone following the job; later waits use a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[dict]:
+        """Yield every event so far, then each new one, until the job has finished."""
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.finished:
+                return
+            await changed.wait()
+
+    def summary(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "mode": self.mode,
+            "provider_batch_id": self.provider_batch_id,
+            "total": len(self.documents),
+            "counts": dict(Counter(d["status"] for d in self.documents.values())),
+            "tokens_used": self.tokens_used,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+    def to_dict(self) -> dict:
+        return {**self.summary(), "documents": self.documents}
+
+
+class BatchProcessor:
+    """Analyze many documents per job in the background.
+
+    Documents of all jobs share ``concurrency`` analysis slots and reach the
+    LLM at batch priority, so interactive requests are served first. Results
+    are saved ``save_size`` at a time with one save_analysis_results call; a
+    save that fails hands its results to the write-behind queue, which
+    retries them one by one. Jobs sent through the provider's batch API
+    (``provider`` mode) are analyzed there at its lower price, and any
+    document it returns no usable result for is analyzed in real time.
+
+    Jobs live in memory, the ``max_jobs`` most recent ones; a restart
+    loses running jobs along with their progress.
+    """
+
+    def __init__(self, concurrency: int, save_size: int, max_jobs: int, provider_poll_seconds: float):
+        self.save_size = save_size
+        self.max_jobs = max_jobs
+        self.provider_poll_seconds = provider_poll_seconds
+        self.batch_client = create_batch_client()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._jobs: OrderedDict[str, BatchJob] = OrderedDict()
+        self.documents_completed = 0
+        self.documents_failed = 0
+        self.provider_batches = 0
+
+    @property
+    def provider_available(self) -> bool:
+        return self.batch_client is not None
+
+    def submit(self, document_ids: list[str], provider_batch: bool = False) -> BatchJob:
+        """Start a job; ``provider_batch`` is ignored when the provider has no batch API."""
+        job = BatchJob(document_ids, "provider" if provider_batch and self.provider_available else "realtime")
+        self._jobs[job.id] = job
+        self._evict()
+        job._task = asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str) -> BatchJob | None:
+        return self._jobs.get(job_id)
+
+    def _evict(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    async def stop(self) -> None:
+        """Cancel running jobs; analyses not yet saved go to the write-behind queue."""
+        tasks = [job._task for job in self._jobs.values() if job._task is not None and not job.finished]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: BatchJob) -> None:
+        job.status = "running"
+        logger.info(f"[BATCH] Job {job.id} started: {len(job.documents)} documents, {job.mode} mode")
+        unsaved: list[dict] = []
+        try:
+            documents = await self._load_documents(job)
+            if job.mode == "provider":
+                documents = await self._run_provider_batch(job, documents, unsaved)
+            await asyncio.gather(*(self._analyze(job, row, context, unsaved) for row, context in documents))
+            await self._save(job, unsaved)
+        except asyncio.CancelledError:
+            for result in unsaved:
+                await get_write_queue().enqueue(**result)
+            job.finish("cancelled")
+            raise
+        except Exception as e:
+            logger.exception(f"[BATCH] Job {job.id} failed")
+            await self._save(job, unsaved)
+            job.finish("failed", f"{type(e).__name__}: {str(e)}")
+            return
+        job.finish("completed")
+        counts = job.summary()["counts"]
+        logger.info(f"[BATCH] Job {job.id} finished: {counts}, {job.tokens_used} tokens")
+
+    async def _load_documents(self, job: BatchJob) -> list[tuple[dict, AnalysisContext]]:
+        """Fetch the job's documents and their sessions' contexts; unknown documents fail right away."""
+        document_ids = list(job.documents)
+        rows = []
+        for start in range(0, len(document_ids), DOCUMENT_FETCH_SIZE):
+            rows.extend(await get_documents(document_ids[start:start + DOCUMENT_FETCH_SIZE]))
+        found = {row["id"] for row in rows}
+        for document_id in document_ids:
+            if document_id not in found:
+                self.documents_failed += 1
+                job.record(document_id, "failed", error="Document not found")
+
+        loader = get_context_loader()
+        session_ids = list({row["session_id"] for row in rows})
+        contexts = dict(zip(session_ids, await asyncio.gather(*(loader.load_session(s) for s in session_ids))))
+        return [(row, contexts[row["session_id"]]) for row in rows]
+
+    async def _cached(self, row: dict, context: AnalysisContext) -> tuple[str, AnalysisResponse | None, str | None]:
+        """The document's cache key, and its cached analysis and the model that answered it, if any."""
+        key = make_analysis_key(row["content"], context.persona, context.historical_patterns, get_llm_service().model)
+        found = await get_analysis_cache().get(key) if get_settings().analysis_cache_enabled else None
+        return (key, *found) if found is not None else (key, None, None)
+
+    async def _analyze(self, job: BatchJob, row: dict, context: AnalysisContext, unsaved: list[dict]) -> None:
+        llm = get_llm_service()
+        async with self._slots:
+            try:
+                key, analysis, model_used = await self._cached(row, context)
+                tokens_used = 0
+                if analysis is None:
+                    with stage("batch.llm"):
+                        analysis, tokens_used, model_used = await llm.analyze_document(
+                            row["content"],
+                            context.persona,
+                            context.historical_patterns,
+                            priority=Priority.BATCH,
+                            known_words=context.known_words,
+                        )
+                    if get_settings().analysis_cache_enabled:
+                        await get_analysis_cache().set(key, analysis, model_used)
+            except Exception as e:
+                logger.warning(f"[BATCH] Analysis of document {row['id']} failed: {type(e).__name__}: {str(e)}")
+                self.documents_failed += 1
+                job.record(row["id"], "failed", error=f"{type(e).__name__}: {str(e)}")
+                return
+        await self._add_result(job, row, context, analysis, tokens_used, model_used, unsaved)
+
+    async def _run_provider_batch(
+        self,
+        job: BatchJob,
+        documents: list[tuple[dict, AnalysisContext]],
+        unsaved: list[dict],
+    ) -> list[tuple[dict, AnalysisContext]]:
+        """Analyze what the provider's batch API can take; returns the documents left for real time.
+
+        Cached documents are served from the cache, and documents that would
+        be analyzed in chunks are left for real time.
+        """
+        llm = get_llm_service()
+        remaining = []
+        requests: dict[str, dict] = {}
+        submitted: dict[str, tuple[dict, AnalysisContext, str]] = {}
+        for row, context in documents:
+            key, analysis, model_used = await self._cached(row, context)
+            if analysis is not None:
+                await self._add_result(job, row, context, analysis, 0, model_used, unsaved)
+                continue
+            params = llm.analysis_request(row["content"], context.persona, context.historical_patterns)
+            if params is None:
+                remaining.append((row, context))
+                continue
+            requests[row["id"]] = params
+            submitted[row["id"]] = (row, context, key)
+        if not requests:
+            return remaining
+
+        try:
+            job.provider_batch_id = await self.batch_client.submit(requests, metadata={"job_id": job.id})
+        except Exception as e:
+            logger.warning(f"[BATCH] Job {job.id} could not start a provider batch, analyzing in real time: {type(e).__name__}: {str(e)}")
+            job.mode = "realtime"
+            return remaining + [(row, context) for row, context, _ in submitted.values()]
+        self.provider_batches += 1
+        logger.info(f"[BATCH] Job {job.id}: {len(requests)} documents sent as provider batch {job.provider_batch_id}")
+        try:
+            batch = await self.batch_client.wait(job.provider_batch_id, self.provider_poll_seconds)
+        except asyncio.CancelledError:
+            # The job is gone with this process, so stop paying for the batch
+            try:
+                await self.batch_client.cancel(job.provider_batch_id)
+            except Exception as e:
+                logger.warning(f"[BATCH] Could not cancel provider batch {job.provider_batch_id}: {str(e)}")
+            raise
+        results = await self.batch_client.results(batch)
+        logger.info(f"[BATCH] Provider batch {job.provider_batch_id} {batch.status}: {len(results)} of {len(requests)} results")
+
+        for document_id, (row, context, key) in submitted.items():
+            result = results.get(document_id)
+            try:
+                if result is None or isinstance(result, str):
+                    raise ValueError(result or "no result")
+                record_token_usage(llm.model, result.usage)
+                tokens_used = result.usage.total_tokens if result.usage else 0
+                analysis = llm.parse_analysis(result.choices[0].message.content, row["content"], tokens_used)
+                analysis.vocabulary_suggestions, vocabulary_tokens = await llm.define_vocabulary(
+                    analysis.vocabulary_suggestions, context.known_words, Priority.BATCH
+                )
+                tokens_used += vocabulary_tokens
+            except Exception as e:
+                logger.warning(f"[BATCH] Provider batch had no usable result for document {document_id}, analyzing it in real time: {str(e)}")
+                remaining.append((row, context))
+                continue
+            # analysis_request never cascades, so the full model answered
+            if get_settings().analysis_cache_enabled:
+                await get_analysis_cache().set(key, analysis, llm.model)
+            await self._add_result(job, row, context, analysis, tokens_used, llm.model, unsaved)
+        return remaining
+
+    async def _add_result(
+        self,
+        job: BatchJob,
+        row: dict,
+        context: AnalysisContext,
+        analysis: AnalysisResponse,
+        tokens_used: int,
+        model_used: str,
+        unsaved: list[dict],
+    ) -> None:
+        llm = get_llm_service()
+        # The cache and the snapshot keep every suggestion; the saved result leaves out the session's known words
+        get_incremental_analyzer().record(
+            row["id"], row["content"], context.persona, context.historical_patterns, llm.model, analysis
+        )
+        analysis, vocabulary_tokens = await llm.analysis_for_session(analysis, context.known_words, Priority.BATCH)
+        tokens_used += vocabulary_tokens
+        raw_response = analysis.model_dump()
+        unsaved.append(
+            {
+                "document_id": row["id"],
+                "session_id": context.session_id,
+                "annotations": raw_response["annotations"],
+                "scores": raw_response["scores"],
+                "patterns": raw_response["patterns"],
+                "raw_response": raw_response,
+                "model_used": model_used,
+                "tokens_used": tokens_used,
+            }
+        )
+        if len(unsaved) >= self.save_size:
+            # Taken out first, so concurrent analyses that finish meanwhile start the next save
+            results = unsaved[:]
+            unsaved.clear()
+            try:
+                await self._save(job, results)
+            except asyncio.CancelledError:
+                # Put back for _run, which hands unsaved results to the write queue
+                unsaved.extend(results)
+                raise
+
+    async def _save(self, job: BatchJob, results: list[dict]) -> None:
+        if not results:
+            return
+        try:
+            with stage("batch.persist"):
+                await save_analysis_results(results)
+        except Exception as e:
+            logger.warning(
+                f"[BATCH] Saving {len(results)} results failed, handing them to the write queue: "
+                f"{type(e).__name__}: {str(e)}"
+            )
+            for result in results:
+                await get_write_queue().enqueue(**result)
+        else:
+            # Saving upserts the sessions' patterns, so their cached contexts are stale
+            for session_id in {result["session_id"] for result in results}:
+                get_context_loader().invalidate(session_id)
+                get_mastery_job().mark(session_id)
+        for result in results:
+            self.documents_completed += 1
+            job.record(
+                result["document_id"],
+                "completed",
+                annotations=len(result["annotations"]),
+                tokens_used=result["tokens_used"],
+            )
+
+    def stats(self) -> dict:
+        return {
+            "jobs": len(self._jobs),
+            "jobs_running": sum(1 for job in self._jobs.values() if not job.finished),
+            "documents_completed": self.documents_completed,
+            "documents_failed": self.documents_failed,
+            "provider_batches": self.provider_batches,
+            "provider_available": self.provider_available,
+        }
+
+
+# Singleton instance
+_batch_processor: BatchProcessor | None = None
+
+
+def get_batch_processor() -> BatchProcessor:
+    global _batch_processor
+    if _batch_processor is None:
+        settings = get_settings()
+        _batch_processor = BatchProcessor(
+            concurrency=settings.batch_concurrency,
+            save_size=settings.batch_save_size,
+            max_jobs=settings.batch_max_jobs,
+            provider_poll_seconds=settings.batch_provider_poll_seconds,
+        )
+    return _batch_processor
@@ -0,0 +1,150 @@
+import logging
+import math
+from datetime import datetime, timezone
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Chat formatting overhead per message and per reply, as documented for OpenAI chat models
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+# A pattern seen this many days ago counts half as much as one seen today
+PATTERN_HALF_LIFE_DAYS = 30
+
+
+# Encodings by model; None when the model's encoding could not be loaded
+_encodings: dict[str, object] = {}
+
+
+def load_encoding(model: str):
+    """The tiktoken encoding for ``model``, or None without one; loaded once per model.
+
+    Encodings are downloaded on first use, which blocks and can fail
+    offline, so the app loads the model's encoding in a worker thread at
+    startup and ``TokenCounter`` finds it here.
+    """
+    if model in _encodings:
+        return _encodings[model]
+    encoding = None
+    if tiktoken is None:
+        logger.warning("[BUDGET] tiktoken is not installed, estimating 4 characters per token")
+    else:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"[BUDGET] Could not load a tokenizer for {model}, estimating 4 characters per token: {str(e)}")
+    _encodings[model] = encoding
+    return encoding
+
+
+class TokenCounter:
+    """Count tokens with the model's tiktoken encoding, or ~4 characters per token without it."""
+
+    def __init__(self, model: str):
+        self.encoding = load_encoding(model)
+
+    def count(self, text: str) -> int:
+        if self.encoding is None:
+            return math.ceil(len(text) / 4)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def count_messages(self, messages: list[dict]) -> int:
+        return sum(self.count(m["content"]) + TOKENS_PER_MESSAGE for m in messages) + TOKENS_PER_REPLY
+
+
+def rank_patterns(rows: list[dict]) -> list[str]:
+    """Order writing_patterns rows by how much they matter now, dropping mastered ones.
+
+    A pattern's weight is its occurrence_count, halved for every
+    ``PATTERN_HALF_LIFE_DAYS`` since it last occurred.
+    """
+    now = datetime.now(timezone.utc)
+
+    def weight(row: dict) -> float:
+        count = row.get("occurrence_count") or 1
+        last = row.get("last_occurrence_at")
+        if not last:
+            return count
+        age_days = (now - datetime.fromisoformat(last)).total_seconds() / 86400
+        return count * 0.5 ** (max(age_days, 0) / PATTERN_HALF_LIFE_DAYS)
+
+    active = [row for row in rows if not row.get("is_mastered")]
+    return [_describe(row) for row in sorted(active, key=weight, reverse=True)]
+
+
+def _describe(row: dict) -> str:
+    # The identifier lets the model report a recurring pattern under the same pattern_type
+    if row.get("pattern_type"):
+        return f"{row['pattern_type']}: {row['description']}"
+    return row["description"]
+
+
+class PromptBudget:
+    """Fit historical patterns into a token budget for the analysis prompt.
+
+    Patterns are taken in rank order. Each one is cut to
+    ``max_pattern_tokens``; once the budget is spent, the rest are replaced
+    by a single line saying how many were left out.
+    """
+
+    def __init__(self, counter: TokenCounter, pattern_tokens: int, max_pattern_tokens: int):
+        self.counter = counter
+        self.pattern_tokens = pattern_tokens
+        self.max_pattern_tokens = max_pattern_tokens
+
+    def fit_patterns(self, patterns: list[str] | None) -> list[str] | None:
+        if not patterns:
+            return patterns
+        fitted = []
+        used = 0
+        for i, pattern in enumerate(patterns):
+            pattern = self._trim(pattern)
+            cost = self.counter.count(pattern)
+            if used + cost > self.pattern_tokens:
+                fitted.append(f"(and {len(patterns) - i} less frequent patterns)")
+                logger.info(f"[BUDGET] Kept {i} of {len(patterns)} historical patterns ({used} tokens)")
+                break
+            fitted.append(pattern)
+            used += cost
+        return fitted
+
+    def _trim(self, pattern: str) -> str:
+        if self.counter.count(pattern) <= self.max_pattern_tokens:
+            return pattern
+        # Keep the first sentence when it fits, otherwise cut to the character equivalent of the limit
+        first_sentence = pattern.split(". ")[0].rstrip(".") + "."
+        if self.counter.count(first_sentence) <= self.max_pattern_tokens:
+            return first_sentence
+        return pattern[:self.max_pattern_tokens * 4].rsplit(" ", 1)[0] + "..."
+
+
+class TokenEstimateStats:
+    """Compare prompt token estimates with the counts the API reports."""
+
+    def __init__(self):
+        self.samples = 0
+        self.estimated = 0
+        self.actual = 0
+        self.absolute_error = 0
+
+    def record(self, estimated: int, actual: int) -> None:
+        self.samples += 1
+        self.estimated += estimated
+        self.actual += actual
+        self.absolute_error += abs(estimated - actual)
+
+    def stats(self) -> dict:
+        return {
+            "samples": self.samples,
+            "estimated_prompt_tokens": self.estimated,
+            "actual_prompt_tokens": self.actual,
+            "mean_absolute_error_pct": round(100 * self.absolute_error / self.actual, 2) if self.actual else None,
+        }
+
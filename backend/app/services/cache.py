@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+
+from app.config import get_settings
+from app.models import AnalysisResponse
+from app.services.supabase import get_supabase
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """In-process LRU cache whose entries expire after a fixed TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def normalize_persona(persona: dict | None) -> dict | None:
+    """Fill persona defaults and sort list fields so equivalent personas compare equal."""
+    if not persona:
+        return None
+    return {
+        "goals": sorted(g.strip() for g in persona.get("goals", [])),
+        "experience_level": persona.get("experience_level", "intermediate").strip(),
+        "focus_areas": sorted(f.strip() for f in persona.get("focus_areas", [])),
+        "preferred_tone": persona.get("preferred_tone", "balanced").strip(),
+    }
+
+
+def make_analysis_key(
+    content: str,
+    persona: dict | None,
+    historical_patterns: list[str] | None,
+    model: str,
+) -> str:
+    """Build the content-addressed cache key for an analysis request."""
+    payload = {
+        "content": content,
+        "persona": normalize_persona(persona),
+        "patterns": sorted({p.strip() for p in historical_patterns or []}),
+        "model": model,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SupabaseCacheTier:
+    """Shared cache tier backed by the analysis_cache table."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> tuple[AnalysisResponse, str] | None:
+        result = (
+            await get_supabase()
+            .table("analysis_cache")
+            .select("response, model_used")
+            .eq("key", key)
+            .gt("expires_at", "now()")
+            .limit(1)
+            .execute()
+        )
+        if not result.data:
+            return None
+        row = result.data[0]
+        return AnalysisResponse(**row["response"]), row["model_used"]
+
+    async def set(self, key: str, analysis: AnalysisResponse, model: str) -> None:
+        await get_supabase().table("analysis_cache").upsert(
+            {
+                "key": key,
+                "response": analysis.model_dump(),
+                "model_used": model,
+                "expires_at": _expires_at(self.ttl_seconds),
+            }
+        ).execute()
+
+
+def _expires_at(ttl_seconds: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + ttl_seconds))
+
+
+class AnalysisCache:
+    """Two-tier cache for full document analyses.
+
+    The local tier is checked first; the optional shared tier lets several
+    API workers reuse each other's results. Shared-tier failures are logged
+    and treated as misses so the cache can never fail a request. Entries
+    keep the model that answered, which a cascade may have made the quick one.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, shared: bool = False):
+        self.local = TTLCache(max_entries, ttl_seconds)
+        self.shared = SupabaseCacheTier(ttl_seconds) if shared else None
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+
+    async def get(self, key: str) -> tuple[AnalysisResponse, str] | None:
+        """The cached analysis and the model that answered it."""
+        entry = self.local.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        if self.shared is not None:
+            try:
+                entry = await self.shared.get(key)
+            except Exception as e:
+                logger.warning(f"[CACHE] Shared tier lookup failed: {type(e).__name__}: {str(e)}")
+                entry = None
+            if entry is not None:
+                self.hits += 1
+                self.shared_hits += 1
+                self.local.set(key, entry)
+                return entry
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, analysis: AnalysisResponse, model: str) -> None:
+        self.local.set(key, (analysis, model))
+        if self.shared is not None:
+            try:
+                await self.shared.set(key, analysis, model)
+            except Exception as e:
+                logger.warning(f"[CACHE] Shared tier write failed: {type(e).__name__}: {str(e)}")
+
+    def record_bypass(self) -> None:
+        self.bypasses += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "local_entries": len(self.local),
+        }
+
+
+# Singleton instance
+_analysis_cache: AnalysisCache | None = None
+
+
+def get_analysis_cache() -> AnalysisCache:
+    global _analysis_cache
+    if _analysis_cache is None:
+        settings = get_settings()
+        _analysis_cache = AnalysisCache(
+            max_entries=settings.analysis_cache_max_entries,
+            ttl_seconds=settings.analysis_cache_ttl_seconds,
+            shared=settings.analysis_cache_shared,
+        )
+    return _analysis_cache
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from app.config import get_settings
+from app.models import AnalysisResponse
+from app.services.alignment import AlignmentReport
+from app.services.logs import request_id_var
+
+logger = logging.getLogger(__name__)
+
+SCORE_FIELDS = ("grammar", "clarity", "voice", "overall")
+# Weight of the newest sample in the running full-model latency estimate
+LATENCY_SMOOTHING = 0.2
+
+
+@dataclass
+class CascadeDecision:
+    """How one analysis was routed, and what that saved compared to asking the full model directly.
+
+    Savings are estimates: the full model is assumed to have needed the
+    quick model's token counts and its own recent average latency. An
+    escalation saves nothing, so its savings are the negative cost of
+    the quick attempt.
+    """
+
+    chars: int
+    route: str  # 'quick' or 'escalated'
+    reasons: list[str] = field(default_factory=list)
+    quick_seconds: float = 0.0
+    full_seconds: float | None = None
+    quick_tokens: int = 0
+    full_tokens: int = 0
+    cost_usd: float | None = None
+    saved_usd: float | None = None
+    saved_seconds: float | None = None
+    request_id: str = "-"
+    created_at: float = field(default_factory=time.time)
+
+
+def check_analysis(
+    analysis: AnalysisResponse,
+    alignment: AlignmentReport,
+    min_annotations: int,
+    max_dropped_ratio: float,
+    max_score_spread: float,
+) -> list[str]:
+    """Reasons the quick model's analysis is not good enough to keep; empty when it passes."""
+    reasons = []
+    if len(analysis.annotations) < min_annotations:
+        reasons.append("too_few_annotations")
+    if alignment.checked and alignment.dropped / alignment.checked > max_dropped_ratio:
+        reasons.append("misplaced_annotations")
+    scores = [getattr(analysis.scores, f) for f in SCORE_FIELDS]
+    if any(not 0 <= s <= 100 for s in scores):
+        reasons.append("scores_out_of_range")
+    elif abs(analysis.scores.overall - sum(scores[:3]) / 3) > max_score_spread:
+        reasons.append("inconsistent_scores")
+    if not analysis.summary.strip() or any(not a.message.strip() for a in analysis.annotations):
+        reasons.append("incomplete")
+    return reasons
+
+
+class ModelCascade:
+    """Route short documents to the quick model and escalate answers that fail ``check_analysis``.
+
+    Each decision is logged, counted, and, when ``log_path`` is set,
+    appended to a JSON-lines file for tuning the thresholds. Costs are
+    computed from ``prices``, per model as USD per million prompt and
+    completion tokens; models without a price report no cost.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        max_chars: int,
+        min_annotations: int,
+        max_dropped_ratio: float,
+        max_score_spread: float,
+        prices: dict[str, dict],
+        log_path: str | None,
+    ):
+        self.enabled = enabled
+        self.max_chars = max_chars
+        self.min_annotations = min_annotations
+        self.max_dropped_ratio = max_dropped_ratio
+        self.max_score_spread = max_score_spread
+        self.prices = prices
+        self.log_path = Path(log_path) if log_path else None
+        self.full_seconds_estimate: float | None = None
+        self.routes: Counter = Counter()
+        self.reasons: Counter = Counter()
+        self.saved_usd = 0.0
+        self.saved_seconds = 0.0
+
+    def applies(self, content: str) -> bool:
+        return self.enabled and len(content) <= self.max_chars
+
+    def check(self, analysis: AnalysisResponse, alignment: AlignmentReport) -> list[str]:
+        return check_analysis(
+            analysis, alignment, self.min_annotations, self.max_dropped_ratio, self.max_score_spread
+        )
+
+    def cost(self, model: str, usage) -> float | None:
+        price = self.prices.get(model)
+        if price is None or usage is None:
+            return None
+        return (usage.prompt_tokens * price.get("prompt", 0) + usage.completion_tokens * price.get("completion", 0)) / 1e6
+
+    def observe_full_latency(self, seconds: float) -> None:
+        """Fold one full-model analysis latency into the running estimate."""
+        if self.full_seconds_estimate is None:
+            self.full_seconds_estimate = seconds
+        else:
+            self.full_seconds_estimate += LATENCY_SMOOTHING * (seconds - self.full_seconds_estimate)
+
+    async def record(self, decision: CascadeDecision) -> None:
+        decision.request_id = request_id_var.get()
+        self.routes[decision.route] += 1
+        self.reasons.update(decision.reasons)
+        self.saved_usd += decision.saved_usd or 0.0
+        self.saved_seconds += decision.saved_seconds or 0.0
+        logger.info(
+            f"[CASCADE] {decision.chars} chars answered by the "
+            + ("quick model" if decision.route == "quick" else f"full model after {', '.join(decision.reasons)}")
+            + f" in {decision.quick_seconds + (decision.full_seconds or 0):.2f}s"
+            + (f", saved ${decision.saved_usd:.5f}" if decision.saved_usd is not None else "")
+            + (f" and {decision.saved_seconds:.2f}s" if decision.saved_seconds is not None else "")
+        )
+        if self.log_path is not None:
+            line = json.dumps(asdict(decision)) + "\n"
+            try:
+                await asyncio.to_thread(self._append, line)
+            except OSError as e:
+                logger.warning(f"[CASCADE] Could not write decision log: {type(e).__name__}: {str(e)}")
+
+    def _append(self, line: str) -> None:
+        with self.log_path.open("a", encoding="utf-8") as f:
+            f.write(line)
+
+    def stats(self) -> dict:
+        decided = sum(self.routes.values())
+        return {
+            "enabled": self.enabled,
+            "routes": dict(self.routes),
+            "escalation_rate": self.routes["escalated"] / decided if decided else 0.0,
+            "escalation_reasons": dict(self.reasons),
+            "saved_usd": round(self.saved_usd, 6),
+            "saved_seconds": round(self.saved_seconds, 3),
+            "full_seconds_estimate": self.full_seconds_estimate,
+        }
+
+
+def create_model_cascade() -> ModelCascade:
+    settings = get_settings()
+    return ModelCascade(
+        enabled=settings.cascade_enabled,
+        max_chars=settings.cascade_max_chars,
+        min_annotations=settings.cascade_min_annotations,
+        max_dropped_ratio=settings.cascade_max_dropped_ratio,
+        max_score_spread=settings.cascade_max_score_spread,
+        prices=settings.llm_model_prices,
+        log_path=settings.cascade_log_path,
+    )
@@ -0,0 +1,60 @@
+import hashlib
+import re
+from dataclasses import dataclass
+
+PARAGRAPH_BREAK = re.compile(r"\n+")
+
+
+@dataclass(frozen=True)
+class Paragraph:
+    start: int
+    end: int
+    text: str
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha1(self.text.encode("utf-8")).hexdigest()
+
+
+def split_paragraphs(content: str) -> list[Paragraph]:
+    """Split text on line breaks, keeping each paragraph's offsets in the original text."""
+    paragraphs = []
+    pos = 0
+    for match in PARAGRAPH_BREAK.finditer(content):
+        if content[pos:match.start()].strip():
+            paragraphs.append(Paragraph(pos, match.start(), content[pos:match.start()]))
+        pos = match.end()
+    if content[pos:].strip():
+        paragraphs.append(Paragraph(pos, len(content), content[pos:]))
+    return paragraphs
+
+
+def plan_chunks(content: str, chunk_chars: int, overlap_chars: int) -> list[tuple[int, int]]:
+    """Split text into (start, end) spans of whole paragraphs for chunked analysis.
+
+    Each span holds as many paragraphs as fit in ``chunk_chars`` (a longer
+    paragraph gets a span of its own). Consecutive spans share trailing
+    paragraphs until at least ``overlap_chars`` are covered, so issues that
+    straddle a boundary are seen whole by at least one chunk; the shared
+    part never exceeds half a chunk.
+    """
+    paragraphs = split_paragraphs(content)
+    chunks = []
+    i = 0
+    while i < len(paragraphs):
+        j = i
+        while j + 1 < len(paragraphs) and paragraphs[j + 1].end - paragraphs[i].start <= chunk_chars:
+            j += 1
+        chunks.append((paragraphs[i].start, paragraphs[j].end))
+        if j == len(paragraphs) - 1:
+            break
+        # Start the next chunk on the trailing paragraphs that make up the overlap, always moving forward
+        k = j + 1
+        while (
+            k - 1 > i
+            and paragraphs[j].end - paragraphs[k].start < overlap_chars
+            and paragraphs[j].end - paragraphs[k - 1].start <= chunk_chars // 2
+        ):
+            k -= 1
+        i = k
+    return chunks
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from app.config import get_settings
+from app.services.budget import rank_patterns
+from app.services.cache import TTLCache
+from app.services.supabase import get_document_context, get_persona, get_session_patterns, get_vocabulary_words
+
+logger = logging.getLogger(__name__)
+
+# A document never moves between sessions, so this mapping only expires to bound memory
+DOCUMENT_SESSION_TTL_SECONDS = 24 * 3600
+
+
+@dataclass
+class AnalysisContext:
+    session_id: str
+    persona: dict | None
+    historical_patterns: list[str]  # unmastered, most relevant first
+    known_words: frozenset[str]  # lowercased words of the session's vocabulary bank
+
+
+def persona_from_row(row: dict | None) -> dict | None:
+    """Reduce a user_personas row to the fields the analysis prompt uses."""
+    if not row:
+        return None
+    return {
+        "goals": row.get("goals", []),
+        "experience_level": row.get("experience_level", "intermediate"),
+        "focus_areas": row.get("focus_areas", []),
+        "preferred_tone": row.get("preferred_tone", "balanced"),
+    }
+
+
+def known_words_from(words: list[str]) -> frozenset[str]:
+    return frozenset(word.strip().lower() for word in words)
+
+
+class AnalysisContextLoader:
+    """Load and cache the session, persona, patterns and known words an analysis needs.
+
+    An unknown document costs one joined query. Once the document's
+    session is known, an expired session entry is refreshed with the
+    persona, pattern and vocabulary queries running concurrently. Session entries are
+    invalidated whenever an analysis for the session is persisted, since
+    that changes its patterns.
+    """
+
+    def __init__(self, max_sessions: int, ttl_seconds: float):
+        self.document_sessions = TTLCache(max_sessions * 4, DOCUMENT_SESSION_TTL_SECONDS)
+        self.sessions = TTLCache(max_sessions, ttl_seconds)
+
+    async def load(self, document_id: str) -> AnalysisContext | None:
+        session_id = self.document_sessions.get(document_id)
+        if session_id is None:
+            row = await get_document_context(document_id)
+            if row is None:
+                return None
+            context = AnalysisContext(
+                row["session_id"],
+                persona_from_row(row["persona"]),
+                rank_patterns(row["patterns"]),
+                known_words_from(row["vocabulary"]),
+            )
+            self.document_sessions.set(document_id, context.session_id)
+            self.sessions.set(context.session_id, context)
+            return context
+
+        return await self.load_session(session_id)
+
+    async def load_session(self, session_id: str) -> AnalysisContext:
+        """Load the context of a session whose ID is already known."""
+        context = self.sessions.get(session_id)
+        if context is None:
+            db_persona, patterns, words = await asyncio.gather(
+                get_persona(session_id), get_session_patterns(session_id), get_vocabulary_words(session_id)
+            )
+            context = AnalysisContext(
+                session_id, persona_from_row(db_persona), rank_patterns(patterns), known_words_from(words)
+            )
+            self.sessions.set(session_id, context)
+        return context
+
+    def invalidate(self, session_id: str) -> None:
+        self.sessions.invalidate(session_id)
+
+
+# Singleton instance
+_context_loader: AnalysisContextLoader | None = None
+
+
+def get_context_loader() -> AnalysisContextLoader:
+    global _context_loader
+    if _context_loader is None:
+        settings = get_settings()
+        _context_loader = AnalysisContextLoader(
+            max_sessions=settings.context_cache_max_sessions,
+            ttl_seconds=settings.context_cache_ttl_seconds,
+        )
+    return _context_loader
@@ -0,0 +1,186 @@
+import asyncio
+import bisect
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+
+from app.config import get_settings
+from app.models import AnalysisResponse, Annotation
+from app.services.cache import TTLCache, make_analysis_key
+from app.services.chunking import Paragraph, split_paragraphs
+from app.services.llm import LLMService
+from app.services.merge import merge_patterns, merge_scores, merge_vocabulary, shift_annotations
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DocumentSnapshot:
+    context_key: str
+    paragraphs: list[Paragraph]
+    analysis: AnalysisResponse
+
+
+class IncrementalAnalyzer:
+    """Re-analyze only the paragraphs that changed since a document's last analysis.
+
+    The last analysis of each document is kept in memory. On the next
+    request, unchanged paragraphs keep their annotations (rebased to their
+    new position) and each run of changed paragraphs is sent to the model
+    on its own, with a little surrounding text for context. Documents
+    without a usable snapshot, or with most of their text changed, fall
+    back to a full analysis.
+    """
+
+    def __init__(self, max_documents: int, ttl_seconds: float, context_chars: int, max_changed_ratio: float):
+        self.snapshots = TTLCache(max_documents, ttl_seconds)
+        self.context_chars = context_chars
+        self.max_changed_ratio = max_changed_ratio
+
+    def record(
+        self,
+        document_id: str,
+        content: str,
+        persona: dict | None,
+        historical_patterns: list[str] | None,
+        model: str,
+        analysis: AnalysisResponse,
+    ) -> None:
+        """Remember a document's latest analysis as the base for the next incremental run."""
+        self.snapshots.set(
+            document_id,
+            DocumentSnapshot(
+                context_key=make_analysis_key("", persona, historical_patterns, model),
+                paragraphs=split_paragraphs(content),
+                analysis=analysis,
+            ),
+        )
+
+    async def analyze(
+        self,
+        llm: LLMService,
+        document_id: str,
+        content: str,
+        persona: dict | None = None,
+        historical_patterns: list[str] | None = None,
+        known_words: frozenset[str] = frozenset(),
+    ) -> tuple[AnalysisResponse, int, str]:
+        """Analyze a document, re-analyzing only the paragraphs changed since its snapshot.
+
+        Returns the analysis, the tokens used and the model that answered.
+        """
+        snapshot = self.snapshots.get(document_id)
+        context_key = make_analysis_key("", persona, historical_patterns, llm.model)
+        if snapshot is None or snapshot.context_key != context_key:
+            logger.info(f"[INCREMENTAL] No usable snapshot for {document_id}, running full analysis")
+            return await llm.analyze_document(content, persona, historical_patterns, known_words=known_words)
+
+        paragraphs = split_paragraphs(content)
+        unused = defaultdict(list)
+        for old in snapshot.paragraphs:
+            unused[old.digest].append(old)
+
+        reused: list[tuple[Paragraph, Paragraph]] = []
+        changed: list[int] = []
+        for i, paragraph in enumerate(paragraphs):
+            candidates = unused.get(paragraph.digest)
+            if candidates:
+                reused.append((paragraph, candidates.pop(0)))
+            else:
+                changed.append(i)
+
+        changed_chars = sum(len(paragraphs[i].text) for i in changed)
+        if not paragraphs or changed_chars > self.max_changed_ratio * len(content):
+            logger.info(f"[INCREMENTAL] {changed_chars}/{len(content)} chars changed, running full analysis")
+            return await llm.analyze_document(content, persona, historical_patterns, known_words=known_words)
+
+        runs = _changed_runs(paragraphs, changed)
+        logger.info(
+            f"[INCREMENTAL] Reusing {len(reused)} paragraphs, re-analyzing {len(changed)} "
+            f"in {len(runs)} passages ({changed_chars}/{len(content)} chars)"
+        )
+        results = await asyncio.gather(
+            *(
+                llm.analyze_excerpt(
+                    content[start:end],
+                    content[max(0, start - self.context_chars):start],
+                    content[end:end + self.context_chars],
+                    persona,
+                    historical_patterns,
+                    known_words,
+                )
+                for start, end in runs
+            )
+        )
+
+        annotations = _rebase_reused(snapshot.analysis.annotations, reused)
+        for (start, end), (excerpt_analysis, _) in zip(runs, results):
+            annotations.extend(shift_annotations(excerpt_analysis.annotations, start, end - start))
+        annotations.sort(key=lambda a: (a.start_offset, a.end_offset))
+
+        reused_chars = sum(len(new.text) for new, _ in reused)
+        weighted_scores = [(snapshot.analysis.scores, reused_chars)]
+        weighted_scores.extend((r.scores, end - start) for (start, end), (r, _) in zip(runs, results))
+
+        fresh = [r for r, _ in results]
+        summary = snapshot.analysis.summary
+        if runs:
+            largest = max(range(len(runs)), key=lambda i: runs[i][1] - runs[i][0])
+            summary = fresh[largest].summary
+
+        analysis = AnalysisResponse(
+            annotations=annotations,
+            scores=merge_scores(weighted_scores),
+            patterns=merge_patterns(*(r.patterns for r in fresh), snapshot.analysis.patterns),
+            vocabulary_suggestions=merge_vocabulary(
+                *(r.vocabulary_suggestions for r in fresh), snapshot.analysis.vocabulary_suggestions
+            ),
+            summary=summary,
+        )
+        return analysis, sum(tokens for _, tokens in results), llm.model
+
+
+def _changed_runs(paragraphs: list[Paragraph], changed: list[int]) -> list[tuple[int, int]]:
+    """Group consecutive changed paragraphs into (start, end) character spans."""
+    runs = []
+    for i in changed:
+        if runs and runs[-1][2] == i - 1:
+            runs[-1] = (runs[-1][0], paragraphs[i].end, i)
+        else:
+            runs.append((paragraphs[i].start, paragraphs[i].end, i))
+    return [(start, end) for start, end, _ in runs]
+
+
+def _rebase_reused(annotations: list[Annotation], reused: list[tuple[Paragraph, Paragraph]]) -> list[Annotation]:
+    """Carry annotations of unchanged paragraphs over to the paragraphs' new offsets.
+
+    Annotations spanning more than one paragraph are dropped.
+    """
+    ordered = sorted(annotations, key=lambda a: a.start_offset)
+    starts = [a.start_offset for a in ordered]
+    rebased = []
+    for new, old in reused:
+        shift = new.start - old.start
+        for a in ordered[bisect.bisect_left(starts, old.start):bisect.bisect_left(starts, old.end)]:
+            if a.end_offset <= old.end:
+                rebased.append(
+                    a.model_copy(update={"start_offset": a.start_offset + shift, "end_offset": a.end_offset + shift})
+                )
+    return rebased
+
+
+# Singleton instance
+_incremental_analyzer: IncrementalAnalyzer | None = None
+
+
+def get_incremental_analyzer() -> IncrementalAnalyzer:
+    global _incremental_analyzer
+    if _incremental_analyzer is None:
+        settings = get_settings()
+        _incremental_analyzer = IncrementalAnalyzer(
+            max_documents=settings.incremental_max_documents,
+            ttl_seconds=settings.analysis_cache_ttl_seconds,
+            context_chars=settings.incremental_context_chars,
+            max_changed_ratio=settings.incremental_max_changed_ratio,
+        )
+    return _incremental_analyzer
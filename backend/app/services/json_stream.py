@@ -0,0 +1,113 @@
+import json
+
+WHITESPACE = " \t\r\n"
+
+
+class JSONStreamParser:
+    """Incrementally parse a streamed top-level JSON object.
+
+    Chunks are fed as they arrive. ``feed`` returns ``(key, value)`` pairs
+    as soon as they are complete: one pair per element of a top-level
+    array, and one pair per other top-level value. The parser never
+    rescans text, and only keeps the text of the value it is still
+    reading, so feeding a whole completion costs a single pass.
+    """
+
+    def __init__(self):
+        self._chunks: list[str] = []
+        # Text from the start of the value still being read; offsets below are into it
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._key: str | None = None
+        self._expect_value = False
+        self._value_start: int | None = None
+        self._in_array = False
+        self._element_start: int | None = None
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        self._chunks.append(chunk)
+        events = []
+        buffer = self._buffer + chunk
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._value_start is None and not self._expect_value:
+                        self._key = json.loads(buffer[self._string_start:i + 1])
+                continue
+
+            if self._depth == 1 and self._expect_value and char not in WHITESPACE:
+                self._expect_value = False
+                self._value_start = i
+                self._in_array = char == "["
+
+            if self._depth == 2 and self._in_array and self._element_start is None and char not in WHITESPACE + ",]":
+                self._element_start = i
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._in_array and self._element_start is not None:
+                    events.append((self._key, json.loads(buffer[self._element_start:i + 1])))
+                    self._element_start = None
+                elif self._depth == 1 and self._in_array:
+                    if self._element_start is not None:
+                        # Scalar array element
+                        events.append((self._key, json.loads(buffer[self._element_start:i])))
+                        self._element_start = None
+                    self._in_array = False
+                    self._value_start = None
+                elif self._depth == 0 and self._value_start is not None:
+                    events.append(self._end_value(buffer, i))
+            elif char == ":" and self._depth == 1:
+                self._expect_value = True
+            elif char == "," and self._depth == 1 and self._value_start is not None:
+                events.append(self._end_value(buffer, i))
+            elif char == "," and self._depth == 2 and self._in_array and self._element_start is not None:
+                # Scalar array element
+                events.append((self._key, json.loads(buffer[self._element_start:i])))
+                self._element_start = None
+
+        self._trim(buffer)
+        return events
+
+    def _trim(self, buffer: str) -> None:
+        """Drop the text before the earliest value, element or key still being read."""
+        starts = (
+            self._element_start,
+            # An array's start is not sliced, only its elements
+            None if self._in_array else self._value_start,
+            self._string_start if self._in_string else None,
+        )
+        keep = min((s for s in starts if s is not None), default=len(buffer))
+        self._buffer = buffer[keep:]
+        self._pos = len(buffer) - keep
+        self._string_start -= keep
+        if self._element_start is not None:
+            self._element_start -= keep
+        if self._value_start is not None:
+            self._value_start = max(0, self._value_start - keep)
+
+    def _end_value(self, buffer: str, end: int) -> tuple[str, object]:
+        value = json.loads(buffer[self._value_start:end])
+        self._value_start = None
+        return self._key, value
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._chunks)
@@ -1,14 +1,17 @@
-import json
+import asyncio
 import logging
-import traceback
-from openai import AsyncOpenAI
+import time
+from typing import AsyncIterator
 from app.config import get_settings
 from app.prompts import (
     ANALYSIS_SYSTEM_PROMPT,
     build_analysis_prompt,
+    build_chunk_analysis_prompt,
+    build_incremental_analysis_prompt,
+    build_vocabulary_extract_prompt,
     QUICK_CHECK_SYSTEM_PROMPT,
     QUICK_CHECK_USER_PROMPT,
-    VOCABULARY_EXTRACT_PROMPT,
+    VOCABULARY_DEFINE_PROMPT,
 )
 from app.models import (
     AnalysisResponse,
@@ -17,153 +20,483 @@ from app.models import (
     Annotation,
     Scores,
     Pattern,
-    QuickCheckIssue,
 )
+from app.services.alignment import AlignmentReport, TextIndex, align_annotations
+from app.services.backends import create_llm_backend
+from app.services.budget import PromptBudget, TokenCounter, TokenEstimateStats
+from app.services.cascade import CascadeDecision, create_model_cascade
+from app.services.chunking import plan_chunks
+from app.services.json_stream import JSONStreamParser
+from app.services.logs import Truncated, log_payload
+from app.services.merge import dedupe_annotations, merge_patterns, merge_scores, merge_vocabulary, shift_annotations
+from app.services.metrics import record_token_usage, stage
+from app.services.scheduler import Priority, get_llm_scheduler
+from app.services.singleflight import SingleFlight, fingerprint
+from app.services.structured import ModelAnalysis, ModelQuickCheck, loads, parse_output, valid_items
+from app.services.vocabulary import drop_known_words, get_word_definitions_store, word_key
 
 logger = logging.getLogger(__name__)
 
+# Output tokens budgeted with the scheduler for calls that set no max_tokens
+DEFAULT_OUTPUT_TOKENS = 2000
+
+# Vocabulary suggestions returned by extract_vocabulary, after known words are left out
+MAX_EXTRACTED_WORDS = 5
+
+# Top-level array fields of the analysis JSON and the stream event each element becomes
+STREAMED_LIST_FIELDS = {
+    "annotations": ("annotation", Annotation),
+    "patterns": ("pattern", Pattern),
+    "vocabulary_suggestions": ("vocabulary_suggestion", VocabSuggestion),
+}
+
 
 class LLMService:
     def __init__(self):
-        print("[LLMService] Initializing LLM Service...")
         settings = get_settings()
-        api_key_preview = settings.openai_api_key[:10] if settings.openai_api_key else "EMPTY"
-        print(f"[LLMService] Using API key starting with: {api_key_preview}...")
-        print(f"[LLMService] Using model: {settings.llm_model}")
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key)
+        self.backend = create_llm_backend()
         self.model = settings.llm_model
         self.model_quick = settings.llm_model_quick
-        print("[LLMService] LLM Service initialized successfully!")
+        self.chunked_threshold_chars = settings.chunked_threshold_chars
+        self.chunk_chars = settings.chunk_chars
+        self.chunk_overlap_chars = settings.chunk_overlap_chars
+        self.chunk_context_chars = settings.chunk_context_chars
+        self.chunk_concurrency = settings.chunk_concurrency
+        self.single_flight = SingleFlight()
+        self.scheduler = get_llm_scheduler()
+        self.token_counter = TokenCounter(self.model)
+        self.prompt_budget = PromptBudget(
+            self.token_counter,
+            pattern_tokens=settings.prompt_pattern_token_budget,
+            max_pattern_tokens=settings.prompt_max_tokens_per_pattern,
+        )
+        self.token_estimates = TokenEstimateStats()
+        self.definitions = get_word_definitions_store()
+        self.cascade = create_model_cascade()
+        logger.info(f"[LLM] Service initialized with models {self.model} and {self.model_quick}")
 
     async def analyze_document(
         self,
         content: str,
         persona: dict | None = None,
         historical_patterns: list[str] | None = None,
+        priority: Priority = Priority.STANDARD,
+        known_words: frozenset[str] = frozenset(),
+    ) -> tuple[AnalysisResponse, int, str]:
+        """Analyze a document and return structured feedback, the tokens used and the model that answered.
+
+        Documents longer than ``chunked_threshold_chars`` are analyzed in chunks.
+        With the cascade enabled, short documents go to the quick model first
+        (``_analyze_cascaded``). Vocabulary suggestions are defined by
+        ``define_vocabulary``, which keeps ``known_words`` undefined; serve the
+        result to the session through ``analysis_for_session``.
+        """
+        with stage("llm.build_prompt"):
+            historical_patterns = self.prompt_budget.fit_patterns(historical_patterns)
+        chunks = None
+        model_used = self.model
+        if len(content) > self.chunked_threshold_chars:
+            chunks = plan_chunks(content, self.chunk_chars, self.chunk_overlap_chars)
+        if chunks and len(chunks) > 1:
+            analysis, tokens_used = await self._analyze_chunked(content, chunks, persona, historical_patterns, priority)
+        else:
+            with stage("llm.build_prompt"):
+                user_prompt = build_analysis_prompt(content, persona, historical_patterns)
+            logger.debug("[LLM] Prompt built. Length: %d chars", len(user_prompt))
+            if self.cascade.applies(content):
+                analysis, tokens_used, model_used = await self._analyze_cascaded(user_prompt, content, priority)
+            else:
+                started = time.perf_counter()
+                analysis, tokens_used = await self._run_analysis(user_prompt, content, priority)
+                if len(content) <= self.cascade.max_chars:
+                    # What the cascade saves is measured against this
+                    self.cascade.observe_full_latency(time.perf_counter() - started)
+
+        analysis.vocabulary_suggestions, vocabulary_tokens = await self.define_vocabulary(
+            analysis.vocabulary_suggestions, known_words, priority
+        )
+        return analysis, tokens_used + vocabulary_tokens, model_used
+
+    def analysis_request(
+        self,
+        content: str,
+        persona: dict | None = None,
+        historical_patterns: list[str] | None = None,
+    ) -> dict | None:
+        """Chat completion parameters that analyze a document in one request, for the provider's batch API.
+
+        Returns None for documents that ``analyze_document`` would analyze in chunks.
+        """
+        if len(content) > self.chunked_threshold_chars and len(
+            plan_chunks(content, self.chunk_chars, self.chunk_overlap_chars)
+        ) > 1:
+            return None
+        historical_patterns = self.prompt_budget.fit_patterns(historical_patterns)
+        return self._analysis_params(build_analysis_prompt(content, persona, historical_patterns))
+
+    async def analyze_excerpt(
+        self,
+        content: str,
+        context_before: str,
+        context_after: str,
+        persona: dict | None = None,
+        historical_patterns: list[str] | None = None,
+        known_words: frozenset[str] = frozenset(),
+    ) -> tuple[AnalysisResponse, int]:
+        """Analyze one passage of a longer document.
+
+        Annotation offsets in the result are relative to ``content``.
+        """
+        historical_patterns = self.prompt_budget.fit_patterns(historical_patterns)
+        user_prompt = build_incremental_analysis_prompt(
+            content, context_before, context_after, persona, historical_patterns
+        )
+        logger.debug("[LLM] Excerpt prompt built. Passage: %d chars, prompt: %d chars", len(content), len(user_prompt))
+        analysis, tokens_used = await self._run_analysis(user_prompt, content)
+        analysis.vocabulary_suggestions, vocabulary_tokens = await self.define_vocabulary(
+            analysis.vocabulary_suggestions, known_words
+        )
+        return analysis, tokens_used + vocabulary_tokens
+
+    async def _analyze_chunked(
+        self,
+        content: str,
+        chunks: list[tuple[int, int]],
+        persona: dict | None,
+        historical_patterns: list[str] | None,
+        priority: Priority,
     ) -> tuple[AnalysisResponse, int]:
-        """Analyze a document and return structured feedback."""
-        logger.info("[LLM] Building analysis prompt...")
+        """Analyze overlapping chunks concurrently and merge them into one document analysis."""
+        logger.info(f"[LLM] Chunked analysis: {len(content)} chars in {len(chunks)} chunks")
+        semaphore = asyncio.Semaphore(self.chunk_concurrency)
+
+        async def analyze_chunk(start: int, end: int) -> tuple[AnalysisResponse, int]:
+            user_prompt = build_chunk_analysis_prompt(
+                content[start:end],
+                content[max(0, start - self.chunk_context_chars):start],
+                content[end:end + self.chunk_context_chars],
+                persona,
+                historical_patterns,
+            )
+            async with semaphore:
+                return await self._run_analysis(user_prompt, content[start:end], priority)
+
+        results = await asyncio.gather(*(analyze_chunk(start, end) for start, end in chunks))
+
+        annotations = []
+        for (start, end), (chunk_analysis, _) in zip(chunks, results):
+            annotations.extend(shift_annotations(chunk_analysis.annotations, start, end - start))
+        analyses = [r for r, _ in results]
+        analysis = AnalysisResponse(
+            annotations=dedupe_annotations(annotations),
+            scores=merge_scores([(r.scores, end - start) for (start, end), r in zip(chunks, analyses)]),
+            patterns=merge_patterns(*(r.patterns for r in analyses)),
+            vocabulary_suggestions=merge_vocabulary(*(r.vocabulary_suggestions for r in analyses)),
+            summary="\n\n".join(r.summary for r in analyses if r.summary),
+        )
+        return analysis, sum(tokens for _, tokens in results)
+
+    async def stream_analysis(
+        self,
+        content: str,
+        persona: dict | None = None,
+        historical_patterns: list[str] | None = None,
+        known_words: frozenset[str] = frozenset(),
+    ) -> AsyncIterator[tuple[str, object]]:
+        """Stream a document analysis, yielding each part as soon as the model completes it.
+
+        Always uses the full model: the cascade's checks need the whole
+        answer, and by then the quick model's parts would have been sent.
+
+        Yields ``("annotation", Annotation)``, ``("pattern", Pattern)``,
+        ``("scores", Scores)`` and ``("summary", str)`` events in the order
+        the model writes them, then ``("vocabulary_suggestion", VocabSuggestion)``
+        events once the suggestions have been defined, leaving out
+        ``known_words``, and a final ``("complete", (AnalysisResponse, tokens_used))``
+        whose analysis keeps the known words undefined, as ``analyze_document`` does.
+        """
+        historical_patterns = self.prompt_budget.fit_patterns(historical_patterns)
         user_prompt = build_analysis_prompt(content, persona, historical_patterns)
-        logger.info(f"[LLM] Prompt built. Length: {len(user_prompt)} chars")
+        logger.debug("[LLM] Streaming analysis with model: %s", self.model)
+        # The scheduler slot covers opening the stream; reading it holds no slot
+        messages = [
+            {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ]
+        estimated_prompt_tokens = self.token_counter.count_messages(messages)
+        stream = await self._schedule(
+            "stream_analysis",
+            Priority.STANDARD,
+            estimated_prompt_tokens,
+            model=self.model,
+            messages=messages,
+            response_format={"type": "json_object"},
+            temperature=0.3,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
 
-        logger.info(f"[LLM] Calling OpenAI API with model: {self.model}")
-        try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt},
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.3,
+        parser = JSONStreamParser()
+        index = TextIndex(content)
+        collected: dict[str, list] = {field: [] for field in STREAMED_LIST_FIELDS}
+        scores = Scores(grammar=0, clarity=0, voice=0, overall=0)
+        summary = ""
+        tokens_used = 0
+        async for chunk in stream:
+            if chunk.usage:
+                tokens_used = chunk.usage.total_tokens
+                self._record_prompt_tokens(estimated_prompt_tokens, chunk.usage.prompt_tokens)
+                record_token_usage(self.model, chunk.usage)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for key, value in parser.feed(chunk.choices[0].delta.content):
+                if key in STREAMED_LIST_FIELDS:
+                    event, model_cls = STREAMED_LIST_FIELDS[key]
+                    # A malformed item is dropped, as in a complete response
+                    items = valid_items(model_cls, [value])
+                    if not items:
+                        logger.warning("[LLM] Dropped a malformed streamed %s: %s", event, Truncated(value))
+                        continue
+                    item = items[0]
+                    if key == "annotations":
+                        aligned, _ = align_annotations(index, [item])
+                        if not aligned:
+                            continue
+                        item = aligned[0]
+                    collected[key].append(item)
+                    # Vocabulary suggestions still need their definitions
+                    if key != "vocabulary_suggestions":
+                        yield event, item
+                elif key == "scores":
+                    scores = Scores(**value)
+                    yield "scores", scores
+                elif key == "summary":
+                    summary = value
+                    yield "summary", summary
+
+        logger.debug("[LLM] Stream finished. Raw response length: %d chars, tokens used: %d", len(parser.text), tokens_used)
+        log_payload(logger, "[LLM] Raw response", parser.text)
+        vocabulary, vocabulary_tokens = await self.define_vocabulary(collected["vocabulary_suggestions"], known_words)
+        tokens_used += vocabulary_tokens
+        for suggestion in drop_known_words(vocabulary, known_words):
+            yield "vocabulary_suggestion", suggestion
+        collected["vocabulary_suggestions"] = vocabulary
+        analysis = AnalysisResponse(
+            annotations=collected["annotations"],
+            scores=scores,
+            patterns=collected["patterns"],
+            vocabulary_suggestions=collected["vocabulary_suggestions"],
+            summary=summary,
+        )
+        yield "complete", (analysis, tokens_used)
+
+    async def _create_completion(self, label: str, priority: Priority, **params):
+        """Create a chat completion, sharing one upstream request among identical concurrent calls.
+
+        Returns the completion and whether this call was collapsed onto another in-flight call.
+        """
+        estimated_prompt_tokens = self.token_counter.count_messages(params["messages"])
+        with stage(f"llm.request.{label}"):
+            response, collapsed = await self.single_flight.do(
+                fingerprint(params),
+                lambda: self._schedule(label, priority, estimated_prompt_tokens, **params),
+                label=label,
             )
-            logger.info("[LLM] OpenAI API call successful")
-        except Exception as e:
-            logger.error(f"[LLM] OpenAI API call FAILED")
-            logger.error(f"[LLM] Error type: {type(e).__name__}")
-            logger.error(f"[LLM] Error message: {str(e)}")
-            logger.error(f"[LLM] Traceback:\n{traceback.format_exc()}")
-            print(f"\n[LLM ERROR] OpenAI API call failed: {type(e).__name__}: {str(e)}")
-            raise
+        if response.usage and not collapsed:
+            self._record_prompt_tokens(estimated_prompt_tokens, response.usage.prompt_tokens)
+            record_token_usage(params["model"], response.usage)
+        return response, collapsed
 
-        # Log the raw response for debugging
-        raw_content = response.choices[0].message.content
-        logger.info(f"[LLM] Raw response length: {len(raw_content)} chars")
-        logger.debug(f"[LLM] Raw response content: {raw_content[:500]}...")
+    async def _schedule(self, label: str, priority: Priority, estimated_prompt_tokens: int, **params):
+        """Send a chat completion request through the rate-limit-aware scheduler."""
+        return await self.scheduler.call(
+            params["model"],
+            priority,
+            estimated_prompt_tokens + (params.get("max_tokens") or DEFAULT_OUTPUT_TOKENS),
+            lambda: self.backend.create(label, **params),
+        )
 
-        logger.info("[LLM] Parsing JSON response...")
-        try:
-            result = json.loads(raw_content)
-            logger.info(f"[LLM] JSON parsed successfully. Keys: {list(result.keys())}")
-        except json.JSONDecodeError as e:
-            logger.error(f"[LLM] JSON parsing FAILED")
-            logger.error(f"[LLM] JSON error: {str(e)}")
-            logger.error(f"[LLM] Raw content that failed to parse:\n{raw_content}")
-            print(f"\n[LLM ERROR] JSON parsing failed: {str(e)}")
-            print(f"[LLM ERROR] Raw content:\n{raw_content}")
-            raise
+    def _record_prompt_tokens(self, estimated: int, actual: int) -> None:
+        self.token_estimates.record(estimated, actual)
+        logger.debug("[LLM] Prompt tokens: estimated %d, actual %d", estimated, actual)
+
+    def stats(self) -> dict:
+        return {
+            "single_flight": self.single_flight.stats(),
+            "scheduler": self.scheduler.stats(),
+            "token_estimates": self.token_estimates.stats(),
+            "word_definitions": self.definitions.stats(),
+            "cascade": self.cascade.stats(),
+        }
+
+    def _analysis_params(self, user_prompt: str, model: str | None = None) -> dict:
+        return dict(
+            model=model or self.model,
+            messages=[
+                {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt},
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.3,
+        )
+
+    async def _run_analysis(
+        self, user_prompt: str, content: str, priority: Priority = Priority.STANDARD
+    ) -> tuple[AnalysisResponse, int]:
+        """Run an analysis prompt on the full model and parse the result."""
+        analysis, _, usage = await self._complete_analysis(user_prompt, content, priority, self.model)
+        return analysis, usage.total_tokens if usage else 0
+
+    async def _complete_analysis(
+        self, user_prompt: str, content: str, priority: Priority, model: str
+    ) -> tuple[AnalysisResponse, AlignmentReport, object | None]:
+        """Run an analysis prompt on ``model``.
 
-        tokens_used = response.usage.total_tokens if response.usage else 0
-        logger.info(f"[LLM] Tokens used: {tokens_used}")
+        Returns the analysis, how its annotations aligned with ``content``, and
+        the token usage, which is None for a call collapsed onto another.
+        """
+        response, collapsed = await self._create_completion(
+            "analyze_document", priority, **self._analysis_params(user_prompt, model)
+        )
+        # Tokens of a collapsed call are already accounted to the call it shared
+        usage = response.usage if not collapsed else None
+        analysis, alignment = self._parse_analysis(
+            response.choices[0].message.content, content, usage.total_tokens if usage else 0, collapsed
+        )
+        return analysis, alignment, usage
 
-        logger.info("[LLM] Building AnalysisResponse from parsed JSON...")
+    async def _analyze_cascaded(
+        self, user_prompt: str, content: str, priority: Priority
+    ) -> tuple[AnalysisResponse, int, str]:
+        """Analyze with the quick model, escalating to the full model when the answer fails the quality checks.
+
+        Returns the analysis, the tokens both attempts used and the model whose answer was kept.
+        """
+        started = time.perf_counter()
+        response, collapsed = await self._create_completion(
+            "analyze_document", priority, **self._analysis_params(user_prompt, self.model_quick)
+        )
+        quick_usage = response.usage if not collapsed else None
         try:
-            analysis = AnalysisResponse(
-                annotations=[Annotation(**a) for a in result.get("annotations", [])],
-                scores=Scores(**result.get("scores", {"grammar": 0, "clarity": 0, "vocabulary": 0, "overall": 0})),
-                patterns=[Pattern(**p) for p in result.get("patterns", [])],
-                vocabulary_suggestions=[VocabSuggestion(**v) for v in result.get("vocabulary_suggestions", [])],
-                summary=result.get("summary", ""),
+            analysis, alignment = self._parse_analysis(
+                response.choices[0].message.content, content, quick_usage.total_tokens if quick_usage else 0, collapsed
             )
-            logger.info(f"[LLM] AnalysisResponse built successfully")
-            logger.info(f"[LLM] - Annotations: {len(analysis.annotations)}")
-            logger.info(f"[LLM] - Patterns: {len(analysis.patterns)}")
-            logger.info(f"[LLM] - Vocabulary suggestions: {len(analysis.vocabulary_suggestions)}")
-        except Exception as e:
-            logger.error(f"[LLM] Failed to build AnalysisResponse from JSON")
-            logger.error(f"[LLM] Error type: {type(e).__name__}")
-            logger.error(f"[LLM] Error message: {str(e)}")
-            logger.error(f"[LLM] Parsed result: {json.dumps(result, indent=2)}")
-            logger.error(f"[LLM] Traceback:\n{traceback.format_exc()}")
-            print(f"\n[LLM ERROR] Failed to build response model: {type(e).__name__}: {str(e)}")
-            print(f"[LLM ERROR] Parsed JSON:\n{json.dumps(result, indent=2)}")
-            raise
+            reasons = self.cascade.check(analysis, alignment)
+        except ValueError:
+            # Logged by _parse_analysis; the tokens are spent all the same
+            reasons = ["invalid_output"]
+        decision = CascadeDecision(
+            chars=len(content),
+            route="quick",
+            reasons=reasons,
+            quick_seconds=time.perf_counter() - started,
+            quick_tokens=quick_usage.total_tokens if quick_usage else 0,
+        )
+        quick_cost = self.cascade.cost(self.model_quick, quick_usage)
 
-        return analysis, tokens_used
+        if not reasons:
+            # The full model is assumed to have needed as many tokens
+            full_cost = self.cascade.cost(self.model, quick_usage)
+            decision.cost_usd = quick_cost
+            if quick_cost is not None and full_cost is not None:
+                decision.saved_usd = full_cost - quick_cost
+            if self.cascade.full_seconds_estimate is not None:
+                decision.saved_seconds = self.cascade.full_seconds_estimate - decision.quick_seconds
+            await self.cascade.record(decision)
+            return analysis, decision.quick_tokens, self.model_quick
+
+        decision.route = "escalated"
+        started = time.perf_counter()
+        analysis, _, full_usage = await self._complete_analysis(user_prompt, content, priority, self.model)
+        decision.full_seconds = time.perf_counter() - started
+        decision.full_tokens = full_usage.total_tokens if full_usage else 0
+        self.cascade.observe_full_latency(decision.full_seconds)
+        full_cost = self.cascade.cost(self.model, full_usage)
+        if full_cost is not None:
+            decision.cost_usd = full_cost + (quick_cost or 0.0)
+        if quick_cost is not None:
+            decision.saved_usd = -quick_cost
+        decision.saved_seconds = -decision.quick_seconds
+        await self.cascade.record(decision)
+        return analysis, decision.quick_tokens + decision.full_tokens, self.model
+
+    def parse_analysis(self, raw_content: str, content: str, tokens_used: int, collapsed: bool = False) -> AnalysisResponse:
+        """Parse the model's analysis JSON.
+
+        Annotation offsets are checked against ``content``, the text the prompt
+        asked the model to annotate, and snapped to the text they quote.
+        """
+        analysis, _ = self._parse_analysis(raw_content, content, tokens_used, collapsed)
+        return analysis
+
+    def _parse_analysis(
+        self, raw_content: str, content: str, tokens_used: int, collapsed: bool
+    ) -> tuple[AnalysisResponse, AlignmentReport]:
+        log_payload(logger, "[LLM] Raw response", raw_content)
 
-    async def quick_check(self, content: str) -> QuickCheckResponse:
-        """Perform a quick check on text for obvious issues."""
-        logger.info(f"[LLM] Quick check with model: {self.model_quick}")
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model_quick,
-                messages=[
-                    {"role": "system", "content": QUICK_CHECK_SYSTEM_PROMPT},
-                    {"role": "user", "content": QUICK_CHECK_USER_PROMPT.format(content=content)},
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.2,
-                max_tokens=200,
-            )
-            logger.info("[LLM] Quick check API call successful")
-        except Exception as e:
-            logger.error(f"[LLM] Quick check API call FAILED: {type(e).__name__}: {str(e)}")
-            logger.error(f"[LLM] Traceback:\n{traceback.format_exc()}")
+            with stage("llm.parse_json"):
+                analysis = parse_output(ModelAnalysis, raw_content).to_response()
+        except ValueError as e:
+            logger.error("[LLM] Analysis parsing failed: %s. Raw content: %s", e, Truncated(raw_content))
             raise
+        with stage("llm.align"):
+            analysis.annotations, alignment = align_annotations(TextIndex(content), analysis.annotations)
 
+        logger.debug(
+            "[LLM] Analysis parsed: %d annotations, %d patterns, %d vocabulary suggestions, %d tokens%s",
+            len(analysis.annotations),
+            len(analysis.patterns),
+            len(analysis.vocabulary_suggestions),
+            tokens_used,
+            " (shared with an identical in-flight call)" if collapsed else "",
+        )
+        return analysis, alignment
+
+    async def quick_check(self, content: str) -> QuickCheckResponse:
+        """Perform a quick check on text for obvious issues."""
+        response, _ = await self._create_completion(
+            "quick_check",
+            Priority.INTERACTIVE,
+            model=self.model_quick,
+            messages=[
+                {"role": "system", "content": QUICK_CHECK_SYSTEM_PROMPT},
+                {"role": "user", "content": QUICK_CHECK_USER_PROMPT.format(content=content)},
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.2,
+            max_tokens=200,
+        )
         raw_content = response.choices[0].message.content
-        logger.info(f"[LLM] Quick check raw response: {raw_content}")
+        log_payload(logger, "[LLM] Quick check raw response", raw_content)
 
         try:
-            result = json.loads(raw_content)
-        except json.JSONDecodeError as e:
-            logger.error(f"[LLM] Quick check JSON parsing failed: {str(e)}")
-            logger.error(f"[LLM] Raw content: {raw_content}")
+            return parse_output(ModelQuickCheck, raw_content).to_response()
+        except ValueError as e:
+            logger.error("[LLM] Quick check parsing failed: %s. Raw content: %s", e, Truncated(raw_content))
             raise
 
-        try:
-            return QuickCheckResponse(
-                has_issues=result.get("has_issues", False),
-                issues=[QuickCheckIssue(**i) for i in result.get("issues", [])],
-            )
-        except Exception as e:
-            logger.error(f"[LLM] Quick check response model failed: {type(e).__name__}: {str(e)}")
-            logger.error(f"[LLM] Parsed result: {result}")
-            raise
+    async def extract_vocabulary(self, content: str, known_words: frozenset[str] = frozenset()) -> list[VocabSuggestion]:
+        """Extract vocabulary suggestions from text.
 
-    async def extract_vocabulary(self, content: str) -> list[VocabSuggestion]:
-        """Extract vocabulary suggestions from text."""
-        response = await self.client.chat.completions.create(
+        The model only picks the words, and is told which of the
+        ``known_words`` occur in the text so it does not pick them;
+        ``complete_vocabulary`` leaves out any it picks anyway and defines
+        the rest.
+        """
+        response, _ = await self._create_completion(
+            "extract_vocabulary",
+            Priority.STANDARD,
             model=self.model_quick,
             messages=[
-                {"role": "user", "content": VOCABULARY_EXTRACT_PROMPT.format(content=content)},
+                {"role": "user", "content": build_vocabulary_extract_prompt(content, known_words)},
             ],
             response_format={"type": "json_object"},
             temperature=0.3,
         )
 
         # The response should be a JSON object with a "words" array or just an array
-        result = json.loads(response.choices[0].message.content)
+        result = loads(response.choices[0].message.content)
 
         # Handle both formats: {"words": [...]} or just [...]
         if isinstance(result, list):
@@ -171,7 +504,142 @@ class LLMService:
         else:
             words = result.get("words", result.get("vocabulary", []))
 
-        return [VocabSuggestion(**v) for v in words]
+        suggestions, _ = await self.complete_vocabulary(valid_items(VocabSuggestion, words), known_words)
+        return suggestions[:MAX_EXTRACTED_WORDS]
+
+    async def define_vocabulary(
+        self,
+        suggestions: list[VocabSuggestion],
+        known_words: frozenset[str] = frozenset(),
+        priority: Priority = Priority.STANDARD,
+    ) -> tuple[list[VocabSuggestion], int]:
+        """Define an analysis's vocabulary suggestions, except those in ``known_words``.
+
+        Known words are kept, undefined, so that the analysis can be cached
+        and served to other sessions; ``analysis_for_session`` leaves them
+        out again. When the definitions cannot be had, the undefined
+        suggestions are left out rather than failing the analysis. Returns the
+        suggestions and the tokens spent defining words.
+        """
+        unknown = drop_known_words(suggestions, known_words)
+        try:
+            defined, tokens_used = await self.complete_vocabulary(unknown, priority=priority)
+        except Exception as e:
+            logger.warning(f"[LLM] Could not define vocabulary suggestions, leaving them out: {type(e).__name__}: {str(e)}")
+            defined = [s for s in unknown if s.definition]
+            tokens_used = 0
+        return defined + [s for s in suggestions if s not in unknown], tokens_used
+
+    async def analysis_for_session(
+        self,
+        analysis: AnalysisResponse,
+        known_words: frozenset[str],
+        priority: Priority = Priority.STANDARD,
+    ) -> tuple[AnalysisResponse, int]:
+        """``analysis`` as a session gets it: its known words left out and the remaining suggestions defined.
+
+        Only an analysis made for another session, which kept this
+        session's unknown words undefined, can need definitions, and most
+        come from the shared store. When they cannot be had, the undefined
+        suggestions are left out rather than failing the analysis.
+        """
+        try:
+            suggestions, tokens_used = await self.complete_vocabulary(
+                analysis.vocabulary_suggestions, known_words, priority
+            )
+        except Exception as e:
+            logger.warning(f"[LLM] Could not define vocabulary suggestions, leaving them out: {type(e).__name__}: {str(e)}")
+            suggestions = [s for s in drop_known_words(analysis.vocabulary_suggestions, known_words) if s.definition]
+            tokens_used = 0
+        return analysis.model_copy(update={"vocabulary_suggestions": suggestions}), tokens_used
+
+    async def complete_vocabulary(
+        self,
+        suggestions: list[VocabSuggestion],
+        known_words: frozenset[str] = frozenset(),
+        priority: Priority = Priority.STANDARD,
+    ) -> tuple[list[VocabSuggestion], int]:
+        """Leave out known words and fill in definitions and example sentences.
+
+        Definitions come from the shared store; the quick model is asked only
+        for words it has never defined, and those are added to the store.
+        Suggestions the model does not define are dropped. Returns the
+        suggestions and the tokens spent defining words.
+        """
+        offered = len(suggestions)
+        suggestions = drop_known_words(suggestions, known_words)
+        unique = {}
+        for suggestion in suggestions:
+            unique.setdefault(word_key(suggestion), suggestion)
+        undefined = [key for key, s in unique.items() if not s.definition]
+        if not undefined:
+            return list(unique.values()), 0
+
+        definitions = await self.definitions.get_many(undefined)
+        missing = [key for key in undefined if key not in definitions]
+        tokens_used = 0
+        if missing:
+            defined, tokens_used = await self._define_words(missing, priority)
+            if defined:
+                await self.definitions.put_many(defined, self.model_quick)
+            definitions.update(defined)
+        logger.debug(
+            "[LLM] Vocabulary: %d suggestions, %d dropped as known, %d defined from the store, %d by the model",
+            offered,
+            offered - len(suggestions),
+            len(undefined) - len(missing),
+            len(missing),
+        )
+
+        completed = []
+        for key, suggestion in unique.items():
+            if suggestion.definition:
+                completed.append(suggestion)
+            elif key in definitions:
+                completed.append(suggestion.model_copy(update={"lemma": key[0], **definitions[key]}))
+        return completed, tokens_used
+
+    async def _define_words(
+        self, keys: list[tuple[str, str]], priority: Priority
+    ) -> tuple[dict[tuple[str, str], dict], int]:
+        """Ask the quick model to define words it has never defined before."""
+        words = "\n".join(f"- {lemma} ({part_of_speech})" for lemma, part_of_speech in keys)
+        response, collapsed = await self._create_completion(
+            "define_words",
+            priority,
+            model=self.model_quick,
+            messages=[{"role": "user", "content": VOCABULARY_DEFINE_PROMPT.format(words=words)}],
+            response_format={"type": "json_object"},
+            temperature=0.3,
+        )
+        tokens_used = response.usage.total_tokens if response.usage and not collapsed else 0
+        try:
+            result = loads(response.choices[0].message.content)
+        except ValueError as e:
+            logger.error("[LLM] Word definitions JSON parsing failed: %s", e)
+            return {}, tokens_used
+
+        entries = result.get("definitions") if isinstance(result, dict) else None
+        if not isinstance(entries, list):
+            logger.error("[LLM] Word definitions response has no definitions list")
+            return {}, tokens_used
+
+        wanted = set(keys)
+        defined = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            lemma, part_of_speech = entry.get("lemma"), entry.get("part_of_speech")
+            if not isinstance(lemma, str) or not lemma.strip():
+                continue
+            key = word_key(VocabSuggestion(word=lemma, part_of_speech=part_of_speech if isinstance(part_of_speech, str) else ""))
+            definition, example_sentence = entry.get("definition"), entry.get("example_sentence")
+            if key in wanted and isinstance(definition, str) and definition:
+                defined[key] = {
+                    "definition": definition,
+                    "example_sentence": example_sentence if isinstance(example_sentence, str) else "",
+                }
+        return defined, tokens_used
 
 
 # Singleton instance
@@ -0,0 +1,144 @@
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import uuid
+from contextvars import ContextVar
+
+from app.config import get_settings
+
+REQUEST_ID_HEADER = "x-request-id"
+
+# Correlation ID of the request being handled, and whether its payloads are logged
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+payload_sampled_var: ContextVar[bool] = ContextVar("payload_sampled", default=False)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+# HTTP clients that log every Supabase and OpenAI request at INFO
+QUIET_LOGGERS = ("httpx", "httpcore")
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp each record with the current request's correlation ID."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log collectors."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class ExceptionKeepingQueueHandler(logging.handlers.QueueHandler):
+    """A queue handler that hands the listener's formatter the exception separately.
+
+    The stdlib handler folds the traceback into the message and drops
+    ``exc_info``, so a JSON record would carry it in "message" instead of
+    "exception". The message is still rendered here, on the calling side.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+
+class Truncated:
+    """A payload rendered, and cut to ``limit`` characters, only if its log record is formatted."""
+
+    def __init__(self, value, limit: int | None = None):
+        self.value = value
+        self.limit = limit if limit is not None else get_settings().log_payload_chars
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else json.dumps(self.value, default=str)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... ({len(text)} chars)"
+
+
+def log_payload(logger: logging.Logger, message: str, value) -> None:
+    """Log a request or response payload at DEBUG level, for sampled requests only."""
+    if payload_sampled_var.get() and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s", message, Truncated(value))
+
+
+class CorrelationIdMiddleware:
+    """Give each request a correlation ID and decide whether its payloads are logged.
+
+    An incoming ``X-Request-ID`` header is reused; otherwise one is
+    generated. The ID is echoed back in the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.sample_rate = get_settings().log_payload_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        request_token = request_id_var.set(request_id)
+        sampled_token = payload_sampled_var.set(self.sample_rate > 0 and random.random() < self.sample_rate)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((REQUEST_ID_HEADER.encode(), request_id.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(request_token)
+            payload_sampled_var.reset(sampled_token)
+
+
+def configure_logging() -> logging.handlers.QueueListener:
+    """Route all logging through a queue drained by a background thread.
+
+    Records are written to stderr by the listener thread, so a slow
+    terminal or log shipper never blocks the event loop. Returns the
+    started listener; stop it on shutdown to flush what is left.
+    """
+    settings = get_settings()
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if settings.log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = ExceptionKeepingQueueHandler(log_queue)
+    # The filter runs on the calling side, where the request's context is visible
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.log_level.upper())
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
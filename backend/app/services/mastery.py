@@ -0,0 +1,97 @@
+import asyncio
+import logging
+
+from app.config import get_settings
+from app.services.context import get_context_loader
+from app.services.supabase import mark_mastered_patterns
+
+logger = logging.getLogger(__name__)
+
+
+class MasteryJob:
+    """Detect mastered writing patterns in the background, in batches.
+
+    Sessions are marked when something that can change their mastery
+    happens (an analysis is saved, progress is compared). Every
+    ``interval_seconds`` the marked sessions are checked together, up to
+    ``batch_size`` per database call. A batch that fails is marked again
+    for the next run. Marks are ignored while the job is not running.
+    """
+
+    def __init__(self, interval_seconds: float, batch_size: int):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._pending: set[str] = set()
+        self._task: asyncio.Task | None = None
+        self.runs = 0
+        self.sessions_checked = 0
+        self.patterns_mastered = 0
+        self.failures = 0
+
+    def mark(self, session_id: str) -> None:
+        if self._task is not None:
+            self._pending.add(session_id)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"[MASTERY] Checking marked sessions every {self.interval_seconds:.0f}s")
+
+    async def stop(self) -> None:
+        """Stop the loop and check whatever is still marked."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        await self.run_once()
+        self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.run_once()
+
+    async def run_once(self) -> None:
+        while self._pending:
+            batch = [self._pending.pop() for _ in range(min(self.batch_size, len(self._pending)))]
+            try:
+                mastered = await mark_mastered_patterns(batch)
+            except asyncio.CancelledError:
+                self._pending.update(batch)
+                raise
+            except Exception as e:
+                self.failures += 1
+                self._pending.update(batch)
+                logger.warning(f"[MASTERY] Check of {len(batch)} sessions failed: {type(e).__name__}: {str(e)}")
+                return
+            self.runs += 1
+            self.sessions_checked += len(batch)
+            self.patterns_mastered += len(mastered)
+            # Mastered patterns are left out of analysis prompts, so those sessions' contexts are stale
+            for session_id in {row["session_id"] for row in mastered}:
+                get_context_loader().invalidate(session_id)
+            if mastered:
+                logger.info(f"[MASTERY] {len(mastered)} patterns mastered across {len(batch)} sessions")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "runs": self.runs,
+            "sessions_checked": self.sessions_checked,
+            "patterns_mastered": self.patterns_mastered,
+            "failures": self.failures,
+        }
+
+
+# Singleton instance
+_mastery_job: MasteryJob | None = None
+
+
+def get_mastery_job() -> MasteryJob:
+    global _mastery_job
+    if _mastery_job is None:
+        settings = get_settings()
+        _mastery_job = MasteryJob(
+            interval_seconds=settings.mastery_interval_seconds,
+            batch_size=settings.mastery_batch_size,
+        )
+    return _mastery_job
@@ -0,0 +1,79 @@
+from app.models import Annotation, Pattern, Scores, VocabSuggestion
+
+
+def shift_annotations(annotations: list[Annotation], offset: int, length: int) -> list[Annotation]:
+    """Move passage-relative annotations into document coordinates.
+
+    Annotations that fall outside ``[0, length]`` of their passage are
+    dropped, since there is no safe place to anchor them.
+    """
+    shifted = []
+    for a in annotations:
+        if a.start_offset < 0 or a.end_offset > length or a.start_offset >= a.end_offset:
+            continue
+        shifted.append(
+            a.model_copy(update={"start_offset": a.start_offset + offset, "end_offset": a.end_offset + offset})
+        )
+    return shifted
+
+
+def dedupe_annotations(annotations: list[Annotation], min_overlap: float = 0.5) -> list[Annotation]:
+    """Sort annotations and drop near-duplicates.
+
+    Two annotations are duplicates when they share a category and their
+    spans overlap by at least ``min_overlap`` of their combined extent, as
+    happens when overlapping chunks both flag the same issue. The first
+    one seen wins.
+    """
+    kept: list[Annotation] = []
+    open_spans: list[Annotation] = []
+    for a in sorted(annotations, key=lambda a: (a.start_offset, a.end_offset)):
+        open_spans = [k for k in open_spans if k.end_offset > a.start_offset]
+        duplicate = any(
+            k.category == a.category
+            and min(k.end_offset, a.end_offset) - a.start_offset
+            >= min_overlap * (max(k.end_offset, a.end_offset) - k.start_offset)
+            for k in open_spans
+        )
+        if not duplicate:
+            kept.append(a)
+            open_spans.append(a)
+    return kept
+
+
+def merge_scores(weighted_scores: list[tuple[Scores, int]]) -> Scores:
+    """Combine scores, weighting each by the number of characters it covers."""
+    total = sum(weight for _, weight in weighted_scores)
+    if not total:
+        return Scores(grammar=0, clarity=0, voice=0, overall=0)
+    return Scores(
+        **{
+            field: sum(getattr(scores, field) * weight for scores, weight in weighted_scores) / total
+            for field in ("grammar", "clarity", "voice", "overall")
+        }
+    )
+
+
+def merge_patterns(*groups: list[Pattern]) -> list[Pattern]:
+    """Concatenate pattern lists, keeping the first pattern of each pattern_type."""
+    seen = set()
+    merged = []
+    for group in groups:
+        for pattern in group:
+            if pattern.pattern_type not in seen:
+                seen.add(pattern.pattern_type)
+                merged.append(pattern)
+    return merged
+
+
+def merge_vocabulary(*groups: list[VocabSuggestion]) -> list[VocabSuggestion]:
+    """Concatenate vocabulary suggestions, keeping the first of each word."""
+    seen = set()
+    merged = []
+    for group in groups:
+        for suggestion in group:
+            word = suggestion.word.strip().lower()
+            if word not in seen:
+                seen.add(word)
+                merged.append(suggestion)
+    return merged
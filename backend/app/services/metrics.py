@@ -0,0 +1,185 @@
+import functools
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = Histogram(
+    "writemate_stage_duration_seconds",
+    "Time spent in each stage of request handling",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+LLM_TOKENS = Counter("writemate_llm_tokens_total", "Tokens reported by the LLM API", ["model", "kind"])
+
+# Set by configure_tracing when OpenTelemetry export is enabled
+_tracer = None
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as one stage, recording it in the stage histogram and, when enabled, as a trace span."""
+    with ExitStack() as stack:
+        if _tracer is not None:
+            stack.enter_context(_tracer.start_as_current_span(name))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.labels(name).observe(time.perf_counter() - started)
+
+
+def timed(name: str):
+    """Decorator form of ``stage`` for coroutine functions."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with stage(name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_token_usage(model: str, usage) -> None:
+    LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens)
+    LLM_TOKENS.labels(model, "completion").inc(usage.completion_tokens)
+
+
+class ServiceStatsCollector:
+    """Expose the counters the services already keep, read at scrape time."""
+
+    def describe(self):
+        # Without this, registering the collector would call collect() during import
+        return []
+
+    def collect(self):
+        # Imported here: these modules import this one for their stage timings
+        from app.services.alignment import alignment_totals
+        from app.services.batch import _batch_processor
+        from app.services.cache import get_analysis_cache
+        from app.services.llm import _llm_service
+        from app.services.mastery import get_mastery_job
+        from app.services.similarity import _similarity_cache
+        from app.services.structured import decode_totals
+        from app.services.write_queue import get_write_queue
+
+        cache = get_analysis_cache().stats()
+        lookups = CounterMetricFamily("writemate_analysis_cache_lookups", "Analysis cache lookups by result", labels=["result"])
+        for result in ("hits", "shared_hits", "misses", "bypasses"):
+            lookups.add_metric([result], cache[result])
+        yield lookups
+        yield GaugeMetricFamily("writemate_analysis_cache_entries", "Entries in the local analysis cache", value=cache["local_entries"])
+
+        if _similarity_cache is not None:
+            similarity = _similarity_cache.stats()
+            similar = CounterMetricFamily(
+                "writemate_similarity_cache_lookups", "Similarity cache lookups (near-duplicate analyses, repeated quick checks) by kind and result", labels=["kind", "result"]
+            )
+            for kind, counts in similarity.items():
+                similar.add_metric([kind, "hits"], counts["hits"])
+                similar.add_metric([kind, "misses"], counts["misses"])
+            yield similar
+
+        writes = get_write_queue().stats()
+        yield GaugeMetricFamily("writemate_write_queue_pending", "Analysis results waiting to be persisted", value=writes["pending"])
+        persisted = CounterMetricFamily("writemate_write_queue_results", "Analysis results by outcome", labels=["outcome"])
+        for outcome in ("persisted", "retries", "dead_lettered", "inline_writes"):
+            persisted.add_metric([outcome], writes[outcome])
+        yield persisted
+
+        aligned = CounterMetricFamily("writemate_annotations_aligned", "Annotations checked against the text", labels=["outcome"])
+        for outcome in ("checked", "corrected", "dropped"):
+            aligned.add_metric([outcome], alignment_totals[outcome])
+        yield aligned
+
+        decoded = CounterMetricFamily("writemate_llm_outputs_decoded", "Structured LLM outputs decoded, by outcome", labels=["outcome"])
+        for outcome in ("valid", "repaired", "failed"):
+            decoded.add_metric([outcome], decode_totals[outcome])
+        yield decoded
+
+        mastery = get_mastery_job().stats()
+        yield GaugeMetricFamily("writemate_mastery_pending_sessions", "Sessions waiting for a mastery check", value=mastery["pending"])
+        yield CounterMetricFamily("writemate_patterns_mastered", "Writing patterns marked mastered", value=mastery["patterns_mastered"])
+
+        if _batch_processor is not None:
+            batch = _batch_processor.stats()
+            yield GaugeMetricFamily("writemate_batch_jobs_running", "Batch analysis jobs in progress", value=batch["jobs_running"])
+            documents = CounterMetricFamily("writemate_batch_documents", "Batch job documents by outcome", labels=["outcome"])
+            documents.add_metric(["completed"], batch["documents_completed"])
+            documents.add_metric(["failed"], batch["documents_failed"])
+            yield documents
+
+        # The LLM service is created on first use; report nothing until then
+        if _llm_service is None:
+            return
+        llm = _llm_service.stats()
+        calls = CounterMetricFamily("writemate_llm_calls", "LLM calls by label and whether they were coalesced", labels=["label", "collapsed"])
+        for label, counts in llm["single_flight"].items():
+            calls.add_metric([label, "false"], counts["calls"] - counts["collapsed"])
+            calls.add_metric([label, "true"], counts["collapsed"])
+        yield calls
+        window = GaugeMetricFamily("writemate_llm_concurrency_window", "Scheduler concurrency window", labels=["model"])
+        queued = GaugeMetricFamily("writemate_llm_queued", "Requests waiting for a scheduler slot", labels=["model"])
+        for model, scheduler in llm["scheduler"].items():
+            window.add_metric([model], scheduler["window"])
+            queued.add_metric([model], scheduler["queued"])
+        yield window
+        yield queued
+        definitions = CounterMetricFamily("writemate_word_definition_lookups", "Word definition lookups by result", labels=["result"])
+        for result in ("local_hits", "shared_hits", "misses"):
+            definitions.add_metric([result], llm["word_definitions"][result])
+        yield definitions
+        cascade = llm["cascade"]
+        routes = CounterMetricFamily("writemate_cascade_routes", "Cascaded analyses by the model that answered", labels=["route"])
+        for route in ("quick", "escalated"):
+            routes.add_metric([route], cascade["routes"].get(route, 0))
+        yield routes
+        reasons = CounterMetricFamily("writemate_cascade_escalations", "Cascade escalations by failed check", labels=["reason"])
+        for reason, count in cascade["escalation_reasons"].items():
+            reasons.add_metric([reason], count)
+        yield reasons
+        # Net savings can fall when escalations cost more than quick answers save
+        yield GaugeMetricFamily("writemate_cascade_saved_usd", "Estimated net cost saved by the model cascade", value=cascade["saved_usd"])
+        yield GaugeMetricFamily("writemate_cascade_saved_seconds", "Estimated net latency saved by the model cascade", value=cascade["saved_seconds"])
+
+
+REGISTRY.register(ServiceStatsCollector())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with their content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def configure_tracing() -> None:
+    """Export stage spans to an OpenTelemetry collector when OTEL_ENABLED is set."""
+    global _tracer
+    settings = get_settings()
+    if not settings.otel_enabled:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logger.warning(
+            "[METRICS] OTEL_ENABLED is set but OpenTelemetry is not installed "
+            "(pip install opentelemetry-sdk opentelemetry-exporter-otlp-proto-grpc)"
+        )
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": settings.otel_service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=settings.otel_endpoint, insecure=True)))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("writemate")
+    logger.info(f"[METRICS] Exporting traces to {settings.otel_endpoint}")
@@ -0,0 +1,159 @@
+import re
+from dataclasses import dataclass
+
+from app.models import QuickCheckIssue, QuickCheckResponse
+
+# All patterns are compiled once, when the module is imported at startup
+
+MISSPELLINGS = {
+    "accomodate": "accommodate",
+    "acheive": "achieve",
+    "alot": "a lot",
+    "arguement": "argument",
+    "begining": "beginning",
+    "beleive": "believe",
+    "calender": "calendar",
+    "concious": "conscious",
+    "definately": "definitely",
+    "embarass": "embarrass",
+    "enviroment": "environment",
+    "existance": "existence",
+    "familar": "familiar",
+    "foriegn": "foreign",
+    "freind": "friend",
+    "goverment": "government",
+    "grammer": "grammar",
+    "immediatly": "immediately",
+    "independant": "independent",
+    "knowlege": "knowledge",
+    "libary": "library",
+    "neccessary": "necessary",
+    "noticable": "noticeable",
+    "occured": "occurred",
+    "occurence": "occurrence",
+    "persue": "pursue",
+    "posession": "possession",
+    "prefered": "preferred",
+    "publically": "publicly",
+    "realy": "really",
+    "recieve": "receive",
+    "reccomend": "recommend",
+    "refered": "referred",
+    "remeber": "remember",
+    "seperate": "separate",
+    "succesful": "successful",
+    "suprise": "surprise",
+    "teh": "the",
+    "thier": "their",
+    "tommorow": "tomorrow",
+    "truely": "truly",
+    "untill": "until",
+    "wich": "which",
+    "wierd": "weird",
+    "writting": "writing",
+}
+
+# "had had" and "that that" are often correct
+ALLOWED_REPEATS = {"had", "that"}
+
+DOUBLE_SPACE = re.compile(r"(?<=\S) {2,}(?=\S)")
+SENTENCE = re.compile(r"[^.!?]+[.!?]*")
+WORD = re.compile(r"[A-Za-z0-9']+")
+PASSIVE_VOICE = re.compile(
+    r"\b(?:am|is|are|was|were|be|been|being)\s+(?:\w+ly\s+)?"
+    r"(?:\w+ed|known|written|done|made|given|taken|seen|shown|found|built|held|told|sent|left|kept|brought|chosen)\b"
+    r"(?:\s+by\b)?",
+    re.IGNORECASE,
+)
+# A list marker such as "1)" or "b)" is matched whole, so its ")" can be told apart from a closing one
+BRACKET = re.compile(r"(?<![\w(])(?:\d+|[A-Za-z])\)|[()\[\]{}]")
+BRACKET_PAIRS = {")": "(", "]": "[", "}": "{"}
+
+LONG_SENTENCE_WORDS = 40
+MIN_WORDS = 3
+MAX_ISSUES = 3
+SEVERITY_RANK = {"error": 0, "warning": 1, "info": 2}
+
+
+@dataclass
+class PrecheckResult:
+    issues: list[QuickCheckIssue]
+    confident: bool
+
+    def to_response(self) -> QuickCheckResponse:
+        return QuickCheckResponse(has_issues=bool(self.issues), issues=self.issues, source="local")
+
+
+def precheck(content: str) -> PrecheckResult:
+    """Flag obvious issues with local rules.
+
+    The result is confident when the text is too short to review or the
+    rules found at least one warning or error; otherwise the absence of
+    findings says little, and the caller should ask the model.
+    """
+    found: list[tuple[int, str, str]] = []  # (position, severity, message)
+
+    previous = None
+    for match in WORD.finditer(content):
+        word = match.group(0).lower()
+        if word in MISSPELLINGS:
+            found.append((match.start(), "error", f'"{match.group(0)}" should be "{MISSPELLINGS[word]}"'))
+        if (
+            previous is not None
+            and word == previous.group(0).lower()
+            and word not in ALLOWED_REPEATS
+            and content[previous.end():match.start()].isspace()
+        ):
+            found.append((previous.start(), "error", f'Repeated word: "{content[previous.start():match.end()]}"'))
+        previous = match
+    _check_pairs(content, found)
+    for match in DOUBLE_SPACE.finditer(content):
+        found.append((match.start(), "info", "Double space between words"))
+        break
+
+    word_count = 0
+    for match in SENTENCE.finditer(content):
+        words = len(match.group(0).split())
+        word_count += words
+        if words > LONG_SENTENCE_WORDS:
+            found.append((match.start(), "info", f"Very long sentence ({words} words); consider splitting it"))
+    for match in PASSIVE_VOICE.finditer(content):
+        found.append((match.start(), "info", f'Possible passive voice: "{match.group(0)}"'))
+        break
+
+    found.sort(key=lambda f: (SEVERITY_RANK[f[1]], f[0]))
+    issues = []
+    for _, severity, message in found:
+        if len(issues) == MAX_ISSUES:
+            break
+        if all(i.message != message for i in issues):
+            issues.append(QuickCheckIssue(message=message, severity=severity))
+    confident = word_count < MIN_WORDS or any(i.severity != "info" for i in issues)
+    return PrecheckResult(issues=issues, confident=confident)
+
+
+def _check_pairs(content: str, found: list[tuple[int, str, str]]) -> None:
+    """Report unbalanced brackets and double quotes.
+
+    The ")" of a list marker ("Steps: 1) open 2) save") closes an open "("
+    when there is one, as in "(see a) below", and is ignored otherwise.
+    """
+    stack: list[tuple[str, int]] = []
+    for match in BRACKET.finditer(content):
+        char, i = match.group(0)[-1], match.end() - 1
+        if len(match.group(0)) > 1 and not (stack and stack[-1][0] == "("):
+            continue
+        if char in "([{":
+            stack.append((char, i))
+        elif char in BRACKET_PAIRS:
+            if stack and stack[-1][0] == BRACKET_PAIRS[char]:
+                stack.pop()
+            else:
+                found.append((i, "warning", f'Unmatched closing "{char}"'))
+                break
+    else:
+        if stack:
+            found.append((stack[-1][1], "warning", f'Unclosed "{stack[-1][0]}"'))
+
+    if content.count('"') % 2 or content.count("“") != content.count("”"):
+        found.append((0, "warning", "Unbalanced quotation marks"))
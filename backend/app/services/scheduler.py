@@ -0,0 +1,256 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Awaitable, Callable
+
+import openai
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying; only RateLimitError shrinks the concurrency window
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # quick checks fired while the user types
+    STANDARD = 1  # full analyses the user is waiting for
+    BATCH = 2  # background and bulk work
+
+
+class LLMOverloadedError(Exception):
+    """The provider kept rate limiting, or a request waited too long for a slot."""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Budget that refills continuously up to ``capacity`` per minute."""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.available = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` can be spent; a request larger than the bucket waits for a full one."""
+        self._refill()
+        needed = min(amount, self.capacity) - self.available
+        return max(0.0, needed * 60 / self.capacity)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.available -= amount
+
+    def sync(self, limit: float | None, remaining: float | None) -> None:
+        """Align the bucket with the provider's view from rate-limit headers."""
+        self._refill()
+        if limit:
+            self.capacity = limit
+        if remaining is not None:
+            self.available = min(self.available, remaining)
+
+
+class ModelScheduler:
+    """Admission control for one model.
+
+    Requests wait in a priority queue until a concurrency slot, a request
+    budget and a token budget are all available. The concurrency window
+    grows by one slot per window of successful calls and halves on every
+    429 (AIMD), staying between 1 and ``max_concurrency``.
+    """
+
+    def __init__(self, model: str, max_concurrency: int, requests_per_minute: int, tokens_per_minute: int):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.window = float(max_concurrency)
+        self.in_flight = 0
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._paused_until = 0.0
+        self._waiters: list[tuple[int, int, float, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self.rate_limited = 0
+
+    async def acquire(self, priority: Priority, estimated_tokens: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), estimated_tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller gave up: hand the slot back
+                self.release()
+            raise
+
+    def release(self, headers=None, rate_limited: bool = False, retry_after: float | None = None) -> None:
+        self.in_flight -= 1
+        if rate_limited:
+            self.rate_limited += 1
+            self.window = max(1.0, self.window / 2)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            logger.warning(f"[SCHEDULER] {self.model} rate limited, window now {self.window:.1f}")
+        else:
+            self.window = min(float(self.max_concurrency), self.window + 1 / self.window)
+        if headers is not None:
+            self._sync_headers(headers)
+        self._dispatch()
+
+    def _sync_headers(self, headers) -> None:
+        self.requests.sync(
+            _float_header(headers, "x-ratelimit-limit-requests"),
+            _float_header(headers, "x-ratelimit-remaining-requests"),
+        )
+        self.tokens.sync(
+            _float_header(headers, "x-ratelimit-limit-tokens"),
+            _float_header(headers, "x-ratelimit-remaining-tokens"),
+        )
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters and self.in_flight < int(self.window):
+            _, _, estimated_tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = max(
+                self._paused_until - time.monotonic(),
+                self.requests.wait_time(1),
+                self.tokens.wait_time(estimated_tokens),
+            )
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self.requests.consume(1)
+            self.tokens.consume(estimated_tokens)
+            self.in_flight += 1
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "window": round(self.window, 2),
+            "in_flight": self.in_flight,
+            "queued": sum(1 for *_, f in self._waiters if not f.done()),
+            "rate_limited": self.rate_limited,
+        }
+
+
+def _float_header(headers, name: str) -> float | None:
+    value = headers.get(name)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _retry_after(error: Exception) -> float | None:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    return _float_header(response.headers, "retry-after")
+
+
+class LLMScheduler:
+    """Route LLM calls through per-model schedulers, retrying transient failures."""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_retries: int,
+        queue_timeout_seconds: float,
+        model_limits: dict[str, dict] | None = None,
+    ):
+        self.defaults = {
+            "max_concurrency": max_concurrency,
+            "requests_per_minute": requests_per_minute,
+            "tokens_per_minute": tokens_per_minute,
+        }
+        self.model_limits = model_limits or {}
+        self.max_retries = max_retries
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._models: dict[str, ModelScheduler] = {}
+
+    def for_model(self, model: str) -> ModelScheduler:
+        if model not in self._models:
+            limits = {**self.defaults, **self.model_limits.get(model, {})}
+            self._models[model] = ModelScheduler(model, **limits)
+        return self._models[model]
+
+    async def call(self, model: str, priority: Priority, estimated_tokens: int, request: Callable[[], Awaitable]):
+        """Run ``request`` when the model has capacity.
+
+        ``request`` must return an OpenAI raw response (``with_raw_response``)
+        so rate-limit headers can be read; the parsed result is returned.
+        """
+        scheduler = self.for_model(model)
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.wait_for(scheduler.acquire(priority, estimated_tokens), self.queue_timeout_seconds)
+            except asyncio.TimeoutError:
+                raise LLMOverloadedError(f"Timed out waiting for {model} capacity")
+
+            try:
+                raw = await request()
+            except RETRYABLE_ERRORS as e:
+                rate_limited = isinstance(e, openai.RateLimitError)
+                retry_after = _retry_after(e)
+                scheduler.release(
+                    headers=e.response.headers if getattr(e, "response", None) is not None else None,
+                    rate_limited=rate_limited,
+                    retry_after=retry_after,
+                )
+                if attempt == self.max_retries:
+                    if rate_limited:
+                        raise LLMOverloadedError(f"{model} is rate limited", retry_after) from e
+                    raise
+                delay = retry_after or min(30.0, 0.5 * 2 ** attempt)
+                logger.warning(f"[SCHEDULER] {model} call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                scheduler.release()
+                raise
+
+            scheduler.release(headers=raw.headers)
+            return raw.parse()
+
+    def stats(self) -> dict:
+        return {model: scheduler.stats() for model, scheduler in self._models.items()}
+
+
+# Singleton instance
+_llm_scheduler: LLMScheduler | None = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _llm_scheduler
+    if _llm_scheduler is None:
+        settings = get_settings()
+        _llm_scheduler = LLMScheduler(
+            max_concurrency=settings.llm_max_concurrency,
+            requests_per_minute=settings.llm_requests_per_minute,
+            tokens_per_minute=settings.llm_tokens_per_minute,
+            max_retries=settings.llm_max_retries,
+            queue_timeout_seconds=settings.llm_queue_timeout_seconds,
+            model_limits=settings.llm_model_limits,
+        )
+    return _llm_scheduler
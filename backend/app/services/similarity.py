@@ -0,0 +1,196 @@
+import logging
+import re
+import time
+from typing import Any
+
+import numpy as np
+
+from app.config import get_settings
+from app.models import AnalysisResponse, QuickCheckResponse
+from app.services.alignment import TextIndex, align_annotations
+from app.services.cache import TTLCache, make_analysis_key
+
+logger = logging.getLogger(__name__)
+
+SHINGLE_CHARS = 5
+NUM_PERMUTATIONS = 128
+MERSENNE_PRIME = (1 << 61) - 1
+# Shingles hashed per step, bounding the (shingles x permutations) working array
+SIGNATURE_BLOCK = 2048
+WHITESPACE = re.compile(r"\s+")
+
+
+def shingles(text: str) -> set[str]:
+    """Overlapping ``SHINGLE_CHARS``-character pieces of the lower-cased, whitespace-collapsed text."""
+    normalized = WHITESPACE.sub(" ", text.strip().lower())
+    return {normalized[i:i + SHINGLE_CHARS] for i in range(max(1, len(normalized) - SHINGLE_CHARS + 1))}
+
+
+class MinHasher:
+    """MinHash signatures: the share of equal positions in two signatures estimates the
+    Jaccard similarity of the two texts' shingle sets."""
+
+    def __init__(self, num_permutations: int = NUM_PERMUTATIONS, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # Below 2**32, so a * hash + b stays below 2**64
+        self.a = rng.integers(1, 1 << 32, size=num_permutations, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_permutations, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        # hash() is salted per process, which is fine for an index that lives in this process
+        hashes = np.fromiter((hash(s) & 0xFFFFFFFF for s in shingles(text)), dtype=np.uint64)
+        signature = np.full(len(self.a), MERSENNE_PRIME, dtype=np.uint64)
+        for start in range(0, len(hashes), SIGNATURE_BLOCK):
+            block = hashes[start:start + SIGNATURE_BLOCK, None]
+            np.minimum(signature, ((block * self.a + self.b) % MERSENNE_PRIME).min(axis=0), out=signature)
+        return signature
+
+
+class SimilarityIndex:
+    """Earlier answers, found by the MinHash similarity of the text they were given.
+
+    Signatures are rows of one NumPy matrix, so a lookup compares a text
+    against every entry in a single vectorized pass. An entry only matches
+    lookups with the same scope (persona, patterns and model), and the
+    oldest entry is overwritten once the index is full.
+    """
+
+    def __init__(self, hasher: MinHasher, max_entries: int, ttl_seconds: float, threshold: float, min_chars: int):
+        self.hasher = hasher
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.min_chars = min_chars
+        self.signatures = np.zeros((max_entries, len(hasher.a)), dtype=np.uint64)
+        self.scopes = np.zeros(max_entries, dtype=np.int64)
+        # Monotonic expiry time of each slot; 0 marks an empty slot
+        self.expires = np.zeros(max_entries)
+        self.values: list[Any] = [None] * max_entries
+        self._next = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, content: str, scope: str) -> tuple[Any, float] | None:
+        """The closest earlier answer at least ``threshold`` similar to ``content``, and its similarity."""
+        if len(content) < self.min_chars:
+            return None
+        candidates = np.flatnonzero((self.scopes == _scope_id(scope)) & (self.expires > time.monotonic()))
+        if len(candidates):
+            similarities = (self.signatures[candidates] == self.hasher.signature(content)).mean(axis=1)
+            best = int(similarities.argmax())
+            if similarities[best] >= self.threshold:
+                self.hits += 1
+                return self.values[candidates[best]], float(similarities[best])
+        self.misses += 1
+        return None
+
+    def add(self, content: str, scope: str, value: Any) -> None:
+        if len(content) < self.min_chars:
+            return
+        slot = self._next
+        self._next = (slot + 1) % len(self.values)
+        self.signatures[slot] = self.hasher.signature(content)
+        self.scopes[slot] = _scope_id(scope)
+        self.expires[slot] = time.monotonic() + self.ttl_seconds
+        self.values[slot] = value
+
+    def clear(self) -> None:
+        self.expires[:] = 0
+        self.values = [None] * len(self.values)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": int((self.expires > time.monotonic()).sum()),
+        }
+
+
+def _scope_id(scope: str) -> int:
+    return hash(scope)
+
+
+def analysis_scope(persona: dict | None, historical_patterns: list[str] | None, model: str) -> str:
+    """What, besides the text, an analysis depends on."""
+    return make_analysis_key("", persona, historical_patterns, model)
+
+
+def reuse_analysis(analysis: AnalysisResponse, content: str) -> AnalysisResponse:
+    """Move an analysis of a nearly identical text onto ``content``.
+
+    Annotations are re-aligned by the text they quote; those whose quote
+    is no longer in the text are dropped. Scores, patterns, vocabulary
+    and summary are kept as they were.
+    """
+    annotations, _ = align_annotations(TextIndex(content), analysis.annotations)
+    return analysis.model_copy(update={"annotations": annotations})
+
+
+class SimilarityCache:
+    """Near-duplicate reuse of full analyses, and exact reuse of quick checks.
+
+    Complements the exact analysis cache: re-running an analysis after
+    fixing a typo changes the cache key but barely changes the text.
+    Quick checks are only reused for the same text: their issues carry no
+    offsets or quotes to re-align, and a small edit is often exactly the
+    fix for the issue they reported.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, threshold: float, min_chars: int):
+        self.analyses = SimilarityIndex(MinHasher(), max_entries, ttl_seconds, threshold, min_chars)
+        self.quick_checks = TTLCache(max_entries, ttl_seconds)
+        self.quick_check_hits = 0
+        self.quick_check_misses = 0
+
+    def find_analysis(self, content: str, scope: str) -> tuple[AnalysisResponse, str] | None:
+        """An analysis of a nearly identical text moved onto ``content``, and the model that answered it."""
+        found = self.analyses.lookup(content, scope)
+        if found is None:
+            return None
+        (analysis, model), similarity = found
+        logger.debug("[SIMILARITY] Reusing an analysis of a text %.3f similar", similarity)
+        return reuse_analysis(analysis, content), model
+
+    def add_analysis(self, content: str, scope: str, analysis: AnalysisResponse, model: str) -> None:
+        self.analyses.add(content, scope, (analysis, model))
+
+    def find_quick_check(self, content: str, model: str) -> QuickCheckResponse | None:
+        result = self.quick_checks.get(make_analysis_key(content, None, None, model))
+        if result is None:
+            self.quick_check_misses += 1
+        else:
+            self.quick_check_hits += 1
+        return result
+
+    def add_quick_check(self, content: str, model: str, result: QuickCheckResponse) -> None:
+        self.quick_checks.set(make_analysis_key(content, None, None, model), result)
+
+    def stats(self) -> dict:
+        lookups = self.quick_check_hits + self.quick_check_misses
+        return {
+            "analyses": self.analyses.stats(),
+            "quick_checks": {
+                "hits": self.quick_check_hits,
+                "misses": self.quick_check_misses,
+                "hit_rate": self.quick_check_hits / lookups if lookups else 0.0,
+                "entries": len(self.quick_checks),
+            },
+        }
+
+
+# Singleton instance
+_similarity_cache: SimilarityCache | None = None
+
+
+def get_similarity_cache() -> SimilarityCache:
+    global _similarity_cache
+    if _similarity_cache is None:
+        settings = get_settings()
+        _similarity_cache = SimilarityCache(
+            max_entries=settings.similarity_cache_max_entries,
+            ttl_seconds=settings.similarity_cache_ttl_seconds,
+            threshold=settings.similarity_cache_threshold,
+            min_chars=settings.similarity_cache_min_chars,
+        )
+    return _similarity_cache
@@ -0,0 +1,55 @@
+import asyncio
+import hashlib
+import json
+from collections import Counter
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def fingerprint(payload: dict) -> str:
+    """Stable hash of a JSON-serializable request payload."""
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key onto one execution.
+
+    The first caller starts the work as its own task; callers arriving
+    while it is in flight await the same task. Each caller is shielded,
+    so a cancelled request does not cancel the call the others share.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.calls: Counter[str] = Counter()
+        self.collapsed: Counter[str] = Counter()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]], label: str = "default") -> tuple[T, bool]:
+        """Run ``fn`` unless an identical call is in flight.
+
+        Returns the result and whether this call was collapsed onto another.
+        """
+        self.calls[label] += 1
+        task = self._inflight.get(key)
+        collapsed = task is not None
+        if collapsed:
+            self.collapsed[label] += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task), collapsed
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter went away
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            label: {"calls": self.calls[label], "collapsed": self.collapsed[label]}
+            for label in self.calls
+        }
@@ -0,0 +1,146 @@
+import logging
+import re
+from collections import Counter
+from typing import Any, TypeVar, get_args, get_origin
+
+import orjson
+from pydantic import BaseModel, ValidationError
+from pydantic_core import from_json
+
+from app.models import (
+    AnalysisResponse,
+    Annotation,
+    Pattern,
+    QuickCheckIssue,
+    QuickCheckResponse,
+    Scores,
+    VocabSuggestion,
+)
+
+logger = logging.getLogger(__name__)
+
+# Cumulative counts of model outputs decoded, by outcome
+decode_totals: Counter = Counter()
+
+CODE_FENCE = re.compile(r"^\s*```(?:json)?|```\s*$")
+# Strings are matched whole so that commas inside them are left alone
+STRING_OR_TRAILING_COMMA = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|,(?=\s*[}\]])')
+TRAILING_COMMA = re.compile(r",\s*[}\]]")
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class ModelAnalysis(BaseModel):
+    """An analysis as the model writes it; lists and a summary it leaves out are empty."""
+
+    annotations: list[Annotation] = []
+    scores: Scores
+    patterns: list[Pattern] = []
+    vocabulary_suggestions: list[VocabSuggestion] = []
+    summary: str = ""
+
+    def to_response(self) -> AnalysisResponse:
+        # Every field is validated already
+        return AnalysisResponse.model_construct(**dict(self))
+
+
+class ModelQuickCheck(BaseModel):
+    """A quick check as the model writes it."""
+
+    has_issues: bool = False
+    issues: list[QuickCheckIssue] = []
+
+    def to_response(self) -> QuickCheckResponse:
+        return QuickCheckResponse.model_construct(has_issues=self.has_issues, issues=self.issues, source="llm")
+
+
+def repair_json(raw: str) -> str:
+    """Undo the usual mistakes in model JSON that a parser will not accept.
+
+    Strips Markdown code fences and text around the outermost value, and
+    drops trailing commas before a closing bracket. A truncated ending is
+    cut back to the last closed value and left for
+    ``from_json(..., allow_partial=True)`` to close.
+    """
+    text = CODE_FENCE.sub("", raw.strip())
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if starts:
+        text = text[min(starts):]
+    end = max(text.rfind("}"), text.rfind("]"))
+    if end != -1:
+        text = text[:end + 1]
+    if not TRAILING_COMMA.search(text):
+        return text
+    return STRING_OR_TRAILING_COMMA.sub(lambda m: "" if m.group() == "," else m.group(), text)
+
+
+def loads(raw: str) -> Any:
+    """Decode the model's JSON, repairing it when it is not valid as written."""
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        pass
+    # Truncated strings are dropped rather than kept half-written
+    return from_json(repair_json(raw), allow_partial=True)
+
+
+def parse_output(model: type[M], raw: str) -> M:
+    """Decode the model's JSON output and validate it as ``model``.
+
+    Valid output costs one orjson decode and one validation pass, which
+    measures faster than ``model_validate_json`` (benchmarks.parse_outputs).
+    Output that is not valid JSON is repaired first, and list items that do
+    not validate (typically a cut-off last item) are dropped; when the rest
+    still does not validate, the validation error is raised.
+    """
+    first_error: ValueError | None = None
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        first_error = e
+        try:
+            data = from_json(repair_json(raw), allow_partial=True)
+        except ValueError:
+            decode_totals["failed"] += 1
+            raise e
+
+    try:
+        result = model.model_validate(data)
+    except ValidationError as e:
+        first_error = first_error or e
+        try:
+            result = model.model_validate(_drop_invalid_items(model, data) if isinstance(data, dict) else data)
+        except ValidationError:
+            decode_totals["failed"] += 1
+            raise
+
+    if first_error is None:
+        decode_totals["valid"] += 1
+        return result
+    decode_totals["repaired"] += 1
+    detail = first_error.errors()[0]["msg"] if isinstance(first_error, ValidationError) else str(first_error)
+    logger.warning(f"[LLM] Repaired {model.__name__} output: {detail}")
+    return result
+
+
+def valid_items(model: type[M], items: list) -> list[M]:
+    """The items that validate as ``model``; a repaired, truncated list can end in a partial item."""
+    valid = []
+    for item in items:
+        try:
+            valid.append(model.model_validate(item))
+        except ValidationError:
+            pass
+    return valid
+
+
+def _drop_invalid_items(model: type[BaseModel], data: dict) -> dict:
+    data = dict(data)
+    for name, field in model.model_fields.items():
+        items = data.get(name)
+        if get_origin(field.annotation) is not list or not isinstance(items, list):
+            continue
+        (item_type,) = get_args(field.annotation)
+        if isinstance(item_type, type) and issubclass(item_type, BaseModel):
+            data[name] = valid_items(item_type, items)
+    return data
@@ -1,37 +1,117 @@
-from supabase import create_client, Client
+import logging
+from supabase import AsyncClient
 from app.config import get_settings
+from app.services.metrics import timed
 
+logger = logging.getLogger(__name__)
 
-_supabase_client: Client | None = None
+_supabase_client: AsyncClient | None = None
 
 
-def get_supabase() -> Client:
+def get_supabase() -> AsyncClient:
+    """Return the shared async Supabase client.
+
+    All queries go through one pooled HTTP/2 connection to PostgREST, so
+    awaiting ``.execute()`` never blocks the event loop.
+    """
     global _supabase_client
     if _supabase_client is None:
         settings = get_settings()
-        print(f"[SUPABASE] URL: {settings.supabase_url}")
-        print(f"[SUPABASE] Key starts with: {settings.supabase_service_key[:20]}...")
-        print(f"[SUPABASE] Key length: {len(settings.supabase_service_key)} chars")
-        _supabase_client = create_client(settings.supabase_url, settings.supabase_service_key)
-        print("[SUPABASE] Client created successfully!")
+        _supabase_client = AsyncClient(settings.supabase_url, settings.supabase_service_key)
+        logger.info(f"[SUPABASE] Client created for {settings.supabase_url}")
     return _supabase_client
 
 
-async def get_session_patterns(session_id: str) -> list[str]:
-    """Get historical patterns for a session."""
+async def close_supabase() -> None:
+    """Close the pooled PostgREST connections on shutdown."""
+    global _supabase_client
+    if _supabase_client is not None:
+        await _supabase_client.postgrest.aclose()
+        _supabase_client = None
+
+
+PATTERN_COLUMNS = "pattern_type, description, occurrence_count, last_occurrence_at, is_mastered"
+
+
+@timed("db.get_session_patterns")
+async def get_session_patterns(session_id: str) -> list[dict]:
+    """Get historical pattern rows for a session."""
     supabase = get_supabase()
-    result = supabase.table("writing_patterns").select("description").eq("session_id", session_id).execute()
-    return [p["description"] for p in result.data]
+    result = await supabase.table("writing_patterns").select(PATTERN_COLUMNS).eq("session_id", session_id).execute()
+    return result.data
 
 
+@timed("db.get_persona")
 async def get_persona(session_id: str) -> dict | None:
     """Get persona for a session."""
     supabase = get_supabase()
-    result = supabase.table("user_personas").select("*").eq("session_id", session_id).single().execute()
-    return result.data if result.data else None
+    result = await supabase.table("user_personas").select("*").eq("session_id", session_id).maybe_single().execute()
+    return result.data if result and result.data else None
 
 
-async def save_analysis_result(
+@timed("db.get_vocabulary_words")
+async def get_vocabulary_words(session_id: str) -> list[str]:
+    """Get the words in a session's vocabulary bank."""
+    supabase = get_supabase()
+    result = await supabase.table("vocabulary_bank").select("word").eq("session_id", session_id).execute()
+    return [row["word"] for row in result.data]
+
+
+@timed("db.get_word_definitions")
+async def get_word_definitions(lemmas: list[str]) -> list[dict]:
+    """Get shared word definitions for the given lemmas, in every part of speech."""
+    supabase = get_supabase()
+    result = (
+        await supabase.table("word_definitions")
+        .select("lemma, part_of_speech, definition, example_sentence")
+        .in_("lemma", lemmas)
+        .execute()
+    )
+    return result.data
+
+
+@timed("db.save_word_definitions")
+async def save_word_definitions(rows: list[dict]) -> None:
+    """Add shared word definitions; a word that already has one keeps it."""
+    supabase = get_supabase()
+    await supabase.table("word_definitions").upsert(
+        rows, on_conflict="lemma,part_of_speech", ignore_duplicates=True, returning="minimal"
+    ).execute()
+
+
+@timed("db.get_document_context")
+async def get_document_context(document_id: str) -> dict | None:
+    """Get a document's session, persona and historical patterns in one query.
+
+    Returns ``{"session_id", "persona", "patterns", "vocabulary"}``, with
+    pattern rows as returned by get_session_patterns and the words of the
+    session's vocabulary bank, or None when the document does not exist.
+    """
+    supabase = get_supabase()
+    result = (
+        await supabase.table("documents")
+        .select(f"session_id, sessions(user_personas(*), writing_patterns({PATTERN_COLUMNS}), vocabulary_bank(word))")
+        .eq("id", document_id)
+        .maybe_single()
+        .execute()
+    )
+    if not result or not result.data:
+        return None
+
+    session = result.data.get("sessions") or {}
+    # PostgREST embeds the one-to-one persona as an object or a one-element list depending on version
+    persona = session.get("user_personas")
+    if isinstance(persona, list):
+        persona = persona[0] if persona else None
+    return {
+        "session_id": result.data["session_id"],
+        "persona": persona,
+        "patterns": session.get("writing_patterns") or [],
+        "vocabulary": [row["word"] for row in session.get("vocabulary_bank") or []],
+    }
+
+
+def _analysis_result_params(
     document_id: str,
     session_id: str,
     annotations: list[dict],
@@ -40,137 +120,97 @@ async def save_analysis_result(
     raw_response: dict,
     model_used: str,
     tokens_used: int,
-):
-    """Save analysis results to database."""
-    supabase = get_supabase()
-
-    # Save annotations
-    if annotations:
-        annotation_records = [
+) -> dict:
+    """Arguments of the save_analysis_result Postgres function."""
+    return {
+        "p_document_id": document_id,
+        "p_session_id": session_id,
+        "p_annotations": [
             {
-                "document_id": document_id,
                 "start_offset": a["start_offset"],
                 "end_offset": a["end_offset"],
                 "category": a["category"],
                 "severity": a["severity"],
                 "message": a["message"],
                 "suggestion": a.get("suggestion"),
+                "pattern_type": a.get("pattern_type"),
             }
             for a in annotations
-        ]
-        supabase.table("feedback_annotations").insert(annotation_records).execute()
-
-    # Save/update patterns
-    for pattern in patterns:
-        existing = (
-            supabase.table("writing_patterns")
-            .select("*")
-            .eq("session_id", session_id)
-            .eq("pattern_type", pattern["pattern_type"])
-            .execute()
-        )
-
-        if existing.data:
-            supabase.table("writing_patterns").update(
-                {
-                    "occurrence_count": existing.data[0]["occurrence_count"] + 1,
-                    "last_occurrence_at": "now()",
-                }
-            ).eq("id", existing.data[0]["id"]).execute()
-        else:
-            supabase.table("writing_patterns").insert(
-                {
-                    "session_id": session_id,
-                    "pattern_type": pattern["pattern_type"],
-                    "description": pattern["description"],
-                }
-            ).execute()
-
-    # Save progress metrics
-    # Note: "voice" from API response maps to "vocabulary_score" in database
-    supabase.table("progress_metrics").insert(
-        {
-            "session_id": session_id,
-            "document_id": document_id,
-            "grammar_score": scores["grammar"],
-            "clarity_score": scores["clarity"],
-            "vocabulary_score": scores["voice"],
-            "overall_score": scores["overall"],
-        }
-    ).execute()
+        ],
+        "p_scores": scores,
+        "p_patterns": [{"pattern_type": p["pattern_type"], "description": p["description"]} for p in patterns],
+        "p_raw_response": raw_response,
+        "p_model_used": model_used,
+        "p_tokens_used": tokens_used,
+    }
+
+
+@timed("db.save_analysis_result")
+async def save_analysis_result(
+    document_id: str,
+    session_id: str,
+    annotations: list[dict],
+    scores: dict,
+    patterns: list[dict],
+    raw_response: dict,
+    model_used: str,
+    tokens_used: int,
+):
+    """Save analysis results to database.
 
-    # Save analysis history
-    supabase.table("analysis_history").insert(
-        {
-            "document_id": document_id,
-            "raw_response": raw_response,
-            "model_used": model_used,
-            "tokens_used": tokens_used,
-        }
+    Everything is written by the save_analysis_result Postgres function
+    in one round trip and one transaction: annotations, pattern upserts,
+    progress metrics, analysis history and the document status.
+    """
+    supabase = get_supabase()
+    await supabase.rpc(
+        "save_analysis_result",
+        _analysis_result_params(
+            document_id, session_id, annotations, scores, patterns, raw_response, model_used, tokens_used
+        ),
     ).execute()
 
-    # Update document status
-    supabase.table("documents").update({"status": "analyzed"}).eq("id", document_id).execute()
+
+@timed("db.save_analysis_results")
+async def save_analysis_results(results: list[dict]):
+    """Save several analysis results, each as save_analysis_result takes it, in one round trip and one transaction."""
+    supabase = get_supabase()
+    await supabase.rpc(
+        "save_analysis_results", {"p_results": [_analysis_result_params(**result) for result in results]}
+    ).execute()
 
 
-async def get_progress_metrics(session_id: str) -> list[dict]:
-    """Get progress metrics for a session."""
+@timed("db.get_documents")
+async def get_documents(document_ids: list[str]) -> list[dict]:
+    """Get the ID, session and content of the given documents; unknown IDs are left out."""
     supabase = get_supabase()
-    result = (
-        supabase.table("progress_metrics")
-        .select("*")
-        .eq("session_id", session_id)
-        .order("created_at", desc=False)
-        .execute()
-    )
+    result = await supabase.table("documents").select("id, session_id, content").in_("id", document_ids).execute()
     return result.data
 
 
-async def check_mastered_patterns(session_id: str) -> list[dict]:
-    """Check and update mastered patterns.
+@timed("db.get_progress_comparison")
+async def get_progress_comparison(session_id: str) -> dict | None:
+    """Get average scores for the first and second half of a session's progress metrics.
 
-    A pattern is mastered when:
-    - It occurred 3+ times historically
-    - It hasn't appeared in the last 5 documents
+    Computed in the database from maintained running totals, so the cost
+    does not grow with the session's history. Returns None when the
+    session has fewer than two metrics.
     """
     supabase = get_supabase()
+    result = await supabase.rpc("compare_progress", {"p_session_id": session_id}).execute()
+    return result.data[0] if result.data else None
 
-    # Get all patterns for session
-    patterns = (
-        supabase.table("writing_patterns")
-        .select("*")
-        .eq("session_id", session_id)
-        .eq("is_mastered", False)
-        .gte("occurrence_count", 3)
-        .execute()
-    )
 
-    # Get last 5 documents
-    recent_docs = (
-        supabase.table("documents")
-        .select("id")
-        .eq("session_id", session_id)
-        .order("created_at", desc=True)
-        .limit(5)
-        .execute()
-    )
+@timed("db.mark_mastered_patterns")
+async def mark_mastered_patterns(session_ids: list[str]) -> list[dict]:
+    """Mark patterns mastered across a batch of sessions in one statement.
+
+    A pattern is mastered when:
+    - It occurred 3+ times historically
+    - No annotation linked to it appears in the session's last 5 documents
 
-    recent_doc_ids = [d["id"] for d in recent_docs.data]
-
-    mastered = []
-    for pattern in patterns.data:
-        # Check if pattern appears in recent documents' annotations
-        recent_annotations = (
-            supabase.table("feedback_annotations")
-            .select("id")
-            .in_("document_id", recent_doc_ids)
-            .ilike("message", f"%{pattern['description'][:50]}%")
-            .execute()
-        )
-
-        if not recent_annotations.data:
-            # Mark as mastered
-            supabase.table("writing_patterns").update({"is_mastered": True}).eq("id", pattern["id"]).execute()
-            mastered.append(pattern)
-
-    return mastered
+    Returns ``{"session_id", "pattern_type"}`` rows for the newly mastered patterns.
+    """
+    supabase = get_supabase()
+    result = await supabase.rpc("mark_mastered_patterns", {"p_session_ids": session_ids}).execute()
+    return result.data or []
@@ -0,0 +1,123 @@
+import logging
+
+from app.config import get_settings
+from app.models import VocabSuggestion
+from app.services.cache import TTLCache
+from app.services.supabase import get_word_definitions, save_word_definitions
+
+logger = logging.getLogger(__name__)
+
+# Spellings models use for the same part of speech
+PART_OF_SPEECH_ALIASES = {
+    "n": "noun",
+    "v": "verb",
+    "adj": "adjective",
+    "adv": "adverb",
+    "prep": "preposition",
+    "conj": "conjunction",
+    "pron": "pronoun",
+}
+
+
+def normalize_part_of_speech(part_of_speech: str | None) -> str:
+    value = (part_of_speech or "").strip().lower().rstrip(".")
+    return PART_OF_SPEECH_ALIASES.get(value, value)
+
+
+def word_key(suggestion: VocabSuggestion) -> tuple[str, str]:
+    """The (lemma, part of speech) a suggestion's definition is stored under."""
+    lemma = (suggestion.lemma or suggestion.word).strip().lower()
+    return lemma, normalize_part_of_speech(suggestion.part_of_speech)
+
+
+def drop_known_words(suggestions: list[VocabSuggestion], known_words: frozenset[str]) -> list[VocabSuggestion]:
+    """Leave out suggestions whose word or lemma is already in the session's vocabulary bank."""
+    if not known_words:
+        return suggestions
+    return [
+        s for s in suggestions
+        if s.word.strip().lower() not in known_words and (s.lemma or "").strip().lower() not in known_words
+    ]
+
+
+class WordDefinitionStore:
+    """Definitions shared by every session, keyed by lemma and part of speech.
+
+    An in-process LRU sits in front of the word_definitions table. The
+    first definition saved for a word is kept, so a word reads the same
+    for everyone. Failures to read or write the table are logged and
+    treated as unknown words, since the model can always define them.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.local = TTLCache(max_entries, ttl_seconds)
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    async def get_many(self, keys: list[tuple[str, str]]) -> dict[tuple[str, str], dict]:
+        """Known definitions (``definition`` and ``example_sentence``) among ``keys``."""
+        found = {}
+        for key in keys:
+            entry = self.local.get(_cache_key(key))
+            if entry is not None:
+                found[key] = entry
+        self.local_hits += len(found)
+
+        missing = [key for key in keys if key not in found]
+        if missing:
+            try:
+                rows = await get_word_definitions(list({lemma for lemma, _ in missing}))
+            except Exception as e:
+                logger.warning(f"[VOCABULARY] Definition lookup failed: {type(e).__name__}: {str(e)}")
+                rows = []
+            wanted = set(missing)
+            for row in rows:
+                key = (row["lemma"], row["part_of_speech"])
+                if key in wanted:
+                    entry = {"definition": row["definition"], "example_sentence": row["example_sentence"] or ""}
+                    self.local.set(_cache_key(key), entry)
+                    found[key] = entry
+                    self.shared_hits += 1
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def put_many(self, definitions: dict[tuple[str, str], dict], model: str) -> None:
+        for key, entry in definitions.items():
+            self.local.set(_cache_key(key), entry)
+        try:
+            await save_word_definitions(
+                [
+                    {"lemma": lemma, "part_of_speech": part_of_speech, "model_used": model, **entry}
+                    for (lemma, part_of_speech), entry in definitions.items()
+                ]
+            )
+        except Exception as e:
+            logger.warning(f"[VOCABULARY] Saving {len(definitions)} definitions failed: {type(e).__name__}: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "local_entries": len(self.local),
+        }
+
+
+def _cache_key(key: tuple[str, str]) -> str:
+    return f"{key[0]}\x00{key[1]}"
+
+
+# Singleton instance
+_word_definitions: WordDefinitionStore | None = None
+
+
+def get_word_definitions_store() -> WordDefinitionStore:
+    global _word_definitions
+    if _word_definitions is None:
+        settings = get_settings()
+        _word_definitions = WordDefinitionStore(
+            max_entries=settings.word_definitions_max_entries,
+            ttl_seconds=settings.word_definitions_ttl_seconds,
+        )
+    return _word_definitions
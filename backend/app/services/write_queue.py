@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+
+from app.config import get_settings
+from app.services.context import get_context_loader
+from app.services.mastery import get_mastery_job
+from app.services.supabase import save_analysis_result
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """Persist analysis results in the background.
+
+    ``enqueue`` returns as soon as the result is queued; a pool of worker
+    tasks calls ``save_analysis_result`` with exponential backoff between
+    retries. Results that still fail, or that are left in the queue when
+    shutdown times out, are appended to a JSON-lines dead-letter file so
+    they can be replayed. When the queue is full or not running, results
+    are written inline, which applies backpressure instead of dropping them.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        capacity: int,
+        max_retries: int,
+        backoff_seconds: float,
+        dead_letter_path: str,
+    ):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.dead_letter_path = Path(dead_letter_path)
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=capacity)
+        self._tasks: list[asyncio.Task] = []
+        self._accepting = False
+        self.persisted = 0
+        self.retries = 0
+        self.dead_lettered = 0
+        self.inline_writes = 0
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._accepting = True
+        logger.info(f"[WRITE_QUEUE] Started {self.workers} workers")
+
+    async def enqueue(self, **result) -> None:
+        """Queue one save_analysis_result call, or run it inline if the queue cannot take it."""
+        if self._accepting:
+            try:
+                self._queue.put_nowait(result)
+                return
+            except asyncio.QueueFull:
+                logger.warning("[WRITE_QUEUE] Queue full, saving inline")
+        self.inline_writes += 1
+        await self._save(result)
+
+    async def drain(self, timeout: float) -> None:
+        """Stop accepting work and wait up to ``timeout`` seconds for queued writes to finish."""
+        self._accepting = False
+        logger.info(f"[WRITE_QUEUE] Draining {self._queue.qsize()} pending writes")
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"[WRITE_QUEUE] Drain timed out with {self._queue.qsize()} writes pending")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self._queue.empty():
+            await self._dead_letter(self._queue.get_nowait(), "not persisted before shutdown")
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            result = await self._queue.get()
+            try:
+                await self._persist(result)
+            except asyncio.CancelledError:
+                await self._dead_letter(result, "cancelled during shutdown")
+                raise
+            finally:
+                self._queue.task_done()
+
+    async def _persist(self, result: dict) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._save(result)
+                self.persisted += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"[WRITE_QUEUE] Giving up on document {result['document_id']}: {type(e).__name__}: {str(e)}")
+                    await self._dead_letter(result, f"{type(e).__name__}: {str(e)}")
+                    return
+                delay = self.backoff_seconds * 2 ** attempt
+                logger.warning(
+                    f"[WRITE_QUEUE] Save failed for document {result['document_id']} "
+                    f"(attempt {attempt + 1}), retrying in {delay:.1f}s: {type(e).__name__}: {str(e)}"
+                )
+                self.retries += 1
+                await asyncio.sleep(delay)
+
+    async def _save(self, result: dict) -> None:
+        await save_analysis_result(**result)
+        # Saving upserts the session's patterns, so its cached context is stale
+        get_context_loader().invalidate(result["session_id"])
+        get_mastery_job().mark(result["session_id"])
+
+    async def _dead_letter(self, result: dict, error: str) -> None:
+        self.dead_lettered += 1
+        line = json.dumps({"failed_at": time.time(), "error": error, "result": result}) + "\n"
+        await asyncio.to_thread(self._append_dead_letter, line)
+
+    def _append_dead_letter(self, line: str) -> None:
+        with self.dead_letter_path.open("a", encoding="utf-8") as f:
+            f.write(line)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._queue.qsize(),
+            "persisted": self.persisted,
+            "retries": self.retries,
+            "dead_lettered": self.dead_lettered,
+            "inline_writes": self.inline_writes,
+        }
+
+
+# Singleton instance
+_write_queue: WriteBehindQueue | None = None
+
+
+def get_write_queue() -> WriteBehindQueue:
+    global _write_queue
+    if _write_queue is None:
+        settings = get_settings()
+        _write_queue = WriteBehindQueue(
+            workers=settings.write_behind_workers,
+            capacity=settings.write_behind_capacity,
+            max_retries=settings.write_behind_max_retries,
+            backoff_seconds=settings.write_behind_backoff_seconds,
+            dead_letter_path=settings.write_behind_dead_letter_path,
+        )
+    return _write_queue
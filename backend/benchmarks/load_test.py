@@ -0,0 +1,280 @@
+"""End-to-end load test of the API against stubbed LLM and database backends.
+
+The real FastAPI app runs under uvicorn in a child process, wired to the
+stub PostgREST server (``benchmarks.stub_postgrest``) and to the replay
+LLM backend serving ``benchmarks/recordings.jsonl`` with a configurable
+latency. Each scenario drives one endpoint at a fixed concurrency and
+reports throughput, p50/p95/p99 latency and the event-loop lag measured
+inside the server process while the scenario ran.
+
+Usage (from backend/):
+    python -m benchmarks.load_test run --requests 500 --concurrency 50 --output benchmarks/baselines/local.json
+    python -m benchmarks.load_test run --compare benchmarks/baselines/local.json --max-regression 10
+    python -m benchmarks.load_test compare BASELINE.json CURRENT.json --max-regression 10
+
+``compare`` (and ``run --compare``) exits with status 1 when any scenario's
+p50 or p95 latency grew, or its throughput fell, by more than
+``--max-regression`` percent.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.stub_postgrest import DOCUMENT_ID, SESSION_ID, StubPostgrest
+
+# Any syntactically valid JWT; the stub does not check it
+STUB_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.c3R1Yg"
+RECORDINGS_PATH = Path(__file__).resolve().parent / "recordings.jsonl"
+LAG_PROBE_INTERVAL = 0.01
+
+TEXT = (
+    "The meeting was held by the team on Tuesday. Everyone discussed a number of different options "
+    "before deciding. The plan they chose balances cost against speed, and it gives each group a "
+    "clear owner for the work that follows."
+)
+
+# name -> (path, request body for the i-th request); content varies so caches and coalescing do not hide work
+SCENARIOS = {
+    "analyze": ("/api/v1/analyze", lambda i: {"document_id": DOCUMENT_ID, "content": f"{TEXT} Draft {i}."}),
+    "quick": ("/api/v1/analyze/quick", lambda i: {"content": f"{TEXT} Draft {i}."}),
+    "vocabulary": ("/api/v1/vocabulary/extract", lambda i: {"content": f"{TEXT} Draft {i}."}),
+    "compare_progress": ("/api/v1/compare-progress", lambda i: {"session_id": SESSION_ID}),
+}
+# Compared by ``compare``: metric -> whether a higher value is worse
+COMPARED_METRICS = {"p50_ms": True, "p95_ms": True, "throughput_rps": False}
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _serve_app(port: int, env: dict) -> None:
+    """Run the API in this (child) process, with a route reporting event-loop lag."""
+    os.environ.update(env)
+    import uvicorn
+
+    from app.main import app
+
+    lags: list[float] = []
+    probe: dict = {}
+
+    async def measure_lag():
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            lags.append(max(0.0, loop.time() - started - LAG_PROBE_INTERVAL))
+
+    async def lag_report(reset: bool = False):
+        """Lag percentiles since the last reset; the probe starts on the first call."""
+        if "task" not in probe:
+            probe["task"] = asyncio.create_task(measure_lag())
+        values = sorted(lags)
+        if reset:
+            lags.clear()
+        return {
+            "samples": len(values),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": (values[-1] if values else 0.0) * 1000,
+        }
+
+    app.add_api_route("/__bench/lag", lag_report, methods=["GET"])
+    uvicorn.run(app, port=port, log_level="warning")
+
+
+class ApiServer:
+    """Run the API on a free localhost port in a child process."""
+
+    def __init__(self, env: dict):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._process = multiprocessing.Process(target=_serve_app, args=(self.port, env), daemon=True)
+
+    def __enter__(self) -> "ApiServer":
+        self._process.start()
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                httpx.get(f"{self.url}/health", timeout=0.5).raise_for_status()
+                return self
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        self._process.terminate()
+        raise RuntimeError(f"API server did not start on port {self.port}")
+
+    def __exit__(self, *exc) -> None:
+        self._process.terminate()
+        self._process.join()
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, requests: int, concurrency: int, warmup: int) -> dict:
+    path, body = SCENARIOS[name]
+    for i in range(warmup):
+        await client.post(path, json=body(-i - 1))
+
+    await client.get("/__bench/lag", params={"reset": True})
+    latencies: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=body(i))
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    lag = (await client.get("/__bench/lag", params={"reset": True})).json()
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "loop_lag_p99_ms": round(lag["p99_ms"], 2),
+        "loop_lag_max_ms": round(lag["max_ms"], 2),
+    }
+
+
+async def run_all(url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        # Starts the lag probe
+        await client.get("/__bench/lag")
+        results = {}
+        for name in args.scenarios:
+            results[name] = await run_scenario(client, name, args.requests, args.concurrency, args.warmup)
+            print(
+                f"{name:<17} {results[name]['throughput_rps']:>8.1f} req/s  "
+                f"p50 {results[name]['p50_ms']:>8.1f} ms  p95 {results[name]['p95_ms']:>8.1f} ms  "
+                f"p99 {results[name]['p99_ms']:>8.1f} ms  lag p99 {results[name]['loop_lag_p99_ms']:>6.1f} ms  "
+                f"errors {results[name]['errors']}"
+            )
+        return results
+
+
+def run(args) -> int:
+    with StubPostgrest(latency_seconds=args.db_latency_ms / 1000) as stub:
+        env = {
+            "OPENAI_API_KEY": "replay",
+            "SUPABASE_URL": stub.url,
+            "SUPABASE_SERVICE_KEY": STUB_KEY,
+            "LLM_BACKEND": "replay",
+            "LLM_REPLAY_PATH": str(RECORDINGS_PATH),
+            "LLM_REPLAY_LATENCY": args.llm_latency,
+            "LLM_RECORD_PATH": "",
+            # Keep the scheduler's provider limits out of the measurement
+            "LLM_MAX_CONCURRENCY": "100000",
+            "LLM_REQUESTS_PER_MINUTE": "1000000000",
+            "LLM_TOKENS_PER_MINUTE": "1000000000000",
+            "ANALYSIS_CACHE_ENABLED": str(args.cache).lower(),
+            "SIMILARITY_CACHE_ENABLED": str(args.cache).lower(),
+        }
+        with ApiServer(env) as server:
+            results = asyncio.run(run_all(server.url, args))
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "llm_latency": args.llm_latency,
+            "db_latency_ms": args.db_latency_ms,
+            "cache": args.cache,
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Results written to {args.output}")
+    if args.compare:
+        return compare_reports(json.loads(Path(args.compare).read_text()), report, args.max_regression)
+    return 0
+
+
+def compare_reports(baseline: dict, current: dict, max_regression: float) -> int:
+    """Print a comparison and return 1 when any scenario regressed by more than ``max_regression`` percent."""
+    regressed = False
+    for name, base in baseline["results"].items():
+        now = current["results"].get(name)
+        if now is None:
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS.items():
+            if not base[metric]:
+                continue
+            change = (now[metric] - base[metric]) / base[metric] * 100
+            worse = change > max_regression if higher_is_worse else -change > max_regression
+            regressed |= worse
+            print(
+                f"{name:<17} {metric:<15} {base[metric]:>10.2f} -> {now[metric]:>10.2f}  "
+                f"({change:+6.1f}%){'  REGRESSION' if worse else ''}"
+            )
+    print("FAIL" if regressed else "OK", f"(threshold {max_regression:.0f}%)")
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the load test")
+    run_parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    run_parser.add_argument("--requests", type=int, default=300)
+    run_parser.add_argument("--concurrency", type=int, default=50)
+    run_parser.add_argument("--warmup", type=int, default=10)
+    run_parser.add_argument("--llm-latency", default="fixed:20", help="replay latency distribution, e.g. lognormal:800,0.4")
+    run_parser.add_argument("--db-latency-ms", type=float, default=5)
+    run_parser.add_argument("--cache", action="store_true", help="leave the analysis result and near-duplicate caches enabled")
+    run_parser.add_argument("--output", help="write results to this JSON file")
+    run_parser.add_argument("--compare", help="baseline JSON to compare against")
+    run_parser.add_argument("--max-regression", type=float, default=10)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--max-regression", type=float, default=10)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(run(args))
+    sys.exit(
+        compare_reports(
+            json.loads(Path(args.baseline).read_text()), json.loads(Path(args.current).read_text()), args.max_regression
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Micro-benchmark of decoding analysis responses and dumping them for persistence.
+
+Compares, on synthetic analyses of growing size:
+
+- ``dict``: ``json.loads`` followed by building each model from a dict (the
+  previous path), against ``validate_json`` (pydantic's own JSON parser)
+  and ``parse_output``, an orjson decode plus one validation pass
+- ``repair``: ``parse_output`` on the same output with trailing commas and a
+  truncated ending, which takes the repair path
+- ``dump x3``: dumping annotations, scores and patterns separately and then
+  again for the raw response, against ``dump x1``, one ``model_dump()``
+
+Usage (from backend/):
+    python -m benchmarks.parse_outputs
+    python -m benchmarks.parse_outputs --annotations 10 100 1000 --repeat 50
+"""
+
+import argparse
+import json
+import timeit
+
+from app.models import AnalysisResponse, Annotation, Pattern, Scores, VocabSuggestion
+from app.services.structured import ModelAnalysis, parse_output
+
+
+def make_response(annotations: int) -> str:
+    return json.dumps(
+        {
+            "annotations": [
+                {
+                    "start_offset": i * 40,
+                    "end_offset": i * 40 + 25,
+                    "category": "clarity",
+                    "severity": "warning",
+                    "message": f"Sentence {i} buries its main point behind a long introductory clause.",
+                    "original_text": f"In light of the fact that item {i}",
+                    "suggestion": "Lead with the main point.",
+                    "rewritten_version": f"Because item {i}",
+                    "principle": "Put the main idea first",
+                    "pattern_type": "long_introductions",
+                }
+                for i in range(annotations)
+            ],
+            "scores": {"grammar": 82, "clarity": 68, "voice": 74, "overall": 75},
+            "patterns": [{"pattern_type": f"pattern_{i}", "description": "Description"} for i in range(annotations // 10 + 1)],
+            "vocabulary_suggestions": [
+                {"word": f"word{i}", "part_of_speech": "adjective", "replaces": "good"} for i in range(5)
+            ],
+            "summary": "Clear structure overall; lead with the main point more often.",
+        },
+        indent=2,
+    )
+
+
+def damage(raw: str) -> str:
+    """The same output with trailing commas and the last few characters cut off."""
+    return raw.replace("}\n  ]", "},\n  ]")[:-40]
+
+
+def parse_dicts(raw: str) -> AnalysisResponse:
+    result = json.loads(raw)
+    return AnalysisResponse(
+        annotations=[Annotation(**a) for a in result.get("annotations", [])],
+        scores=Scores(**result["scores"]),
+        patterns=[Pattern(**p) for p in result.get("patterns", [])],
+        vocabulary_suggestions=[VocabSuggestion(**v) for v in result.get("vocabulary_suggestions", [])],
+        summary=result.get("summary", ""),
+    )
+
+
+def dump_three_times(analysis: AnalysisResponse) -> dict:
+    return {
+        "annotations": [a.model_dump() for a in analysis.annotations],
+        "scores": analysis.scores.model_dump(),
+        "patterns": [p.model_dump() for p in analysis.patterns],
+        "raw_response": {
+            "annotations": [a.model_dump() for a in analysis.annotations],
+            "scores": analysis.scores.model_dump(),
+            "patterns": [p.model_dump() for p in analysis.patterns],
+            "vocabulary_suggestions": [v.model_dump() for v in analysis.vocabulary_suggestions],
+            "summary": analysis.summary,
+        },
+    }
+
+
+def per_call_us(fn, repeat: int) -> float:
+    return min(timeit.repeat(fn, number=repeat, repeat=5)) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--annotations", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    columns = ("dict", "validate_json", "parse_output", "repair", "dump x3", "dump x1")
+    print(f"{'annotations':>11} {'KB':>6} " + " ".join(f"{c:>13}" for c in columns) + "  (us per call)")
+    for count in args.annotations:
+        raw = make_response(count)
+        damaged = damage(raw)
+        analysis = parse_output(ModelAnalysis, raw).to_response()
+        assert parse_dicts(raw) == analysis
+        timings = [
+            per_call_us(lambda: parse_dicts(raw), args.repeat),
+            per_call_us(lambda: ModelAnalysis.model_validate_json(raw).to_response(), args.repeat),
+            per_call_us(lambda: parse_output(ModelAnalysis, raw).to_response(), args.repeat),
+            per_call_us(lambda: parse_output(ModelAnalysis, damaged).to_response(), args.repeat),
+            per_call_us(lambda: dump_three_times(analysis), args.repeat),
+            per_call_us(lambda: analysis.model_dump(), args.repeat),
+        ]
+        print(f"{count:>11} {len(raw) / 1024:>6.0f} " + " ".join(f"{t:>13.0f}" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
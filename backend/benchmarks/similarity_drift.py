@@ -0,0 +1,207 @@
+"""Measure the near-duplicate cache's hit rate and how far reused answers drift from fresh ones.
+
+Each document of a corpus is analyzed, then edited at several rates
+(typo-like character edits per 1000 characters) and each edited copy is
+analyzed afresh. For every edited copy the report gives the MinHash
+similarity to the original, whether the similarity cache would have
+answered it at ``--threshold``, and how the reused answer (the original's
+analysis with its annotations re-aligned) compares to the fresh one:
+
+- ``score_drift``: mean absolute difference of the four scores
+- ``annotation_f1``: share of annotations both answers place on overlapping
+  spans with the same category
+- ``pattern_jaccard``: overlap of the reported pattern types
+
+``--noise`` analyzes each original twice, giving the drift between two
+fresh answers to the same text, the floor any cache is measured against.
+
+The corpus is JSON lines with ``content`` and optional ``persona`` and
+``historical_patterns``. Record one run against the real model and replay
+it to compare thresholds without further LLM calls (edits are seeded, so
+a replay sends the same prompts):
+
+Usage (from backend/):
+    LLM_RECORD_PATH=benchmarks/drift_recordings.jsonl python -m benchmarks.similarity_drift --corpus corpus.jsonl
+    LLM_BACKEND=replay LLM_REPLAY_PATH=benchmarks/drift_recordings.jsonl LLM_REPLAY_LATENCY=fixed:0 \\
+        python -m benchmarks.similarity_drift --corpus corpus.jsonl --threshold 0.85
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import string
+from pathlib import Path
+
+from app.config import get_settings
+from app.models import AnalysisResponse
+from app.services.llm import get_llm_service
+from app.services.similarity import MinHasher, reuse_analysis
+
+SCORE_FIELDS = ("grammar", "clarity", "voice", "overall")
+
+
+def perturb(text: str, edits_per_1000: float, rng: random.Random) -> str:
+    """Apply typo-like edits (substitute, delete, insert or swap a letter) at random letters."""
+    chars = list(text)
+    for _ in range(max(1, round(len(text) * edits_per_1000 / 1000))):
+        letters = [i for i, c in enumerate(chars) if c.isalpha()]
+        if not letters:
+            break
+        i = rng.choice(letters)
+        kind = rng.choice(("substitute", "delete", "insert", "swap"))
+        if kind == "substitute":
+            chars[i] = rng.choice(string.ascii_lowercase)
+        elif kind == "delete":
+            del chars[i]
+        elif kind == "insert":
+            chars.insert(i, rng.choice(string.ascii_lowercase))
+        elif i + 1 < len(chars):
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return "".join(chars)
+
+
+def score_drift(a: AnalysisResponse, b: AnalysisResponse) -> float:
+    return sum(abs(getattr(a.scores, f) - getattr(b.scores, f)) for f in SCORE_FIELDS) / len(SCORE_FIELDS)
+
+
+def annotation_f1(a: AnalysisResponse, b: AnalysisResponse) -> float:
+    if not a.annotations and not b.annotations:
+        return 1.0
+    unmatched = list(b.annotations)
+    matched = 0
+    for x in a.annotations:
+        for y in unmatched:
+            if x.category == y.category and x.start_offset < y.end_offset and y.start_offset < x.end_offset:
+                unmatched.remove(y)
+                matched += 1
+                break
+    return 2 * matched / (len(a.annotations) + len(b.annotations))
+
+
+def pattern_jaccard(a: AnalysisResponse, b: AnalysisResponse) -> float:
+    x = {p.pattern_type for p in a.patterns}
+    y = {p.pattern_type for p in b.patterns}
+    return len(x & y) / len(x | y) if x | y else 1.0
+
+
+def compare(reused: AnalysisResponse, fresh: AnalysisResponse) -> dict:
+    return {
+        "score_drift": score_drift(reused, fresh),
+        "annotation_f1": annotation_f1(reused, fresh),
+        "pattern_jaccard": pattern_jaccard(reused, fresh),
+    }
+
+
+def mean(values: list[float]) -> float | None:
+    return sum(values) / len(values) if values else None
+
+
+def summarize(rows: list[dict]) -> dict:
+    hits = [r for r in rows if r["hit"]]
+    return {
+        "pairs": len(rows),
+        "mean_similarity": mean([r["similarity"] for r in rows]),
+        "hit_rate": len(hits) / len(rows) if rows else 0.0,
+        # Drift of the answers the cache would actually have served, and of all reuses for reference
+        **{f"hit_{m}": mean([r[m] for r in hits]) for m in ("score_drift", "annotation_f1", "pattern_jaccard")},
+        **{f"all_{m}": mean([r[m] for r in rows]) for m in ("score_drift", "annotation_f1", "pattern_jaccard")},
+    }
+
+
+async def run(args) -> dict:
+    documents = [json.loads(line) for line in Path(args.corpus).read_text().splitlines() if line.strip()]
+    rates = [float(r) for r in args.edit_rates.split(",")]
+    llm = get_llm_service()
+    hasher = MinHasher()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def analyze(document: dict, content: str) -> AnalysisResponse:
+        async with semaphore:
+            analysis, _, _ = await llm.analyze_document(
+                content, document.get("persona"), document.get("historical_patterns")
+            )
+            return analysis
+
+    async def evaluate(index: int, document: dict) -> tuple[list[dict], dict | None]:
+        original = document["content"]
+        rng = random.Random(f"{args.seed}:{index}")
+        variants = [(rate, perturb(original, rate, rng)) for rate in rates]
+        fresh = await asyncio.gather(
+            analyze(document, original), *(analyze(document, variant) for _, variant in variants)
+        )
+        signature = hasher.signature(original)
+        rows = []
+        for (rate, variant), variant_analysis in zip(variants, fresh[1:]):
+            similarity = float((hasher.signature(variant) == signature).mean())
+            rows.append(
+                {
+                    "document": index,
+                    "edits_per_1000": rate,
+                    "similarity": similarity,
+                    "hit": similarity >= args.threshold and len(variant) >= args.min_chars,
+                    **compare(reuse_analysis(fresh[0], variant), variant_analysis),
+                }
+            )
+        noise = compare(fresh[0], await analyze(document, original)) if args.noise else None
+        return rows, noise
+
+    results = await asyncio.gather(*(evaluate(i, d) for i, d in enumerate(documents)))
+    rows = [row for document_rows, _ in results for row in document_rows]
+    noise = [n for _, n in results if n is not None]
+    return {
+        "threshold": args.threshold,
+        "documents": len(documents),
+        "by_edit_rate": {str(rate): summarize([r for r in rows if r["edits_per_1000"] == rate]) for rate in rates},
+        "overall": summarize(rows),
+        "noise_floor": {m: mean([n[m] for n in noise]) for m in ("score_drift", "annotation_f1", "pattern_jaccard")}
+        if noise
+        else None,
+        "rows": rows,
+    }
+
+
+def _fmt(value: float | None, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+def print_report(report: dict) -> None:
+    print(f"{report['documents']} documents, threshold {report['threshold']}\n")
+    print(f"{'edits/1000':>10} {'similarity':>10} {'hit rate':>8} {'score drift':>11} {'annot. F1':>9} {'patterns':>8}")
+    for rate, s in [*report["by_edit_rate"].items(), ("all", report["overall"])]:
+        print(
+            f"{rate:>10} {_fmt(s['mean_similarity'], '.3f'):>10} {s['hit_rate']:>8.1%} "
+            f"{_fmt(s['hit_score_drift'], '.2f'):>11} {_fmt(s['hit_annotation_f1'], '.3f'):>9} "
+            f"{_fmt(s['hit_pattern_jaccard'], '.3f'):>8}"
+        )
+    noise = report["noise_floor"]
+    if noise:
+        print(
+            f"{'fresh x2':>10} {'':>10} {'':>8} {noise['score_drift']:>11.2f} "
+            f"{noise['annotation_f1']:>9.3f} {noise['pattern_jaccard']:>8.3f}"
+        )
+    print("\nDrift columns cover the pairs the cache would have answered.")
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True, help="JSON lines with a content field")
+    parser.add_argument("--edit-rates", default="1,3,10,30", help="comma-separated edits per 1000 characters")
+    parser.add_argument("--threshold", type=float, default=settings.similarity_cache_threshold)
+    parser.add_argument("--min-chars", type=int, default=settings.similarity_cache_min_chars)
+    parser.add_argument("--noise", action="store_true", help="also analyze each original twice")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report, with every pair, to this JSON file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Minimal PostgREST stand-in for benchmarks.
+
+Serves canned rows for the tables the backend reads, accepts every write,
+and sleeps for a fixed latency per request to mimic a network round trip
+to Supabase. It runs in a child process, so a benchmark that blocks its
+own event loop (or holds the GIL) cannot slow the stub down.
+"""
+
+import asyncio
+import multiprocessing
+import socket
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+SESSION_ID = "00000000-0000-0000-0000-000000000001"
+DOCUMENT_ID = "00000000-0000-0000-0000-000000000002"
+
+PERSONA = {
+    "session_id": SESSION_ID,
+    "goals": ["blog_posts"],
+    "experience_level": "intermediate",
+    "focus_areas": ["clarity"],
+    "preferred_tone": "balanced",
+}
+PATTERN = {
+    "id": "00000000-0000-0000-0000-000000000003",
+    "session_id": SESSION_ID,
+    "pattern_type": "passive_voice",
+    "description": "Relies on passive constructions",
+    "occurrence_count": 4,
+    "last_occurrence_at": "2024-10-01T12:00:00+00:00",
+    "is_mastered": False,
+}
+
+TABLE_ROWS = {
+    "documents": [
+        {
+            "id": DOCUMENT_ID,
+            "session_id": SESSION_ID,
+            "content": "Stub document.",
+            # Embedded resources, for selects like "session_id, sessions(user_personas(*), writing_patterns(...))"
+            "sessions": {"user_personas": [PERSONA], "writing_patterns": [PATTERN], "vocabulary_bank": []},
+        }
+    ],
+    "user_personas": [PERSONA],
+    "writing_patterns": [PATTERN],
+    "progress_metrics": [
+        {
+            "session_id": SESSION_ID,
+            "document_id": DOCUMENT_ID,
+            "grammar_score": 70 + i,
+            "clarity_score": 65 + i,
+            "vocabulary_score": 60 + i,
+            "overall_score": 68 + i,
+        }
+        for i in range(10)
+    ],
+}
+RPC_ROWS = {
+    # Halves of the ten progress_metrics rows above
+    "compare_progress": [
+        {
+            "metric_count": 10,
+            "first_grammar": 72,
+            "first_clarity": 67,
+            "first_vocabulary": 62,
+            "first_overall": 70,
+            "second_grammar": 77,
+            "second_clarity": 72,
+            "second_vocabulary": 67,
+            "second_overall": 75,
+        }
+    ],
+}
+
+
+def build_app(latency_seconds: float) -> Starlette:
+    async def table(request: Request):
+        await asyncio.sleep(latency_seconds)
+        name = request.path_params["name"]
+        if request.method != "GET":
+            return JSONResponse([], status_code=201)
+        rows = TABLE_ROWS.get(name, [])
+        if "vnd.pgrst.object" in request.headers.get("accept", ""):
+            return JSONResponse(rows[0] if rows else {})
+        return JSONResponse(rows)
+
+    async def rpc(request: Request):
+        await asyncio.sleep(latency_seconds)
+        return JSONResponse(RPC_ROWS.get(request.path_params["name"], []))
+
+    return Starlette(
+        routes=[
+            Route("/rest/v1/rpc/{name}", rpc, methods=["GET", "POST"]),
+            Route("/rest/v1/{name}", table, methods=["GET", "POST", "PATCH", "DELETE"]),
+        ]
+    )
+
+
+def _serve(latency_seconds: float, port: int) -> None:
+    uvicorn.run(build_app(latency_seconds), port=port, log_level="warning", lifespan="off")
+
+
+class StubPostgrest:
+    """Run the stub server on a free localhost port in a child process."""
+
+    def __init__(self, latency_seconds: float = 0.02):
+        self.latency_seconds = latency_seconds
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._process = multiprocessing.Process(target=_serve, args=(latency_seconds, self.port), daemon=True)
+
+    def __enter__(self) -> "StubPostgrest":
+        self._process.start()
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.1).close()
+                return self
+            except OSError:
+                time.sleep(0.05)
+        self._process.terminate()
+        raise RuntimeError(f"Stub PostgREST did not start on port {self.port}")
+
+    def __exit__(self, *exc) -> None:
+        self._process.terminate()
+        self._process.join()
@@ -0,0 +1,75 @@
+"""Compare request throughput of the blocking and async Supabase clients.
+
+Each simulated request performs the two reads the analyze endpoint needs
+before calling the LLM (persona and historical patterns) against a stub
+PostgREST server with a fixed per-query latency. "blocking" reproduces
+the old data layer (sync client called from ``async def``); "async" uses
+the shared AsyncClient from ``app.services.supabase``.
+
+Usage (from backend/):
+    python -m benchmarks.supabase_concurrency --requests 200 --concurrency 50 --latency-ms 20
+"""
+
+import argparse
+import asyncio
+import time
+
+from supabase import AsyncClient, create_client
+
+from benchmarks.stub_postgrest import SESSION_ID, StubPostgrest
+
+# Any syntactically valid JWT; the stub does not check it
+STUB_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.c3R1Yg"
+
+
+async def run_blocking(url: str, total: int, concurrency: int) -> float:
+    client = create_client(url, STUB_KEY)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request():
+        async with semaphore:
+            client.table("user_personas").select("*").eq("session_id", SESSION_ID).single().execute()
+            client.table("writing_patterns").select("description").eq("session_id", SESSION_ID).execute()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request() for _ in range(total)))
+    return time.perf_counter() - start
+
+
+async def run_async(url: str, total: int, concurrency: int) -> float:
+    client = AsyncClient(url, STUB_KEY)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request():
+        async with semaphore:
+            await client.table("user_personas").select("*").eq("session_id", SESSION_ID).single().execute()
+            await client.table("writing_patterns").select("description").eq("session_id", SESSION_ID).execute()
+
+    # Warm the connection pool so both runs measure steady state
+    await request()
+    start = time.perf_counter()
+    await asyncio.gather(*(request() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    await client.postgrest.aclose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    with StubPostgrest(latency_seconds=args.latency_ms / 1000) as stub:
+        blocking = asyncio.run(run_blocking(stub.url, args.requests, args.concurrency))
+        non_blocking = asyncio.run(run_async(stub.url, args.requests, args.concurrency))
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {args.latency_ms:.0f} ms per query")
+    print(f"blocking client: {args.requests / blocking:8.1f} req/s ({blocking:.2f}s)")
+    print(f"async client:    {args.requests / non_blocking:8.1f} req/s ({non_blocking:.2f}s)")
+    print(f"speedup:         {blocking / non_blocking:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -169,6 +169,7 @@ export interface AnalysisRequest {
     preferred_tone: string
   }
   historical_patterns?: string[]
+  incremental?: boolean
 }
 
 export interface Annotation {
@@ -177,9 +178,11 @@ export interface Annotation {
   category: string
   severity: 'info' | 'warning' | 'error'
   message: string
+  original_text: string | null
   suggestion: string | null
   rewritten_version: string | null
   principle: string | null
+  pattern_type: string | null
 }
 
 export interface AnalysisResponse {
@@ -196,6 +199,7 @@ export interface AnalysisResponse {
   }[]
   vocabulary_suggestions: {
     word: string
+    lemma: string | null
     definition: string
     part_of_speech: string
     example_sentence: string
@@ -210,6 +214,7 @@ export interface QuickCheckResponse {
     message: string
     severity: 'info' | 'warning' | 'error'
   }[]
+  source: 'local' | 'cache' | 'llm'
 }
 
 export async function analyzeDocument(request: AnalysisRequest): Promise<AnalysisResponse> {
@@ -232,13 +237,16 @@ export async function quickCheck(content: string): Promise<QuickCheckResponse> {
   })
 }
 
-export async function extractVocabulary(content: string): Promise<AnalysisResponse['vocabulary_suggestions']> {
+export async function extractVocabulary(
+  content: string,
+  sessionId?: string
+): Promise<AnalysisResponse['vocabulary_suggestions']> {
   return makeApiRequest<AnalysisResponse['vocabulary_suggestions']>('/api/v1/vocabulary/extract', {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
-    body: JSON.stringify({ content }),
+    body: JSON.stringify({ content, session_id: sessionId ?? null }),
   })
 }
 
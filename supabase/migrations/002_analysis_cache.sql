@@ -0,0 +1,16 @@
+-- Shared tier of the analysis result cache
+-- Enabled in the backend with ANALYSIS_CACHE_SHARED=true
+
+CREATE TABLE analysis_cache (
+    key TEXT PRIMARY KEY,
+    response JSONB NOT NULL,
+    model_used TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX idx_analysis_cache_expires_at ON analysis_cache(expires_at);
+
+ALTER TABLE analysis_cache ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow all operations on analysis_cache" ON analysis_cache FOR ALL USING (true);
@@ -0,0 +1,58 @@
+-- Persist a complete analysis in a single round trip
+-- Called by the backend as supabase.rpc("save_analysis_result", {...})
+
+CREATE OR REPLACE FUNCTION save_analysis_result(
+    p_document_id UUID,
+    p_session_id UUID,
+    p_annotations JSONB,
+    p_scores JSONB,
+    p_patterns JSONB,
+    p_raw_response JSONB,
+    p_model_used TEXT,
+    p_tokens_used INTEGER
+)
+RETURNS VOID AS $$
+BEGIN
+    -- Save annotations
+    INSERT INTO feedback_annotations (document_id, start_offset, end_offset, category, severity, message, suggestion)
+    SELECT
+        p_document_id,
+        (a->>'start_offset')::INTEGER,
+        (a->>'end_offset')::INTEGER,
+        a->>'category',
+        a->>'severity',
+        a->>'message',
+        a->>'suggestion'
+    FROM jsonb_array_elements(COALESCE(p_annotations, '[]'::JSONB)) AS a;
+
+    -- Save/update patterns; a pattern repeated within one analysis counts once
+    INSERT INTO writing_patterns (session_id, pattern_type, description)
+    SELECT DISTINCT ON (p->>'pattern_type')
+        p_session_id,
+        p->>'pattern_type',
+        p->>'description'
+    FROM jsonb_array_elements(COALESCE(p_patterns, '[]'::JSONB)) AS p
+    ON CONFLICT (session_id, pattern_type) DO UPDATE
+    SET occurrence_count = writing_patterns.occurrence_count + 1,
+        last_occurrence_at = NOW();
+
+    -- Save progress metrics
+    -- Note: "voice" from API response maps to "vocabulary_score" in database
+    INSERT INTO progress_metrics (session_id, document_id, grammar_score, clarity_score, vocabulary_score, overall_score)
+    VALUES (
+        p_session_id,
+        p_document_id,
+        (p_scores->>'grammar')::DECIMAL,
+        (p_scores->>'clarity')::DECIMAL,
+        (p_scores->>'voice')::DECIMAL,
+        (p_scores->>'overall')::DECIMAL
+    );
+
+    -- Save analysis history
+    INSERT INTO analysis_history (document_id, raw_response, model_used, tokens_used)
+    VALUES (p_document_id, p_raw_response, p_model_used, p_tokens_used);
+
+    -- Update document status
+    UPDATE documents SET status = 'analyzed' WHERE id = p_document_id;
+END;
+$$ LANGUAGE plpgsql;
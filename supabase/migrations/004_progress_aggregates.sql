@@ -0,0 +1,171 @@
+-- Maintained progress aggregates, so comparing progress costs the same for any session size
+-- Called by the backend as supabase.rpc("compare_progress", {"p_session_id": ...})
+--
+-- Each progress_metrics row records its position in the session (seq) and
+-- the session's running score totals up to and including itself, and
+-- progress_totals holds the totals for the whole session. The first half of
+-- a session's metrics is then the running totals of one row, and the second
+-- half is the session totals minus those.
+
+CREATE TABLE progress_totals (
+    session_id UUID PRIMARY KEY REFERENCES sessions(id) ON DELETE CASCADE,
+    metric_count INTEGER NOT NULL DEFAULT 0,
+    grammar_sum DECIMAL NOT NULL DEFAULT 0,
+    clarity_sum DECIMAL NOT NULL DEFAULT 0,
+    vocabulary_sum DECIMAL NOT NULL DEFAULT 0,
+    overall_sum DECIMAL NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE progress_totals ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow all operations on progress_totals" ON progress_totals FOR ALL USING (true);
+
+ALTER TABLE progress_metrics
+    ADD COLUMN seq INTEGER,
+    ADD COLUMN grammar_running DECIMAL,
+    ADD COLUMN clarity_running DECIMAL,
+    ADD COLUMN vocabulary_running DECIMAL,
+    ADD COLUMN overall_running DECIMAL;
+
+-- Backfill existing rows in the order compare-progress has always used
+WITH numbered AS (
+    SELECT
+        id,
+        ROW_NUMBER() OVER w AS seq,
+        SUM(grammar_score) OVER w AS grammar_running,
+        SUM(clarity_score) OVER w AS clarity_running,
+        SUM(vocabulary_score) OVER w AS vocabulary_running,
+        SUM(overall_score) OVER w AS overall_running
+    FROM progress_metrics
+    WINDOW w AS (PARTITION BY session_id ORDER BY created_at, id ROWS UNBOUNDED PRECEDING)
+)
+UPDATE progress_metrics m
+SET seq = n.seq,
+    grammar_running = n.grammar_running,
+    clarity_running = n.clarity_running,
+    vocabulary_running = n.vocabulary_running,
+    overall_running = n.overall_running
+FROM numbered n
+WHERE m.id = n.id;
+
+INSERT INTO progress_totals (session_id, metric_count, grammar_sum, clarity_sum, vocabulary_sum, overall_sum)
+SELECT session_id, COUNT(*), SUM(grammar_score), SUM(clarity_score), SUM(vocabulary_score), SUM(overall_score)
+FROM progress_metrics
+GROUP BY session_id;
+
+-- Checked at the end of each statement, so renumbering can shift rows past each other
+ALTER TABLE progress_metrics
+    ADD CONSTRAINT progress_metrics_session_seq_key UNIQUE (session_id, seq) DEFERRABLE INITIALLY IMMEDIATE;
+
+-- Number each new row and fold it into the session totals. The upsert locks
+-- the session's totals row, so concurrent inserts for a session are serialized.
+CREATE OR REPLACE FUNCTION progress_metrics_accumulate()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO progress_totals AS t (session_id, metric_count, grammar_sum, clarity_sum, vocabulary_sum, overall_sum)
+    VALUES (NEW.session_id, 1, NEW.grammar_score, NEW.clarity_score, NEW.vocabulary_score, NEW.overall_score)
+    ON CONFLICT (session_id) DO UPDATE
+    SET metric_count = t.metric_count + 1,
+        grammar_sum = t.grammar_sum + EXCLUDED.grammar_sum,
+        clarity_sum = t.clarity_sum + EXCLUDED.clarity_sum,
+        vocabulary_sum = t.vocabulary_sum + EXCLUDED.vocabulary_sum,
+        overall_sum = t.overall_sum + EXCLUDED.overall_sum,
+        updated_at = NOW()
+    RETURNING metric_count, grammar_sum, clarity_sum, vocabulary_sum, overall_sum
+    INTO NEW.seq, NEW.grammar_running, NEW.clarity_running, NEW.vocabulary_running, NEW.overall_running;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER progress_metrics_accumulate
+    BEFORE INSERT ON progress_metrics
+    FOR EACH ROW
+    EXECUTE FUNCTION progress_metrics_accumulate();
+
+-- Take deleted rows (their documents were deleted) back out of the aggregates.
+-- Runs once per statement, since one statement can delete several rows of a
+-- session: each surviving row moves up by the number of deleted rows before
+-- it and drops their scores from its running totals. Nothing is left to
+-- maintain when the whole session is being deleted.
+CREATE OR REPLACE FUNCTION progress_metrics_retract()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE progress_metrics m
+    SET seq = m.seq - d.metric_count,
+        grammar_running = m.grammar_running - d.grammar_sum,
+        clarity_running = m.clarity_running - d.clarity_sum,
+        vocabulary_running = m.vocabulary_running - d.vocabulary_sum,
+        overall_running = m.overall_running - d.overall_sum
+    FROM (
+        SELECT
+            kept.id,
+            COUNT(*) AS metric_count,
+            SUM(deleted.grammar_score) AS grammar_sum,
+            SUM(deleted.clarity_score) AS clarity_sum,
+            SUM(deleted.vocabulary_score) AS vocabulary_sum,
+            SUM(deleted.overall_score) AS overall_sum
+        FROM progress_metrics kept
+        JOIN deleted ON deleted.session_id = kept.session_id AND deleted.seq < kept.seq
+        GROUP BY kept.id
+    ) d
+    WHERE m.id = d.id;
+
+    UPDATE progress_totals t
+    SET metric_count = t.metric_count - d.metric_count,
+        grammar_sum = t.grammar_sum - d.grammar_sum,
+        clarity_sum = t.clarity_sum - d.clarity_sum,
+        vocabulary_sum = t.vocabulary_sum - d.vocabulary_sum,
+        overall_sum = t.overall_sum - d.overall_sum,
+        updated_at = NOW()
+    FROM (
+        SELECT
+            session_id,
+            COUNT(*) AS metric_count,
+            SUM(grammar_score) AS grammar_sum,
+            SUM(clarity_score) AS clarity_sum,
+            SUM(vocabulary_score) AS vocabulary_sum,
+            SUM(overall_score) AS overall_sum
+        FROM deleted
+        GROUP BY session_id
+    ) d
+    WHERE t.session_id = d.session_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER progress_metrics_retract
+    AFTER DELETE ON progress_metrics
+    REFERENCING OLD TABLE AS deleted
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION progress_metrics_retract();
+
+-- Average scores of the first and second half of a session's metrics, in
+-- insertion order; the first half is the smaller one when the count is odd.
+-- Returns no row for sessions with fewer than two metrics.
+CREATE OR REPLACE FUNCTION compare_progress(p_session_id UUID)
+RETURNS TABLE (
+    metric_count INTEGER,
+    first_grammar DECIMAL,
+    first_clarity DECIMAL,
+    first_vocabulary DECIMAL,
+    first_overall DECIMAL,
+    second_grammar DECIMAL,
+    second_clarity DECIMAL,
+    second_vocabulary DECIMAL,
+    second_overall DECIMAL
+) AS $$
+    SELECT
+        t.metric_count,
+        h.grammar_running / h.seq,
+        h.clarity_running / h.seq,
+        h.vocabulary_running / h.seq,
+        h.overall_running / h.seq,
+        (t.grammar_sum - h.grammar_running) / (t.metric_count - h.seq),
+        (t.clarity_sum - h.clarity_running) / (t.metric_count - h.seq),
+        (t.vocabulary_sum - h.vocabulary_running) / (t.metric_count - h.seq),
+        (t.overall_sum - h.overall_running) / (t.metric_count - h.seq)
+    FROM progress_totals t
+    JOIN progress_metrics h ON h.session_id = t.session_id AND h.seq = t.metric_count / 2
+    WHERE t.session_id = p_session_id AND t.metric_count >= 2;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,113 @@
+-- Link annotations to the writing pattern they are an instance of, and detect mastered patterns set-based
+-- Called by the backend's mastery job as supabase.rpc("mark_mastered_patterns", {"p_session_ids": [...]})
+
+ALTER TABLE feedback_annotations ADD COLUMN pattern_type TEXT;
+
+-- Link existing annotations the way mastery used to be judged: the message quotes the pattern's description
+UPDATE feedback_annotations a
+SET pattern_type = w.pattern_type
+FROM documents d
+JOIN writing_patterns w ON w.session_id = d.session_id
+WHERE a.document_id = d.id
+  AND a.pattern_type IS NULL
+  AND a.message ILIKE '%' || LEFT(w.description, 50) || '%';
+
+CREATE INDEX idx_feedback_annotations_document_pattern ON feedback_annotations(document_id, pattern_type)
+    WHERE pattern_type IS NOT NULL;
+CREATE INDEX idx_documents_session_created_at ON documents(session_id, created_at DESC);
+
+-- Same as 003, also saving each annotation's pattern_type
+CREATE OR REPLACE FUNCTION save_analysis_result(
+    p_document_id UUID,
+    p_session_id UUID,
+    p_annotations JSONB,
+    p_scores JSONB,
+    p_patterns JSONB,
+    p_raw_response JSONB,
+    p_model_used TEXT,
+    p_tokens_used INTEGER
+)
+RETURNS VOID AS $$
+BEGIN
+    -- Save annotations
+    INSERT INTO feedback_annotations (document_id, start_offset, end_offset, category, severity, message, suggestion, pattern_type)
+    SELECT
+        p_document_id,
+        (a->>'start_offset')::INTEGER,
+        (a->>'end_offset')::INTEGER,
+        a->>'category',
+        a->>'severity',
+        a->>'message',
+        a->>'suggestion',
+        a->>'pattern_type'
+    FROM jsonb_array_elements(COALESCE(p_annotations, '[]'::JSONB)) AS a;
+
+    -- Save/update patterns; a pattern repeated within one analysis counts once
+    INSERT INTO writing_patterns (session_id, pattern_type, description)
+    SELECT DISTINCT ON (p->>'pattern_type')
+        p_session_id,
+        p->>'pattern_type',
+        p->>'description'
+    FROM jsonb_array_elements(COALESCE(p_patterns, '[]'::JSONB)) AS p
+    ON CONFLICT (session_id, pattern_type) DO UPDATE
+    SET occurrence_count = writing_patterns.occurrence_count + 1,
+        last_occurrence_at = NOW();
+
+    -- Save progress metrics
+    -- Note: "voice" from API response maps to "vocabulary_score" in database
+    INSERT INTO progress_metrics (session_id, document_id, grammar_score, clarity_score, vocabulary_score, overall_score)
+    VALUES (
+        p_session_id,
+        p_document_id,
+        (p_scores->>'grammar')::DECIMAL,
+        (p_scores->>'clarity')::DECIMAL,
+        (p_scores->>'voice')::DECIMAL,
+        (p_scores->>'overall')::DECIMAL
+    );
+
+    -- Save analysis history
+    INSERT INTO analysis_history (document_id, raw_response, model_used, tokens_used)
+    VALUES (p_document_id, p_raw_response, p_model_used, p_tokens_used);
+
+    -- Update document status
+    UPDATE documents SET status = 'analyzed' WHERE id = p_document_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mark patterns mastered for a batch of sessions in one statement.
+-- A pattern is mastered when it occurred 3+ times historically and the
+-- session's last 5 documents neither reported it (last_occurrence_at is set
+-- when an analysis lists the pattern, after its document was created) nor
+-- carry an annotation of it.
+-- Returns the patterns that were newly marked.
+CREATE OR REPLACE FUNCTION mark_mastered_patterns(p_session_ids UUID[])
+RETURNS TABLE (session_id UUID, pattern_type TEXT) AS $$
+    WITH recent_documents AS (
+        SELECT d.id, d.session_id, d.created_at
+        FROM UNNEST(p_session_ids) AS s(id)
+        CROSS JOIN LATERAL (
+            SELECT id, session_id, created_at
+            FROM documents
+            WHERE documents.session_id = s.id
+            ORDER BY created_at DESC
+            LIMIT 5
+        ) d
+    )
+    UPDATE writing_patterns w
+    SET is_mastered = TRUE
+    WHERE w.session_id = ANY(p_session_ids)
+      AND NOT w.is_mastered
+      AND w.occurrence_count >= 3
+      AND NOT EXISTS (
+          SELECT 1
+          FROM recent_documents r
+          WHERE r.session_id = w.session_id AND w.last_occurrence_at >= r.created_at
+      )
+      AND NOT EXISTS (
+          SELECT 1
+          FROM recent_documents r
+          JOIN feedback_annotations a ON a.document_id = r.id
+          WHERE r.session_id = w.session_id AND a.pattern_type = w.pattern_type
+      )
+    RETURNING w.session_id, w.pattern_type;
+$$ LANGUAGE sql;
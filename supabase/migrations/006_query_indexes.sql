@@ -0,0 +1,35 @@
+-- Indexes matching the queries the backend and frontend actually issue
+-- Checked with: python -m benchmarks.explain_queries (from backend/)
+--
+-- writing_patterns(session_id, pattern_type), used by the save_analysis_result
+-- upsert, is already covered by the table's UNIQUE constraint. No substring
+-- search remains at runtime since mastery detection matches annotations by
+-- pattern_type (005), so no trigram index is added.
+
+-- Session document list, newest edits first (frontend)
+CREATE INDEX idx_documents_session_updated_at ON documents(session_id, updated_at DESC);
+
+-- A document's annotations in text order; also serves the document_id foreign key
+CREATE INDEX idx_feedback_annotations_document_start ON feedback_annotations(document_id, start_offset);
+
+-- Session progress chart in time order (frontend)
+CREATE INDEX idx_progress_metrics_session_created_at ON progress_metrics(session_id, created_at);
+
+-- Session patterns, most frequent first (frontend)
+CREATE INDEX idx_writing_patterns_session_occurrences ON writing_patterns(session_id, occurrence_count DESC);
+
+-- Session vocabulary, newest first (frontend)
+CREATE INDEX idx_vocabulary_bank_session_created_at ON vocabulary_bank(session_id, created_at DESC);
+
+-- Foreign keys to documents, so deleting a document does not scan these tables
+CREATE INDEX idx_progress_metrics_document_id ON progress_metrics(document_id);
+CREATE INDEX idx_analysis_history_document_id ON analysis_history(document_id);
+
+-- Superseded by the composite indexes above and the UNIQUE constraints, which share their leading column
+DROP INDEX IF EXISTS idx_documents_session_id;
+DROP INDEX IF EXISTS idx_feedback_annotations_document_id;
+DROP INDEX IF EXISTS idx_writing_patterns_session_id;
+DROP INDEX IF EXISTS idx_progress_metrics_session_id;
+DROP INDEX IF EXISTS idx_vocabulary_bank_session_id;
+-- Not used by any query; progress is always read per session
+DROP INDEX IF EXISTS idx_progress_metrics_created_at;
@@ -0,0 +1,24 @@
+-- Save many analysis results in one round trip, for batch analysis jobs
+-- Called by the backend as supabase.rpc("save_analysis_results", {"p_results": [...]}),
+-- where each element holds the named arguments of save_analysis_result
+
+CREATE OR REPLACE FUNCTION save_analysis_results(p_results JSONB)
+RETURNS VOID AS $$
+DECLARE
+    r JSONB;
+BEGIN
+    FOR r IN SELECT * FROM jsonb_array_elements(COALESCE(p_results, '[]'::JSONB))
+    LOOP
+        PERFORM save_analysis_result(
+            (r->>'p_document_id')::UUID,
+            (r->>'p_session_id')::UUID,
+            r->'p_annotations',
+            r->'p_scores',
+            r->'p_patterns',
+            r->'p_raw_response',
+            r->>'p_model_used',
+            (r->>'p_tokens_used')::INTEGER
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
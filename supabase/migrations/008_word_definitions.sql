@@ -0,0 +1,17 @@
+-- Word definitions shared by all sessions, so each word is defined by the model once
+-- Keyed by lemma (lowercased dictionary form) and part of speech; the backend keeps
+-- the first definition saved for a word (upsert with ignore_duplicates)
+
+CREATE TABLE word_definitions (
+    lemma TEXT NOT NULL,
+    part_of_speech TEXT NOT NULL,
+    definition TEXT NOT NULL,
+    example_sentence TEXT,
+    model_used TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (lemma, part_of_speech)
+);
+
+ALTER TABLE word_definitions ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Allow all operations on word_definitions" ON word_definitions FOR ALL USING (true);